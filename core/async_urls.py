@@ -0,0 +1,18 @@
+from django.urls import path
+from . import async_views
+from .views import SubscriptionViewSet
+
+# Prepended to core.urls when settings.ASYNC_READ_VIEWS is on.
+urlpatterns = [
+    path("me", async_views.me),
+    path("health", async_views.health),
+    path("dashboard/summary", async_views.dashboard_summary),
+    path("subscriptions/", async_views.read_only(
+        async_views.subscription_list,
+        SubscriptionViewSet.as_view({"get": "list", "post": "create"}),
+    )),
+    path("subscriptions/<str:pk>/", async_views.read_only(
+        async_views.subscription_detail,
+        SubscriptionViewSet.as_view({"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}),
+    )),
+]
@@ -0,0 +1,144 @@
+"""
+Async (ASGI-native) versions of the hot read endpoints.
+
+Same URLs, payloads and caching as the DRF views, but authentication and
+queries go through Django's async ORM (aget, async for), so an ASGI worker
+keeps serving other requests while MySQL answers. Enabled with the
+ASYNC_READ_VIEWS setting; writes on the same URLs still go to the DRF views.
+Registration is the one async write, and it is served by register() below
+whatever ASYNC_READ_VIEWS says: its password hash runs on a thread pool
+(core.hashing) instead of the thread shared by all sync views.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from . import hashing
+from .aggregates import summarize
+from .authentication import CachedJWTAuthentication, aresolve_user
+from .cache import acached_per_user
+from .filters import filter_subscriptions
+from .models import Subscription
+from .pagination import SubscriptionPagination
+from .renderers import FastJSONRenderer
+from .rollups import summary_row, user_rows_queryset
+from .serializers import MeSerializer, RegisterSerializer, SubscriptionSerializer
+from .views import SubscriptionViewSet, parse_window, upcoming_item, upcoming_queryset
+
+_jwt = CachedJWTAuthentication()
+
+
+def render(data, status=200, headers=None):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type="application/json", headers=headers)
+
+
+async def authenticate(request):
+    """
+    CachedJWTAuthentication without the blocking user lookup: token parsing
+    and signature checks are pure CPU, the user comes from cache.aget() or,
+    on a miss, the async ORM.
+    """
+    header = _jwt.get_header(request)
+    raw = _jwt.get_raw_token(header) if header is not None else None
+    if raw is None:
+        raise NotAuthenticated()
+    return await _jwt.aget_user(_jwt.get_validated_token(raw))
+
+
+def async_api_view(auth=True):
+    """Authenticate (unless auth=False) and turn DRF exceptions into JSON responses."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if auth:
+                    return await view(request, await authenticate(request), *args, **kwargs)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                headers = None
+                if exc.status_code == 401:
+                    headers = {"WWW-Authenticate": _jwt.authenticate_header(request)}
+                elif getattr(exc, "wait", None):
+                    headers = {"Retry-After": "%d" % exc.wait}
+                detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+                return render(detail, status=exc.status_code, headers=headers)
+        return wrapper
+    return decorator
+
+
+def read_only(async_view, sync_view):
+    """GET/HEAD go to `async_view`; anything else to the (sync) DRF view."""
+    async def view(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            return await async_view(request, *args, **kwargs)
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+    view.csrf_exempt = True
+    return view
+
+
+@async_api_view(auth=False)
+async def health(request):
+    return HttpResponse('{"status": "ok"}', content_type="application/json")
+
+
+@async_api_view(auth=False)
+async def register(request):
+    """
+    POST /api/auth/register with the password hashed on core.hashing's pool
+    while the event loop keeps serving; validation and insert run in a thread.
+    """
+    if request.method != "POST":
+        raise MethodNotAllowed(request.method)
+    # the DRF view's parsers (JSON, form and multipart by default)
+    parsers = [parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]
+    serializer = RegisterSerializer(data=Request(request, parsers=parsers).data)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    password_hash = await hashing.amake_password(serializer.validated_data["password"])
+    await sync_to_async(serializer.save)(password_hash=password_hash)
+    return render(serializer.data, status=201)
+
+
+register.csrf_exempt = True  # like every DRF view: JWT, no session
+
+
+@async_api_view()
+async def me(request, user):
+    return render(MeSerializer(await aresolve_user(user)).data)
+
+
+@async_api_view()
+@acached_per_user
+async def dashboard_summary(request, user):
+    window = parse_window(request.GET.get("days"))
+    totals, by_provider = summarize([summary_row(r) async for r in user_rows_queryset(user.pk)])
+    upcoming = [upcoming_item(s) async for s in upcoming_queryset(user.pk, window)]
+    return render({"totals": totals, "upcoming": upcoming, "by_provider": by_provider})
+
+
+@async_api_view()
+@acached_per_user
+async def subscription_list(request, user):
+    drf_request = Request(request)
+    view = SubscriptionViewSet(request=drf_request, format_kwarg=None, action="list")
+    qs = Subscription.objects.filter(user_id=user.pk).select_related("provider")
+    if drf_request.query_params.get("provider_name"):
+        # names resolve through the provider index, which may (re)build from the DB
+        qs = await sync_to_async(filter_subscriptions)(qs, drf_request.query_params)
+    else:
+        qs = filter_subscriptions(qs, drf_request.query_params)
+    fields = view.rows.get_fields(drf_request)
+    paginator = SubscriptionPagination()
+    page = paginator.page_queryset(qs, drf_request, view)
+    rows = paginator.set_page([r async for r in view.rows.values(page, fields, extra=(paginator.field, "id"))])
+    return render(paginator.get_paginated_data(view.rows.to_representation(rows, fields)))
+
+
+@async_api_view()
+async def subscription_detail(request, user, pk):
+    try:
+        sub = await Subscription.objects.select_related("provider").aget(pk=pk, user_id=user.pk)
+    except (Subscription.DoesNotExist, ValueError):
+        raise NotFound("No Subscription matches the given query.")
+    return render(SubscriptionSerializer(sub).data)
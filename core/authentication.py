@@ -0,0 +1,158 @@
+"""
+JWT authentication without a user query on every request.
+
+simplejwt's JWTAuthentication loads the User row for each authenticated
+request. CachedJWTAuthentication validates the token the same way (signature
+and expiry checks are pure CPU) but resolves the user through the Django
+cache: one query per user per AUTH_USER_CACHE_TIMEOUT seconds instead of one
+per request. Entries are dropped when a User is saved or deleted, and
+expire after the timeout otherwise, e.g. after a queryset update(). The drop
+reaches every worker only through a shared cache (core.checks): with locmem,
+other workers keep authenticating a deactivated user for up to the timeout.
+The cache is size-bounded by its backend (locmem MAX_ENTRIES, Redis maxmemory).
+
+With settings.JWT_STATELESS the user is not looked up at all: request.user is
+a TokenUser built from the token claims, so views must only rely on
+request.user.pk (use resolve_user() when the full row is needed). Tokens then
+stay valid until they expire, even for deactivated users.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import models
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+USER_KEY = "st:authuser:{}"
+
+
+def user_cache_timeout():
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+
+
+def stateless():
+    return getattr(settings, "JWT_STATELESS", False)
+
+
+def cached_fields():
+    # the password hash stays out of the cache: it's deferred on cached users
+    # and loaded from the DB only if something reads it
+    return [f.attname for f in get_user_model()._meta.concrete_fields if f.attname != "password"]
+
+
+def _lookup(user_id):
+    # from the primary: a replica may not have a user who just signed up yet
+    manager = get_user_model()._default_manager.db_manager(DEFAULT_DB_ALIAS)
+    return manager.filter(**{api_settings.USER_ID_FIELD: user_id})
+
+
+def _build(fields, values):
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, fields, values)
+
+
+def get_user(user_id):
+    """The user whose USER_ID_FIELD is `user_id`, from the cache when possible; None if missing."""
+    fields, key, timeout = cached_fields(), USER_KEY.format(user_id), user_cache_timeout()
+    values = cache.get(key) if timeout else None
+    if values is None:
+        values = _lookup(user_id).values_list(*fields).first()
+        if values is None:
+            return None
+        if timeout:
+            cache.set(key, values, timeout)
+    return _build(fields, values)
+
+
+async def aget_user(user_id):
+    fields, key, timeout = cached_fields(), USER_KEY.format(user_id), user_cache_timeout()
+    values = await cache.aget(key) if timeout else None
+    if values is None:
+        values = await _lookup(user_id).values_list(*fields).afirst()
+        if values is None:
+            return None
+        if timeout:
+            await cache.aset(key, values, timeout)
+    return _build(fields, values)
+
+
+def forget_user(user_id, using=None):
+    """
+    Drop a cached user. Now, and again once the surrounding transaction
+    commits, so a request that read the old row mid-transaction can't leave
+    it cached.
+    """
+    key = USER_KEY.format(user_id)
+    cache.delete(key)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(key), using=using)
+
+
+def resolve_user(user):
+    """request.user as a User instance (TokenUser in stateless mode is resolved through the cache)."""
+    if isinstance(user, get_user_model()):
+        return user
+    resolved = get_user(user.pk)
+    if resolved is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    return resolved
+
+
+async def aresolve_user(user):
+    if isinstance(user, get_user_model()):
+        return user
+    resolved = await aget_user(user.pk)
+    if resolved is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    return resolved
+
+
+class TokenUser(models.TokenUser):
+    """simplejwt's TokenUser with the id claim (a string) converted to the user model's pk type."""
+    @cached_property
+    def id(self):
+        field = get_user_model()._meta.get_field(api_settings.USER_ID_FIELD)
+        return field.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Drop-in replacement for JWTAuthentication (same errors, same
+    CHECK_USER_IS_ACTIVE / CHECK_REVOKE_TOKEN handling).
+    """
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if stateless():
+            return TokenUser(validated_token)
+        return self.check_user(get_user(user_id), validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if stateless():
+            return TokenUser(validated_token)
+        user = await aget_user(user_id)
+        if api_settings.CHECK_REVOKE_TOKEN and user is not None:
+            return await sync_to_async(self.check_user)(user, validated_token)
+        return self.check_user(user, validated_token)
+
+    def check_user(self, user, validated_token):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # reads the deferred password hash: one query, only with this option on
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
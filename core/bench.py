@@ -0,0 +1,617 @@
+"""
+Benchmark scenarios for `manage.py benchmark`.
+
+Each scenario seeds the data it needs into the (throwaway) test database the
+command creates, then returns a dict of measurements. Register new ones with
+@scenario("name").
+"""
+import asyncio
+import itertools
+import json
+import math
+import random
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from types import ModuleType
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from . import hashing, instrumentation, reminders, search
+from .filters import filter_subscriptions
+from .seed import SEED_PASSWORD, seed
+from . import urls as core_urls
+from .async_urls import urlpatterns as async_urlpatterns
+from .models import Provider, ReminderDelivery, Subscription
+from .pagination import encode_cursor
+from .renderers import FastJSONRenderer
+from .serializers import SubscriptionSerializer
+from .views import RegisterView, SubscriptionViewSet
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def measure(fn, repeat=20, warmup=2):
+    """
+    Run fn() `repeat` times: latency percentiles in ms, the exact number of
+    SQL queries of one run, and how many runs returned an HTTP error (when
+    fn returns a response).
+    """
+    for _ in range(warmup):
+        fn()
+    # queries are counted on a separate run: capturing slows the timed ones down
+    with CaptureQueriesContext(connection) as ctx:
+        fn()
+    queries = len(ctx.captured_queries)
+    timings = []
+    errors = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        errors += getattr(result, "status_code", 200) >= 400
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p90_ms": round(percentile(timings, 90), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(max(timings), 3),
+        "queries": queries,
+        "errors": errors,
+    }
+
+
+def uncached(fn):
+    """Wrap fn so every call misses the per-user response cache (core.cache)."""
+    def run():
+        cache.clear()
+        return fn()
+    return run
+
+
+def make_user_with_subscriptions(username, count, providers=20):
+    user = User.objects.create_user(username, f"{username}@example.com", "bench-pass-123")
+    provs = Provider.objects.bulk_create(
+        [Provider(name=f"{username}-provider-{i}") for i in range(providers)]
+    )
+    today = date.today()
+    Subscription.objects.bulk_create(
+        [
+            Subscription(
+                user=user,
+                provider=provs[i % providers],
+                price=Decimal(5 + i % 20) + Decimal("0.99"),
+                start_date=today,
+                next_renewal_date=today + timedelta(days=i % 365),
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    return user
+
+
+@scenario("pagination")
+def pagination(scale=1):
+    """First page vs. a deep page, keyset cursor vs. COUNT + OFFSET."""
+    total = 5000 * scale
+    user = make_user_with_subscriptions("pager", total)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    ordered = Subscription.objects.filter(user=user).order_by("next_renewal_date", "pk")
+    deep = ordered.values_list("next_renewal_date", "pk")[total - 20]
+    deep_cursor = encode_cursor("next_renewal_date", *deep)
+
+    def offset_page():
+        qs = Subscription.objects.filter(user=user).select_related("provider").order_by("next_renewal_date", "pk")
+        qs.count()
+        list(qs[total - 20:total - 10])
+
+    return {
+        "rows": total,
+        "keyset_first_page": measure(uncached(lambda: client.get("/api/subscriptions/"))),
+        "keyset_deep_page": measure(uncached(lambda: client.get(f"/api/subscriptions/?cursor={deep_cursor}"))),
+        "offset_deep_page": measure(offset_page),
+    }
+
+
+def throughput(fn, requests):
+    """Wall time of one fn() call that issues `requests` requests and returns the responses."""
+    start = time.perf_counter()
+    responses = fn()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": sum(r.status_code != 200 for r in responses),
+        "seconds": round(elapsed, 3),
+        "req_per_s": round(requests / elapsed, 1),
+    }
+
+
+@scenario("async")
+def async_reads(scale=1, concurrency=20):
+    """
+    Concurrent reads of the hot endpoints: async views on an in-process ASGI
+    client (asyncio.gather) vs. the DRF views on the WSGI client (threads).
+    The response cache is disabled so every request does its queries.
+    """
+    user = make_user_with_subscriptions("async-reader", 500 * scale)
+    auth = f"Bearer {AccessToken.for_user(user)}"
+    urls = ["/api/dashboard/summary", "/api/subscriptions/", "/api/me", "/api/health"]
+    total = concurrency * 10
+    paths = [urls[i % len(urls)] for i in range(total)]
+
+    async_urlconf = ModuleType("async_urlconf")
+    async_urlconf.urlpatterns = [path("api/", include(async_urlpatterns + core_urls.urlpatterns))]
+
+    async def burst():
+        client = AsyncClient(AUTHORIZATION=auth)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def get(url):
+            async with sem:
+                return await client.get(url)
+        return await asyncio.gather(*(get(u) for u in paths))
+
+    def threaded():
+        client = Client(HTTP_AUTHORIZATION=auth)
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(client.get, paths))
+
+    dummy_cache = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    with override_settings(CACHES=dummy_cache):
+        with override_settings(ROOT_URLCONF=async_urlconf):
+            asyncio.run(burst())  # warm up
+            asgi = throughput(lambda: asyncio.run(burst()), total)
+        threaded()
+        wsgi = throughput(threaded, total)
+    return {"concurrency": concurrency, "asgi_async": asgi, "wsgi_threads": wsgi}
+
+
+@scenario("registration")
+def registration_burst(scale=1, signups=None):
+    """
+    A burst of concurrent signups with real PBKDF2 hashing on the in-process
+    ASGI client, while a sync endpoint (/api/health) is probed until the
+    burst is over: DRF RegisterView (waits for the hash on the thread every
+    sync view shares) vs. the async register view (awaits core.hashing's pool).
+    """
+    signups = signups or 20 * scale
+    ids = itertools.count()
+    drf_urlconf = ModuleType("drf_urlconf")
+    drf_urlconf.urlpatterns = [path("api/auth/register", RegisterView.as_view()), path("api/", include(core_urls))]
+
+    async def burst():
+        client = AsyncClient()
+
+        async def signup():
+            i = next(ids)
+            body = json.dumps({"username": f"burst-{i}", "email": f"burst-{i}@example.com", "password": "bench-pass-123"})
+            return await client.post("/api/auth/register", body, content_type="application/json")
+
+        start = time.perf_counter()
+        signups_done = asyncio.gather(*(signup() for _ in range(signups)))
+        probes = []
+        while not signups_done.done():
+            probe_start = time.perf_counter()
+            await client.get("/api/health")
+            probes.append((time.perf_counter() - probe_start) * 1000)
+            await asyncio.sleep(0.01)
+        responses = await signups_done
+        elapsed = time.perf_counter() - start
+        statuses = [r.status_code for r in responses]
+        return {
+            "signups": signups,
+            "created": statuses.count(201),
+            "busy": statuses.count(503),
+            "errors": sum(s not in (201, 503) for s in statuses),
+            "seconds": round(elapsed, 3),
+            "signups_per_s": round(signups / elapsed, 1),
+            "probes": len(probes),
+            "probe_p50_ms": round(percentile(probes, 50), 3) if probes else None,
+            "probe_p99_ms": round(percentile(probes, 99), 3) if probes else None,
+            "probe_max_ms": round(max(probes), 3) if probes else None,
+        }
+
+    results = {"hash_workers": hashing.hash_workers()}
+    with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"]):
+        hashing.reset()
+        with override_settings(ROOT_URLCONF=drf_urlconf):
+            results["drf_view"] = asyncio.run(burst())
+        results["async_view"] = asyncio.run(burst())
+    hashing.reset()
+    return results
+
+
+@scenario("typeahead")
+def typeahead(scale=1):
+    """Provider search over a 100k catalog: in-memory index vs. ?search= (LIKE '%term%')."""
+    total = 100000 * scale
+    rng = random.Random(9)
+    # consonant+vowel syllables: realistic trigram spread (a handful of
+    # syllables would put every name in every posting list)
+    syllables = [c + v for c in "bcdfghklmnprstvxz" for v in "aeiouy"]
+
+    def word():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+    words = ["stream", "play", "tv", "music", "plus", "max", "prime", "box", "flix", "cloud"]
+    Provider.objects.bulk_create(
+        [Provider(name=f"{word().title()} {rng.choice(words)} {i}") for i in range(total)],
+        batch_size=5000,
+    )
+    client = APIClient()
+    search.reset()
+    start = time.perf_counter()
+    index = search.get_index()
+    build_ms = round((time.perf_counter() - start) * 1000, 1)
+    return {
+        "providers": len(index),
+        "index_build_ms": build_ms,
+        "index_prefix": measure(lambda: index.search("kalo", 10), repeat=200),
+        "index_word": measure(lambda: index.search("music 42", 10), repeat=200),
+        "index_fuzzy": measure(lambda: index.search("kalomixu", 10), repeat=50),
+        "api_q": measure(uncached(lambda: client.get("/api/providers/?q=kalo"))),
+        "api_search_icontains": measure(uncached(lambda: client.get("/api/providers/?search=kalo"))),
+    }
+
+
+def table_scans(qs):
+    """Steps of the plan of `qs` that read core_subscription without an index (SQLite, MySQL)."""
+    db = connections[qs.db]
+    table = Subscription._meta.db_table
+    sql, params = qs.query.sql_with_params()
+    with db.cursor() as cursor:
+        if db.vendor == "mysql":
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columns = [c[0] for c in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [f"{table}: type=ALL" for r in rows if r["table"] == table and r["type"] == "ALL"]
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        # "SCAN t USING INDEX i" walks all of i: as bad as the table
+        return [row[-1] for row in cursor.fetchall() if row[-1].split(" USING ")[0] == f"SCAN {table}"]
+
+
+def filter_combinations(provider_ids, provider_name):
+    """Every combination of the list filters (core.filters), as query-param dicts."""
+    today = date.today()
+    groups = [
+        {"provider": ",".join(map(str, provider_ids))},
+        {"provider_name": provider_name},
+        {"min_price": "8", "max_price": "15"},
+        {"min_monthly_cost": "5", "max_monthly_cost": "12"},
+        {"currency": "usd,eur"},
+        {"billing_cycle": "monthly,yearly"},
+        {"auto_renew": "true"},
+        {"renews_after": today.isoformat(), "renews_before": (today + timedelta(days=90)).isoformat()},
+        {"due_in_days": "30"},
+        {"q": "family"},
+    ]
+    for n in range(len(groups) + 1):
+        for combo in itertools.combinations(groups, n):
+            yield {k: v for group in combo for k, v in group.items()}
+
+
+@scenario("filters")
+def filters(scale=1):
+    """
+    Every combination of the subscription list filters: the plans must
+    never scan core_subscription, and each combination is timed (one page).
+    """
+    user = make_user_with_subscriptions("filterbench", 5000 * scale)
+    make_user_with_subscriptions("filterbench-other", 5000 * scale)
+    ids = list(user.subscriptions.values_list("pk", flat=True))
+    user.subscriptions.filter(pk__in=ids[::7]).update(plan_name="Family plan", auto_renew=False)
+    user.subscriptions.filter(pk__in=ids[::11]).update(notes="shared with the family", currency="EUR")
+    provider = user.subscriptions.select_related("provider").first().provider
+    search.reset()
+
+    base = Subscription.objects.filter(user_id=user.pk).select_related("provider")
+    scans, timings = [], {}
+    for params in filter_combinations([provider.pk], provider.name):
+        qs = filter_subscriptions(base, params).order_by("next_renewal_date", "pk")[:50]
+        name = "&".join(sorted(params)) or "none"
+        if problems := table_scans(qs):
+            scans.append({"filters": name, "plan": problems})
+        start = time.perf_counter()
+        list(qs)
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+    every = max(filter_combinations([provider.pk], provider.name), key=len)
+    page = lambda params: list(filter_subscriptions(base, params).order_by("next_renewal_date", "pk")[:50])
+    return {
+        "combinations": len(timings),
+        "table_scans": scans,
+        "no_filters": measure(lambda: page({})),
+        "all_filters": measure(lambda: page(every)),
+        "combination_ms": {
+            "median": round(statistics.median(timings.values()), 3),
+            "slowest": dict(sorted(timings.items(), key=lambda item: -item[1])[:10]),
+        },
+    }
+
+
+@scenario("reminders")
+def reminder_pipeline(scale=1):
+    """Reminder digests for 2000 users (locmem email backend): emails/s by batch size."""
+    users = User.objects.bulk_create(
+        [User(username=f"remind-{i}", email=f"remind-{i}@example.com") for i in range(2000 * scale)]
+    )
+    provider = Provider.objects.create(name="remind-provider")
+    today = date.today()
+    Subscription.objects.bulk_create(
+        [
+            Subscription(user=u, provider=provider, price=Decimal("4.99"), start_date=today,
+                         next_renewal_date=today + timedelta(days=i % 3))
+            for u in users for i in range(3)
+        ],
+        batch_size=5000,
+    )
+    results = {}
+    with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+        for batch_size in (100, 1000, 5000):
+            ReminderDelivery.objects.all().delete()
+            results[f"batch_{batch_size}"] = reminders.run(today=today, days=3, batch_size=batch_size)
+    return results
+
+
+@scenario("endpoints")
+def endpoints(scale=1):
+    """
+    The core API on seeded data (core.seed): dashboard, subscription list /
+    filter / order, provider search, registration and login.
+    """
+    data = seed(users=200 * scale, subscriptions=12, providers=300, prefix="bench")
+    user = User.objects.get(username="bench-user-0000000")
+    client = APIClient()
+    client.force_authenticate(user)
+    anon = APIClient(raise_request_exception=False)  # a 500 is a result ("errors"), not a crash
+    provider_id = user.subscriptions.values_list("provider_id", flat=True).first()
+    search.reset()
+
+    def get(url):
+        return uncached(lambda: client.get(url))
+
+    new_ids = itertools.count()
+
+    def register():
+        i = next(new_ids)
+        return anon.post(
+            "/api/auth/register",
+            {"username": f"bench-new-{i}", "email": f"bench-new-{i}@example.com", "password": "bench-pass-123"},
+            format="json",
+        )
+
+    def login():
+        return anon.post("/api/auth/login", {"username": user.username, "password": SEED_PASSWORD}, format="json")
+
+    return {
+        "data": data,
+        "dashboard_summary": measure(get("/api/dashboard/summary")),
+        "dashboard_summary_cached": measure(lambda: client.get("/api/dashboard/summary")),
+        "subscription_list": measure(get("/api/subscriptions/")),
+        "subscription_filter_provider": measure(get(f"/api/subscriptions/?provider={provider_id}")),
+        "subscription_filter_due": measure(get("/api/subscriptions/?due_in_days=30")),
+        "subscription_filter_cost": measure(get("/api/subscriptions/?min_monthly_cost=5&max_monthly_cost=15")),
+        "subscription_order_price": measure(get("/api/subscriptions/?ordering=-price")),
+        "subscription_order_monthly_cost": measure(get("/api/subscriptions/?ordering=-monthly_cost")),
+        "provider_search": measure(lambda: anon.get("/api/providers/?search=provider-001")),
+        "provider_typeahead": measure(lambda: anon.get("/api/providers/?q=bench-provider-001")),
+        # password hashing dominates these two: fewer rounds
+        "register": measure(register, repeat=10, warmup=1),
+        "login": measure(login, repeat=10, warmup=1),
+    }
+
+
+@scenario("instrumentation")
+def instrumentation_overhead(scale=1):
+    """Cost of RequestMetricsMiddleware: the same requests with REQUEST_METRICS on and off."""
+    user = make_user_with_subscriptions("instrumented", 200 * scale)
+    urls = {"subscription_list": "/api/subscriptions/", "dashboard_summary": "/api/dashboard/summary"}
+    results = {}
+    for enabled in (False, True):
+        with override_settings(REQUEST_METRICS=enabled):
+            client = APIClient()  # fresh handler: middleware chain built under this setting
+            client.force_authenticate(user)
+            for name, url in urls.items():
+                results[f"{name}_{'on' if enabled else 'off'}"] = measure(uncached(lambda: client.get(url)), repeat=50)
+
+    # the per-query part in isolation (DB time is noise at this scale): the
+    # execute wrapper around a no-op execute, with and without a recorder
+    sql = str(Subscription.objects.filter(user=user).query)
+
+    def wrapped(n=10000):
+        for _ in range(n):
+            instrumentation.record_query(lambda *args: None, sql, (), False, {})
+    results["wrapper_10k_calls_idle"] = measure(wrapped, repeat=10)
+    token = instrumentation._recorder.set(instrumentation.QueryRecorder())
+    try:
+        results["wrapper_10k_calls_recording"] = measure(wrapped, repeat=10)
+    finally:
+        instrumentation._recorder.reset(token)
+    return results
+
+
+@scenario("serialization")
+def serialization(scale=1):
+    """
+    Serializing + rendering 1000 subscriptions: SubscriptionSerializer on
+    model instances with DRF's JSONRenderer vs. the .values() fast path
+    (core.rows) with FastJSONRenderer, plus a sparse fieldset.
+    """
+    user = make_user_with_subscriptions("serializer", 1000 * scale)
+    qs = Subscription.objects.filter(user=user).select_related("provider").order_by("pk")
+    rows = SubscriptionViewSet.rows
+    all_fields = list(rows.columns)
+    fast_renderer, drf_renderer = FastJSONRenderer(), JSONRenderer()
+
+    def serializer_path():
+        return drf_renderer.render(SubscriptionSerializer(list(qs), many=True).data)
+
+    def fast_path(fields=all_fields):
+        return fast_renderer.render(rows.to_representation(list(rows.values(qs, fields)), fields))
+
+    data = SubscriptionSerializer(list(qs), many=True).data
+    return {
+        "rows": qs.count(),
+        "identical_output": serializer_path() == fast_path(),
+        "serializer_and_json_renderer": measure(serializer_path),
+        "values_and_fast_renderer": measure(fast_path),
+        "values_sparse_3_fields": measure(lambda: fast_path(["id", "provider_name", "monthly_cost"])),
+        "render_only_json_renderer": measure(lambda: drf_renderer.render(data)),
+        "render_only_fast_renderer": measure(lambda: fast_renderer.render(data)),
+    }
+
+
+@scenario("auth")
+def jwt_auth(scale=1):
+    """
+    Real Bearer tokens through CachedJWTAuthentication: user looked up on
+    every request (AUTH_USER_CACHE_TIMEOUT=0), cached, and JWT_STATELESS.
+    """
+    user = make_user_with_subscriptions("authbench", 20 * scale)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+    sub_id = user.subscriptions.values_list("pk", flat=True).first()
+    urls = {"me": "/api/me", "subscription_detail": f"/api/subscriptions/{sub_id}/"}
+    modes = {
+        "db": {"AUTH_USER_CACHE_TIMEOUT": 0},
+        "cached": {"AUTH_USER_CACHE_TIMEOUT": 60},
+        "stateless": {"JWT_STATELESS": True},
+    }
+    results = {}
+    for mode, options in modes.items():
+        with override_settings(**options):
+            cache.clear()
+            for name, url in urls.items():
+                results[f"{name}_{mode}"] = measure(lambda: client.get(url), repeat=50)
+    return results
+
+
+# A fresh worker: load the WSGI app, then serve GET /api/health once.
+COLD_START = """
+import io, json, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+app = get_wsgi_application()
+loaded = time.perf_counter()
+status = []
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": "/api/health", "SERVER_NAME": "bench", "SERVER_PORT": "80",
+    "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http", "wsgi.errors": sys.stderr,
+}
+b"".join(app(environ, lambda s, headers, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({
+    "status": int(status[0].split()[0]), "app_ms": (loaded - start) * 1000,
+    "first_request_ms": (done - loaded) * 1000, "modules": sorted(sys.modules),
+}))
+"""
+
+
+def cold_start(env=None, importtime=False):
+    """
+    Run COLD_START in a new interpreter (same settings module, plus `env`):
+    {"status", "app_ms", "first_request_ms", "modules"}, and with importtime
+    {"imports": {module: (self_ms, cumulative_ms)}} from python -X importtime.
+    """
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", COLD_START]
+    done = subprocess.run(
+        command, env={**os.environ, **(env or {})}, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(done.stdout)
+    if importtime:
+        result["imports"] = {}
+        for line in done.stderr.splitlines():
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) == 3 and fields[0].strip().isdigit():
+                result["imports"][fields[2].strip()] = (int(fields[0]) / 1000, int(fields[1]) / 1000)
+    return result
+
+
+@scenario("startup")
+def startup(scale=1):
+    """
+    Cold start of a worker, full vs. API_ONLY settings: the whole process
+    (interpreter to first /api/health response), the app load and first
+    request inside it, and what the imports cost (python -X importtime).
+    """
+    results = {}
+    for profile, env in {"full": {"API_ONLY": "0"}, "api_only": {"API_ONLY": "1"}}.items():
+        run = cold_start(env, importtime=True)
+        imports = run["imports"]
+        slowest = sorted(imports.items(), key=lambda item: -item[1][0])[:15]
+        results[profile] = {
+            "cold_start": measure(lambda: cold_start(env), repeat=5 * scale, warmup=1),
+            "status": run["status"],
+            "app_ms": round(run["app_ms"], 1),
+            "first_request_ms": round(run["first_request_ms"], 1),
+            "modules": len(run["modules"]),
+            "slowest_imports_self_ms": {name: own for name, (own, _) in slowest},
+            "project_imports_ms": {
+                name: total for name, (_, total) in sorted(imports.items())
+                if name.split(".")[0] in ("core", "streamtrace_backend")
+            },
+        }
+    return results
+
+
+# -- machine-readable results ---------------------------------------------
+
+def flatten(results, prefix=""):
+    """{"scenario": {"metric": {"p50_ms": ...}}} -> {"scenario.metric": {...}} for every measure() dict."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and "p50_ms" in value:
+            flat[name] = value
+        elif isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+    return flat
+
+
+def compare(baseline, current, threshold=25.0, noise_ms=0.5):
+    """
+    Compare two result sets (as written by `benchmark --output`).
+    A metric regressed if it runs more queries, or its p50 got more than
+    `threshold` percent and `noise_ms` slower. Returns one row per metric
+    present in both.
+    """
+    old, new = flatten(baseline), flatten(current)
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        a, b = old[name], new[name]
+        change = (b["p50_ms"] - a["p50_ms"]) / a["p50_ms"] * 100 if a["p50_ms"] else 0.0
+        slower = change > threshold and b["p50_ms"] - a["p50_ms"] > noise_ms
+        rows.append({
+            "metric": name,
+            "p50_ms": (a["p50_ms"], b["p50_ms"]),
+            "change_pct": round(change, 1),
+            "queries": (a["queries"], b["queries"]),
+            "regression": slower or b["queries"] > a["queries"],
+        })
+    return rows
@@ -0,0 +1,164 @@
+"""
+Streaming CSV / NDJSON import and export of subscriptions.
+
+Imports read the upload line by line, validate in batches, resolve provider
+names with one query per batch and bulk_create each batch, all inside a
+single transaction. Exports stream rows straight from a DB cursor.
+"""
+import codecs
+import csv
+import json
+import operator
+from functools import reduce
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from .models import Provider, Subscription
+from .serializers import SubscriptionImportSerializer
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+CONTENT_TYPES = {CSV: "text/csv", NDJSON: "application/x-ndjson"}
+
+EXPORT_FIELDS = [
+    "id", "provider", "plan_name", "price", "currency", "billing_cycle", "custom_cycle_days",
+    "start_date", "next_renewal_date", "auto_renew", "notes",
+]
+# values_list() columns for EXPORT_FIELDS
+EXPORT_COLUMNS = [f if f != "provider" else "provider__name" for f in EXPORT_FIELDS]
+
+MAX_REPORTED_ERRORS = 200
+
+
+def guess_format(name="", content_type=""):
+    name, content_type = (name or "").lower(), (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type or name.endswith((".ndjson", ".jsonl")):
+        return NDJSON
+    return CSV
+
+
+class InvalidFile(ValueError):
+    """The upload can't be read as a whole (not UTF-8, broken CSV): nothing is imported."""
+    def __init__(self, message, line_no):
+        super().__init__(message)
+        self.line_no = line_no
+
+
+def decode_lines(chunks):
+    """codecs.iterdecode(chunks, "utf-8-sig"), raising InvalidFile on bytes that aren't UTF-8."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    line_no = 0
+    try:
+        for line_no, chunk in enumerate(chunks, start=1):
+            if text := decoder.decode(chunk):
+                yield text
+        if text := decoder.decode(b"", final=True):
+            yield text
+    except UnicodeDecodeError:
+        raise InvalidFile("The file is not UTF-8 text.", line_no) from None
+
+
+def iter_rows(chunks, fmt):
+    """
+    Lazily decode an iterable of byte lines into (line_no, row, error) tuples.
+    `row` is a dict of raw values (blank CSV cells dropped so model defaults
+    apply); `error` is a message when the line itself could not be parsed.
+    Raises InvalidFile when the file itself is unreadable.
+    """
+    lines = decode_lines(chunks)
+    if fmt == CSV:
+        reader = csv.DictReader(lines, strict=True)  # raise on broken quoting rather than guess
+        try:
+            for row in reader:
+                cleaned = {k.strip(): v for k, v in row.items() if k and v not in ("", None)}
+                yield reader.line_num, cleaned, None
+        except csv.Error as exc:
+            raise InvalidFile(f"Malformed CSV: {exc}.", reader.line_num + 1) from None
+        return
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, "Invalid JSON."
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Expected a JSON object."
+            continue
+        yield line_no, row, None
+
+
+def import_subscriptions(user_id, rows, batch_size=500):
+    """
+    Validate + insert rows from iter_rows(). Valid rows are created, invalid
+    ones are reported (first MAX_REPORTED_ERRORS) with their line number.
+    InvalidFile from iter_rows() rolls the whole import back.
+    """
+    created = failed = 0
+    errors = []
+
+    def report(line_no, detail):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": line_no, "errors": detail})
+
+    rows = iter(rows)
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            # case-insensitive on every backend, like MySQL's collation
+            names = {str(row.get("provider", "")).strip() for _, row, _ in batch if row}
+            match = reduce(operator.or_, (Q(name__iexact=name) for name in names), Q(pk__in=[]))
+            providers = {
+                name.casefold(): pk for name, pk in Provider.objects.filter(match).values_list("name", "id")
+            }
+
+            objs = []
+            for line_no, row, error in batch:
+                if error:
+                    report(line_no, {"non_field_errors": [error]})
+                    continue
+                serializer = SubscriptionImportSerializer(data=row)
+                if not serializer.is_valid():
+                    report(line_no, serializer.errors)
+                    continue
+                data = dict(serializer.validated_data)
+                provider_id = providers.get(data.pop("provider").casefold())
+                if provider_id is None:
+                    report(line_no, {"provider": ["Unknown provider."]})
+                    continue
+                sub = Subscription(user_id=user_id, provider_id=provider_id, **data)
+                # bulk_create skips save(), so fill the renewal date ourselves
+                if not sub.next_renewal_date:
+                    sub.next_renewal_date = sub.compute_next_renewal()
+                objs.append(sub)
+
+            Subscription.objects.bulk_create(objs, batch_size=batch_size)
+            created += len(objs)
+
+    return {"created": created, "failed": failed, "errors": errors}
+
+
+class _Echo:
+    """csv.writer target that hands back each row instead of buffering it."""
+    def write(self, value):
+        return value
+
+
+def export_lines(queryset, fmt, chunk_size=2000):
+    """Yield the serialized rows of `queryset`, one line at a time."""
+    rows = queryset.order_by("id").values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+    if fmt == CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n"
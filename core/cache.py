@@ -0,0 +1,154 @@
+"""
+Per-user, versioned response cache.
+
+Every user has a version stamp in the cache that is bumped on any Subscription
+write, and on writes to the providers they subscribe to (see core.receivers). Cache keys and ETags are derived from
+(user, version, URL, media type, day), so a write invalidates everything
+cached for that user at once, without having to know which keys exist.
+The stamps must be in a cache all workers share (core.checks);
+RESPONSE_CACHE_TIMEOUT=0 turns the whole thing off.
+"""
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, urlencode
+from .db_routing import pin_to_primary
+
+VERSION_KEY = "st:ver:{}"
+RESPONSE_KEY = "st:resp:{}"
+
+
+def response_cache_timeout():
+    return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+
+
+def response_cache_max_bytes():
+    return getattr(settings, "RESPONSE_CACHE_MAX_BYTES", 256 * 1024)
+
+
+def get_version(user_id):
+    """
+    Current version stamp of a user's data. Stamps are nanosecond timestamps
+    rather than counters, so a version that was evicted from the cache comes
+    back as a new, never-seen value instead of restarting at 1.
+    """
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key) or time.time_ns()
+    return version
+
+
+def bump_versions(user_ids):
+    if not user_ids:
+        return
+    stamp = time.time_ns()
+    cache.set_many({VERSION_KEY.format(u): stamp for u in user_ids}, None)
+
+
+def user_data_changed(user_ids, using=None):
+    """
+    Invalidate cached responses for `user_ids`. Bumps now, and again once the
+    surrounding transaction commits, so a request that read the old rows
+    mid-transaction can't cache them under the new version. The users' reads
+    also go to the primary for a while (core.db_routing): a replica that
+    hasn't caught up would fill the new version with the old data.
+    """
+    user_ids = set(user_ids)
+    _changed(user_ids)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: _changed(user_ids), using=using)
+
+
+def _changed(user_ids):
+    bump_versions(user_ids)
+    pin_to_primary(user_ids)
+
+
+def response_tag(request, user_id):
+    """(strong ETag, cache key) for a request made by `user_id`."""
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    raw = "|".join([
+        str(user_id),
+        str(get_version(user_id)),
+        request.path,
+        query,
+        getattr(request, "accepted_media_type", "") or "",
+        # "upcoming" style payloads depend on today's date
+        date.today().isoformat(),
+    ])
+    digest = hashlib.sha256(raw.encode()).hexdigest()
+    return f'"{digest[:40]}"', RESPONSE_KEY.format(digest)
+
+
+def _finish(response, etag):
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Authorization", "Accept"))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def cached_per_user(method):
+    """
+    Decorator for DRF handler methods (get/list). Answers If-None-Match with
+    304 and repeat requests with the cached bytes, both without running the
+    view. Only 200 responses up to RESPONSE_CACHE_MAX_BYTES are stored.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        user_id = request.user.pk if request.user.is_authenticated else None
+        if user_id is None or not response_cache_timeout():
+            return method(self, request, *args, **kwargs)
+
+        etag, key = response_tag(request, user_id)
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and etag in parse_etags(if_none_match):
+            return _finish(HttpResponseNotModified(), etag)
+
+        hit = cache.get(key)
+        if hit is not None:
+            content, content_type = hit
+            return _finish(HttpResponse(content, content_type=content_type), etag)
+
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            response = self.finalize_response(request, response, *args, **kwargs)
+            response.render()
+            if len(response.content) <= response_cache_max_bytes():
+                cache.set(key, (response.content, response["Content-Type"]), response_cache_timeout())
+        return _finish(response, etag)
+    return wrapper
+
+
+def acached_per_user(view):
+    """
+    Async counterpart of cached_per_user for the views in core.async_views,
+    which are called as view(request, user, ...) and return rendered responses.
+    """
+    @wraps(view)
+    async def wrapper(request, user, *args, **kwargs):
+        if not response_cache_timeout():
+            return await view(request, user, *args, **kwargs)
+        etag, key = await sync_to_async(response_tag)(request, user.pk)
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and etag in parse_etags(if_none_match):
+            return _finish(HttpResponseNotModified(), etag)
+
+        hit = await cache.aget(key)
+        if hit is not None:
+            content, content_type = hit
+            return _finish(HttpResponse(content, content_type=content_type), etag)
+
+        response = await view(request, user, *args, **kwargs)
+        if response.status_code == 200 and len(response.content) <= response_cache_max_bytes():
+            await cache.aset(key, (response.content, response["Content-Type"]), response_cache_timeout())
+        return _finish(response, etag)
+    return wrapper
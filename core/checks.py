@@ -0,0 +1,53 @@
+"""
+System checks for settings that only work together.
+
+Some features keep state that every worker must see in the default cache:
+version stamps of the response cache (core.cache) and of the provider
+index (core.search), the cached users of core.authentication, the sticky
+read-your-writes flags of core.db_routing. With a
+process-local cache (locmem) a write handled by one worker is invisible to
+the others, which then keep serving stale data without any error. So when
+such a feature is on, the default cache has to be shared (REDIS_URL), unless
+LOCAL_CACHE_OK says this runs as a single process.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def cache_is_shared():
+    return (
+        settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+        or getattr(settings, "LOCAL_CACHE_OK", False)
+    )
+
+
+def shared_cache_features():
+    """[(check id, feature)] for the enabled features that need a shared cache."""
+    from .authentication import stateless, user_cache_timeout
+    from .cache import response_cache_timeout
+    features = [("core.E002", "The provider typeahead index (core.search)")]
+    if response_cache_timeout() > 0:
+        features.append(("core.E001", "The response cache (RESPONSE_CACHE_TIMEOUT)"))
+    if user_cache_timeout() > 0 and not stateless():
+        # deactivating a user must reach every worker
+        features.append(("core.E003", "The JWT user cache (AUTH_USER_CACHE_TIMEOUT)"))
+    if getattr(settings, "DATABASE_REPLICAS", ()):
+        # the next request of a user who just wrote may hit another worker
+        features.append(("core.E004", "Sticky reads after a write (DATABASE_REPLICAS)"))
+    return features
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [
+        Error(
+            f"{feature} needs a cache shared by all workers, but the default cache is process-local.",
+            hint="Set REDIS_URL, turn the feature off, or set LOCAL_CACHE_OK=1 if this runs as a single process.",
+            id=check_id,
+        )
+        for check_id, feature in shared_cache_features()
+    ]
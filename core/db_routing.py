@@ -0,0 +1,145 @@
+"""
+Primary/replica routing.
+
+ReplicaRouter sends every write to "default" (the primary). Reads go to the
+database that ReplicaRoutingMiddleware picked for the current request:
+  - GET/HEAD/OPTIONS: a random alias from settings.DATABASE_REPLICAS,
+  - anything else: the primary, so a write request reads what it writes,
+  - outside a request (commands, jobs): the primary.
+
+Replicas lag behind the primary. So after a request by a user writes
+anything (the router saw a db_for_write), reads for that user stick to the
+primary for REPLICA_STICKY_SECONDS: users always see their own changes. The
+user comes from the JWT in the Authorization header (signature check only,
+no query); the sticky flag is a key in the default cache, which core.checks
+requires to be shared once replicas are configured: the user's next request
+may land on another worker.
+
+Writes made on a user's behalf by someone else (a provider rename reaching
+its subscribers) pin them too, through core.cache.user_data_changed: what a
+lagging replica serves would otherwise be cached under the new version.
+
+With no replicas configured everything reads from the primary and the
+middleware only costs a ContextVar set/reset.
+"""
+import random
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .authentication import CachedJWTAuthentication
+
+STICKY_KEY = "st:sticky:{}"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_jwt = CachedJWTAuthentication()
+_routing = ContextVar("db_routing", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def pin_to_primary(user_ids):
+    """Send the reads of `user_ids` to the primary for REPLICA_STICKY_SECONDS."""
+    if replicas() and user_ids:
+        cache.set_many({STICKY_KEY.format(u): 1 for u in user_ids}, sticky_seconds())
+
+
+def read_as(user_id):
+    """
+    For requests that authenticate without a JWT (calendar feed tokens): the
+    rest of this request reads from the primary if `user_id` is pinned to it.
+    """
+    state = _routing.get()
+    if state is not None and state.read_db is not None and cache.get(STICKY_KEY.format(user_id)):
+        state.read_db = None
+
+
+def request_user_id(request):
+    """User id from the request's access token, or None (no/invalid token). No DB access."""
+    try:
+        header = _jwt.get_header(request)
+        raw = _jwt.get_raw_token(header) if header is not None else None
+        return _jwt.get_user_id(_jwt.get_validated_token(raw)) if raw is not None else None
+    except (AuthenticationFailed, InvalidToken):
+        return None
+
+
+class RoutingState:
+    __slots__ = ("read_db", "wrote")
+
+    def __init__(self, read_db=None):
+        self.read_db = read_db  # None: the primary
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        return state.read_db if state is not None else None
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Place it before anything that queries the database."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        user_id, read_db = None, None
+        if request.method in SAFE_METHODS and replicas():
+            user_id = request_user_id(request)
+            if user_id is None or not cache.get(STICKY_KEY.format(user_id)):
+                read_db = random.choice(replicas())
+        state = RoutingState(read_db)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote and replicas() and (user_id := user_id or request_user_id(request)) is not None:
+            pin_to_primary([user_id])
+        return response
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context: queries in executor threads see the same state
+        user_id, read_db = None, None
+        if request.method in SAFE_METHODS and replicas():
+            user_id = request_user_id(request)
+            if user_id is None or not await cache.aget(STICKY_KEY.format(user_id)):
+                read_db = random.choice(replicas())
+        state = RoutingState(read_db)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote and replicas() and (user_id := user_id or request_user_id(request)) is not None:
+            await cache.aset(STICKY_KEY.format(user_id), 1, sticky_seconds())
+        return response
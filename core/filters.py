@@ -0,0 +1,175 @@
+"""
+Query-string filters for subscription lists, shared by the DRF viewset and the
+async read views.
+"""
+import re
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Q
+from rest_framework import filters
+from . import search
+from .models import Provider, Subscription
+from .utils import to_cents
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+TEXT_FIELDS = ("plan_name", "notes")  # the columns of SUBSCRIPTION_TEXT_INDEX, in order
+FULLTEXT_MIN_WORD = 3  # innodb_ft_min_token_size: shorter words aren't in the index
+
+
+class OrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that maps API names to model fields through the view's
+    `ordering_aliases` (e.g. ?ordering=monthly_cost -> monthly_cost_cents).
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        aliases = getattr(view, "ordering_aliases", None)
+        if not ordering or not aliases:
+            return ordering
+        return [
+            ("-" if term.startswith("-") else "") + aliases.get(term.lstrip("-"), term.lstrip("-"))
+            for term in ordering
+        ]
+
+
+def parse_cents(value):
+    """"12.5" -> 1250; None for missing/garbage."""
+    try:
+        return to_cents(Decimal(value)) if value not in (None, "") else None
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def split(value):
+    """"a, b,,c" -> ["a", "b", "c"]."""
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def parse_ints(value):
+    ids = []
+    for v in split(value):
+        try:
+            ids.append(int(v))
+        except ValueError:
+            pass
+    return ids
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_bool(value):
+    value = (value or "").lower()
+    return True if value in TRUE_VALUES else False if value in FALSE_VALUES else None
+
+
+class FullTextMatch(Func):
+    """
+    MySQL: MATCH (columns) AGAINST (query IN BOOLEAN MODE), answered from a
+    FULLTEXT index on exactly those columns (models.SUBSCRIPTION_TEXT_INDEX).
+    """
+    output_field = BooleanField()
+
+    def __init__(self, query, *columns):
+        super().__init__(*[F(c) for c in columns])
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = zip(*(compiler.compile(e) for e in self.source_expressions))
+        return f"MATCH ({', '.join(sql)}) AGAINST (%s IN BOOLEAN MODE)", (*[p for ps in params for p in ps], self.query)
+
+
+def text_search(qs, text):
+    """
+    Words of `text` in plan_name or notes. MySQL uses the FULLTEXT index
+    (every word required, as a prefix) when all words are long enough to be
+    indexed; elsewhere it's a LIKE over the rows of the user the queryset is
+    already narrowed to.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return qs
+    if connections[qs.db].vendor == "mysql" and min(len(w) for w in words) >= FULLTEXT_MIN_WORD:
+        return qs.filter(FullTextMatch(" ".join(f"+{w}*" for w in words), *TEXT_FIELDS))
+    for word in words:
+        qs = qs.filter(Q(plan_name__icontains=word) | Q(notes__icontains=word))
+    return qs
+
+
+def filter_subscriptions(qs, params):
+    """
+    Query-string filters (all optional, combined with AND; garbage values are ignored):
+      provider=1,2              provider ids
+      provider_name=netflix     provider names (case/accent-insensitive, resolved in memory by core.search;
+                                names the index doesn't know yet are looked up in the database)
+      min_price / max_price     raw price
+      min_monthly_cost / max_monthly_cost   monthly equivalent, in the account currency
+      currency=USD,EUR   billing_cycle=monthly,custom   auto_renew=true|false
+      renews_after / renews_before=YYYY-MM-DD (inclusive), due_in_days=N
+      q=family plan             words in plan_name or notes
+    The querysets they're applied to are per user; each filter has a (user, ...)
+    index to range over, see Subscription.Meta.indexes.
+    """
+    provider_ids = parse_ints(params.get("provider"))
+    names = split(params.get("provider_name"))
+    if names:
+        index = search.get_index()
+        by_name, missing = set(), Q()
+        for name in names:
+            pks = index.lookup(name)
+            by_name.update(pks)
+            if not pks:
+                missing |= Q(name__iexact=name)
+        if missing:
+            # e.g. created a moment ago by another worker, whose index got it first
+            by_name.update(Provider.objects.filter(missing).values_list("pk", flat=True))
+        provider_ids = [pk for pk in provider_ids if pk in by_name] if provider_ids else sorted(by_name)
+        if not provider_ids:
+            return qs.none()
+    if provider_ids:
+        qs = qs.filter(provider_id__in=provider_ids)
+
+    due_in = params.get("due_in_days")
+    if due_in:
+        try:
+            n = int(due_in)
+            qs = qs.filter(next_renewal_date__lte=date.today() + timedelta(days=n))
+        except ValueError:
+            pass
+    after, before = parse_date(params.get("renews_after")), parse_date(params.get("renews_before"))
+    if after:
+        qs = qs.filter(next_renewal_date__gte=after)
+    if before:
+        qs = qs.filter(next_renewal_date__lte=before)
+
+    # amounts in the account currency, e.g. ?min_monthly_cost=5&max_monthly_cost=19.99
+    low, high = parse_cents(params.get("min_monthly_cost")), parse_cents(params.get("max_monthly_cost"))
+    if low is not None:
+        qs = qs.filter(monthly_cost_cents__gte=low)
+    if high is not None:
+        qs = qs.filter(monthly_cost_cents__lte=high)
+    low, high = parse_cents(params.get("min_price")), parse_cents(params.get("max_price"))
+    if low is not None:
+        qs = qs.filter(price__gte=Decimal(low).scaleb(-2))
+    if high is not None:
+        qs = qs.filter(price__lte=Decimal(high).scaleb(-2))
+
+    currencies = [c.upper() for c in split(params.get("currency"))]
+    if currencies:
+        qs = qs.filter(currency__in=currencies)
+    cycles = [c for c in split(params.get("billing_cycle")) if c in dict(Subscription.BILLING_CHOICES)]
+    if cycles:
+        qs = qs.filter(billing_cycle__in=cycles)
+    auto_renew = parse_bool(params.get("auto_renew"))
+    if auto_renew is not None:
+        qs = qs.filter(auto_renew=auto_renew)
+
+    if params.get("q"):
+        qs = text_search(qs, params["q"])
+    return qs
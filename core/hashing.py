@@ -0,0 +1,81 @@
+"""
+Password hashing on a small, bounded thread pool.
+
+PBKDF2 takes hundreds of milliseconds of CPU on purpose. During a signup burst
+the hashes would otherwise run on every worker thread at once and starve the
+other requests. Here at most PASSWORD_HASH_WORKERS hashes run at a time, and
+at most PASSWORD_HASH_QUEUE more wait for a slot. Past that, PasswordHashBusy
+(503 + Retry-After) is raised right away instead of queueing without limit.
+hashlib releases the GIL while it hashes, so the pool threads really run in
+parallel with request threads.
+
+amake_password() awaits the pool without blocking the event loop.
+/api/auth/register always goes to core.async_views.register, which uses it.
+Under ASGI no thread waits for a hash, so sync views keep being served
+during a burst. Under WSGI each signup's own worker thread still waits for
+its hash (it has nothing else to do), and the pool caps how many run at once.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password as django_make_password
+from rest_framework.exceptions import APIException
+
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+class PasswordHashBusy(APIException):
+    status_code = 503
+    default_detail = "Too many registrations right now, please retry shortly."
+    default_code = "password_hash_busy"
+
+
+def hash_workers():
+    return getattr(settings, "PASSWORD_HASH_WORKERS", None) or max(1, (os.cpu_count() or 2) // 2)
+
+
+def hash_queue():
+    return getattr(settings, "PASSWORD_HASH_QUEUE", 32)
+
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                workers = hash_workers()
+                _slots = threading.BoundedSemaphore(workers + hash_queue())
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+    return _pool, _slots
+
+
+def submit(raw_password):
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        exc = PasswordHashBusy()
+        exc.wait = 1  # DRF turns this into Retry-After
+        raise exc
+    future = pool.submit(django_make_password, raw_password)
+    future.add_done_callback(lambda f: slots.release())
+    return future
+
+
+def make_password(raw_password):
+    return submit(raw_password).result()
+
+
+async def amake_password(raw_password):
+    return await asyncio.wrap_future(submit(raw_password))
+
+
+def reset():
+    """Drop the pool (tests, setting changes); the next hash builds a new one."""
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = _slots = None
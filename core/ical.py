@@ -0,0 +1,191 @@
+"""
+iCalendar (RFC 5545) feed of a user's renewals, for calendar apps to subscribe to.
+
+Calendar apps can't send an Authorization header, so the feed URL carries a
+signed token instead: the user id, signed with SECRET_KEY and the user's
+CalendarFeed key. Rotating the key (POST /api/calendar) revokes that user's
+old URLs; rotating SECRET_KEY revokes everyone's. The key is kept in the
+cache, so a poll still costs no queries.
+
+One VEVENT per subscription, starting on next_renewal_date. Auto-renewing
+subscriptions repeat with RRULE:FREQ=DAILY;INTERVAL=<cycle days>, the same
+fixed-length cycles roll_renewals uses, so the feed stays small and never has
+to be expanded into individual dates.
+
+The body is streamed from a values() iterator and cached per user under the
+version stamp of core.cache, which every Subscription write bumps. The stamp
+also gives the ETag and Last-Modified: an unchanged poll gets a 304 (or the
+cached bytes) without a single query.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .cache import get_version, response_cache_max_bytes, response_cache_timeout
+from .models import CalendarFeed, Subscription
+from .utils import cycle_length_days
+
+FEED_KEY = "st:ics:{}:{}"
+SECRET_KEY_CACHE = "st:icskey:{}"
+CONTENT_TYPE = "text/calendar; charset=utf-8"
+PRODID = "-//streamtrace//renewals//EN"
+SALT = "core.ical.feed"
+
+
+def _signer(key):
+    return signing.Signer(salt=f"{SALT}:{key}")
+
+
+def feed_key(user_id):
+    """The user's current feed key, or None if they never asked for a feed URL."""
+    cache_key = SECRET_KEY_CACHE.format(user_id)
+    key = cache.get(cache_key)
+    if key is None:
+        key = CalendarFeed.objects.filter(user_id=user_id).values_list("key", flat=True).first()
+        if key is not None:
+            cache.set(cache_key, key, None)
+    return key
+
+
+def forget_key(user_id):
+    cache.delete(SECRET_KEY_CACHE.format(user_id))
+
+
+def rotate_key(user_id):
+    key = secrets.token_urlsafe(16)
+    CalendarFeed.objects.update_or_create(user_id=user_id, defaults={"key": key})
+    cache.set(SECRET_KEY_CACHE.format(user_id), key, None)
+    return key
+
+
+def feed_token(user_id):
+    key = feed_key(user_id)
+    if key is None:
+        feed, _ = CalendarFeed.objects.get_or_create(user_id=user_id, defaults={"key": secrets.token_urlsafe(16)})
+        key = feed.key
+        cache.set(SECRET_KEY_CACHE.format(user_id), key, None)
+    return _signer(key).sign(str(user_id))
+
+
+def feed_user(token):
+    """User id of a feed token, or None if the signature doesn't check out against the user's key."""
+    try:
+        user_id = int(token.rpartition(":")[0])
+    except ValueError:
+        return None
+    key = feed_key(user_id)
+    if key is None:
+        return None
+    try:
+        _signer(key).unsign(token)
+    except signing.BadSignature:
+        return None
+    return user_id
+
+
+def escape_text(value):
+    return (
+        str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+    )
+
+
+def fold(line):
+    """One content line as CRLF-terminated bytes, folded at 75 octets without splitting characters."""
+    data = line.encode()
+    if len(data) <= 75:
+        return data + b"\r\n"
+    out, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:  # UTF-8 continuation byte
+            end -= 1
+        out.append(data[start:end])
+        start, limit = end, 74  # continuation lines start with a space
+    return b"\r\n ".join(out) + b"\r\n"
+
+
+def event_lines(row, dtstamp):
+    pk, provider, plan, price, currency, cycle, custom_days, renews, auto_renew = row
+    summary = f"{provider} {'renews' if auto_renew else 'ends'}"
+    if plan:
+        summary += f" ({plan})"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:subscription-{pk}@streamtrace",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART;VALUE=DATE:{renews:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{renews + timedelta(days=1):%Y%m%d}",
+    ]
+    if auto_renew:
+        lines.append(f"RRULE:FREQ=DAILY;INTERVAL={cycle_length_days(cycle, custom_days)}")
+    lines += [
+        f"SUMMARY:{escape_text(summary)}",
+        f"DESCRIPTION:{escape_text(f'{price} {currency}, billed {cycle}')}",
+        "TRANSP:TRANSPARENT",
+        "END:VEVENT",
+    ]
+    return lines
+
+
+def iter_feed(user_id, modified):
+    """The feed as byte chunks (one per event), streaming the rows from the database."""
+    dtstamp = modified.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield b"".join(fold(line) for line in [
+        "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH", "X-WR-CALNAME:Subscription renewals",
+    ])
+    rows = (
+        Subscription.objects
+        .filter(user_id=user_id, next_renewal_date__isnull=False)
+        .order_by("next_renewal_date", "pk")
+        .values_list(
+            "pk", "provider__name", "plan_name", "price", "currency",
+            "billing_cycle", "custom_cycle_days", "next_renewal_date", "auto_renew",
+        )
+    )
+    for row in rows.iterator(chunk_size=500):
+        yield b"".join(fold(line) for line in event_lines(row, dtstamp))
+    yield fold("END:VCALENDAR")
+
+
+def _cache_as_it_streams(chunks, key):
+    """Pass `chunks` through, then cache their concatenation if it stayed small enough."""
+    parts, size, limit = [], 0, response_cache_max_bytes()
+    for chunk in chunks:
+        yield chunk
+        if parts is not None:
+            size += len(chunk)
+            if size > limit:
+                parts = None
+            else:
+                parts.append(chunk)
+    if parts is not None:
+        cache.set(key, b"".join(parts), response_cache_timeout())
+
+
+def feed_response(request, user_id):
+    version = get_version(user_id)
+    # the stamp is time.time_ns() of the last write (or of the first read after eviction)
+    modified = datetime.fromtimestamp(version // 1_000_000_000, dt_timezone.utc)
+    etag = '"{}"'.format(hashlib.sha256(f"ics|{user_id}|{version}".encode()).hexdigest()[:40])
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(modified.timestamp()))
+    if response is None:
+        key = FEED_KEY.format(user_id, version)
+        body = cache.get(key)
+        if body is not None:
+            response = HttpResponse(body, content_type=CONTENT_TYPE)
+        else:
+            response = StreamingHttpResponse(
+                _cache_as_it_streams(iter_feed(user_id, modified), key), content_type=CONTENT_TYPE,
+            )
+        response["Content-Disposition"] = 'inline; filename="renewals.ics"'
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
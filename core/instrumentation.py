@@ -0,0 +1,247 @@
+"""
+Per-request SQL and latency instrumentation.
+
+RequestMetricsMiddleware measures every request: SQL query count and time
+(through a DB execute wrapper), view time, response render (serialization)
+time and total time. It reports them in a Server-Timing header, logs
+queries repeated within one request (the N+1 signature: same SQL, different
+params), and adds the numbers to in-memory, per-route histograms served in
+Prometheus text format at /api/metrics.
+
+The per-query cost is one ContextVar lookup, two perf_counter() calls and a
+Counter increment; see the "instrumentation" benchmark scenario.
+Histograms are per process, as usual for Prometheus client libraries
+without a multiprocess collector: scrape each worker or aggregate upstream.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_recorder = ContextVar("request_query_recorder", default=None)
+
+
+def repeat_threshold():
+    return getattr(settings, "REQUEST_METRICS_REPEAT_THRESHOLD", 5)
+
+
+class QueryRecorder:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()  # SQL text (params excluded) -> executions
+
+    def repeated(self, threshold):
+        return [(sql, n) for sql, n in self.statements.items() if n >= threshold]
+
+
+def record_query(execute, sql, params, many, context):
+    """DB execute wrapper: feeds the current request's QueryRecorder, if any."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.seconds += time.perf_counter() - start
+        recorder.count += 1
+        recorder.statements[sql] += 1
+
+
+def install(connection, **kwargs):
+    """Add record_query to a connection once (connection_created receiver)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteStats:
+    __slots__ = ("duration", "db", "queries", "statuses", "repeated")
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.statuses = Counter()
+        self.repeated = 0
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}  # (method, route) -> RouteStats
+
+    def observe(self, method, route, status, seconds, queries, db_seconds, repeated):
+        with self.lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = self.routes[(method, route)] = RouteStats()
+            stats.duration.observe(seconds)
+            stats.db.observe(db_seconds)
+            stats.queries.observe(queries)
+            stats.statuses[status] += 1
+            stats.repeated += bool(repeated)
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = []
+
+            def histogram(name, help_text, attr):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), stats in routes:
+                    h = getattr(stats, attr)
+                    labels = f'method="{_label(method)}",route="{_label(route)}"'
+                    cumulative = 0
+                    for bound, n in zip((*h.buckets, "+Inf"), h.counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+            histogram("streamtrace_request_duration_seconds", "Request latency.", "duration")
+            histogram("streamtrace_request_db_seconds", "Time spent in SQL per request.", "db")
+            histogram("streamtrace_request_queries", "SQL queries per request.", "queries")
+            lines.append("# HELP streamtrace_requests_total Requests by status code.")
+            lines.append("# TYPE streamtrace_requests_total counter")
+            for (method, route), stats in routes:
+                for status, n in sorted(stats.statuses.items()):
+                    lines.append(
+                        f'streamtrace_requests_total{{method="{_label(method)}",route="{_label(route)}",'
+                        f'status="{status}"}} {n}'
+                    )
+            lines.append("# HELP streamtrace_repeated_queries_total Requests that repeated one SQL statement (N+1).")
+            lines.append("# TYPE streamtrace_repeated_queries_total counter")
+            for (method, route), stats in routes:
+                lines.append(
+                    f'streamtrace_repeated_queries_total{{method="{_label(method)}",route="{_label(route)}"}} {stats.repeated}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RequestState:
+    __slots__ = ("started", "view_started", "render_started", "render_ended", "queries")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = self.render_started = self.render_ended = None
+        self.queries = QueryRecorder()
+
+
+class RequestMetricsMiddleware:
+    """
+    Put it first in MIDDLEWARE so "total" covers the whole stack.
+    Disabled (removed from the chain) when settings.REQUEST_METRICS is False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = request._metrics = RequestState()
+        token = _recorder.set(state.queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so queries run in executor threads are recorded too
+        state = request._metrics = RequestState()
+        token = _recorder.set(state.queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns: time that separately
+        state = request._metrics
+        state.render_started = time.perf_counter()
+
+        def rendered(response):
+            state.render_ended = time.perf_counter()
+        response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, state):
+        end = time.perf_counter()
+        queries = state.queries
+        repeated = queries.repeated(repeat_threshold())
+        # route pattern, not path: bounded label cardinality ("<unmatched>" for 404s)
+        route = request.resolver_match.route.rstrip("$") if request.resolver_match else "<unmatched>"
+
+        timing = [f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries"']
+        if state.view_started is not None:
+            view_end = state.render_started or end
+            timing.append(f"view;dur={(view_end - state.view_started) * 1000:.2f}")
+        if state.render_ended is not None:
+            timing.append(f"render;dur={(state.render_ended - state.render_started) * 1000:.2f}")
+        timing.append(f"total;dur={(end - state.started) * 1000:.2f}")
+        if repeated:
+            worst = max(n for _, n in repeated)
+            timing.append(f'repeated;desc="{len(repeated)} statement(s) repeated up to {worst}x"')
+            for sql, n in repeated:
+                logger.warning("Repeated query (%dx) in %s %s: %s", n, request.method, route, sql[:500])
+        response["Server-Timing"] = ", ".join(timing)
+
+        registry.observe(request.method, route, response.status_code, end - state.started,
+                         queries.count, queries.seconds, repeated)
+        return response
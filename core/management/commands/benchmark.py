@@ -0,0 +1,82 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.bench import SCENARIOS, compare
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Run benchmark scenarios against a throwaway test database and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all). Known: {', '.join(SCENARIOS)}")
+        parser.add_argument("--scale", type=int, default=1, help="Multiply the seeded data size.")
+        parser.add_argument("--output", help="Also write results (with commit/DB metadata) to this JSON file.")
+        parser.add_argument("--compare", metavar="BASELINE", help="Compare against a file written by --output; fails on regressions.")
+        parser.add_argument("--threshold", type=float, default=25.0, help="p50 slowdown (percent) counted as a regression.")
+
+    def handle(self, *args, scenarios=None, scale=1, **options):
+        unknown = set(scenarios or []) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Can't read baseline {options['compare']}: {exc}")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = {name: SCENARIOS[name](scale=scale) for name in (scenarios or SCENARIOS)}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.stdout.write(json.dumps(results, indent=2, default=str))
+
+        if options["output"]:
+            report = {
+                "meta": {
+                    "commit": git_commit(),
+                    "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "database": connection.vendor,
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "scale": scale,
+                },
+                "results": results,
+            }
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2, default=str)
+
+        if baseline is not None:
+            rows = compare(baseline, results, threshold=options["threshold"])
+            for row in rows:
+                flag = "REGRESSION" if row["regression"] else ""
+                self.stdout.write(
+                    f"{row['metric']:<50} p50 {row['p50_ms'][0]:>9} -> {row['p50_ms'][1]:>9} ms "
+                    f"({row['change_pct']:+.1f}%)  queries {row['queries'][0]} -> {row['queries'][1]}  {flag}"
+                )
+            regressions = [r["metric"] for r in rows if r["regression"]]
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+        # scenarios that EXPLAIN their queries (e.g. "filters") list the plans that scan a table
+        scans = [name for name, result in results.items() if result.get("table_scans")]
+        if scans:
+            raise CommandError(f"Table scans in: {', '.join(scans)}")
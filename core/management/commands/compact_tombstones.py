@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import JobCheckpoint, SubscriptionTombstone
+from core.sync import COMPACTION_JOB
+
+
+class Command(BaseCommand):
+    help = "Delete subscription tombstones older than the sync retention window, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None,
+                            help="Keep this many days (default SYNC_TOMBSTONE_RETENTION_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per delete (default 1000).")
+
+    def handle(self, *args, days=None, batch_size=1000, **options):
+        if days is None:
+            days = settings.SYNC_TOMBSTONE_RETENTION_DAYS
+        before = timezone.now() - timedelta(days=days)
+        # horizon first: a sync racing the deletes gets a full resync instead of missing deletes
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=COMPACTION_JOB)
+        current = checkpoint.state.get("before")
+        if current is None or before.isoformat() > current:
+            checkpoint.state = {"before": before.isoformat()}
+            checkpoint.save(update_fields=["state", "updated_at"])
+
+        old = SubscriptionTombstone.objects.filter(deleted_at__lt=before).order_by("pk").values_list("pk", flat=True)
+        deleted = 0
+        while ids := list(old[:batch_size]):
+            deleted += SubscriptionTombstone.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones older than {before:%Y-%m-%d %H:%M}."))
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.rollups import sync_users
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or with --verify, only check) UserSpendRollup rows from subscriptions, in user-id chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Report drift without writing anything.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Users per chunk (default 500).")
+        parser.add_argument("--start-after", type=int, default=0, help="Resume after this user id.")
+
+    def handle(self, *args, verify=False, chunk_size=500, start_after=0, **options):
+        users = get_user_model().objects.order_by("pk").values_list("pk", flat=True)
+        last = start_after
+        checked = drifted = 0
+        while True:
+            ids = list(users.filter(pk__gt=last)[:chunk_size])
+            if not ids:
+                break
+            drifted += sync_users(ids, repair=not verify)
+            checked += len(ids)
+            last = ids[-1]
+            self.stdout.write(f"users <= {last}: {checked} checked, {drifted} drifted rows")
+
+        if verify and drifted:
+            # non-zero exit so cron/CI can alert on drift
+            raise CommandError(f"{checked} users checked, found {drifted} drifted rollup rows.")
+        verb = "found" if verify else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{checked} users checked, {verb} {drifted} drifted rollup rows."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from core import provider_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute ProviderStats for providers whose subscriptions changed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every provider.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Providers per transaction (default 500).")
+
+    def handle(self, *args, full=False, chunk_size=500, **options):
+        result = provider_stats.refresh(full=full, chunk_size=chunk_size)
+        kind = "full" if result["full"] else "incremental"
+        self.stdout.write(self.style.SUCCESS(f"{result['providers']} providers refreshed ({kind})."))
@@ -0,0 +1,40 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core import renewals
+
+
+class Command(BaseCommand):
+    help = "Advance next_renewal_date of auto-renewing subscriptions whose renewal date has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--today", help="Roll forward relative to this date (YYYY-MM-DD, default: today).")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (default 1 = inline).")
+        parser.add_argument("--range-size", type=int, default=10000, help="User ids per work unit.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows per read/bulk_update chunk.")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing.")
+        parser.add_argument("--resume", action="store_true", help="Skip ranges a previous run for the same day finished.")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options["today"]) if options["today"] else date.today()
+        except ValueError:
+            raise CommandError("--today must be YYYY-MM-DD")
+
+        def progress(lo, scanned, advanced):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"users {lo}..{lo + options['range_size'] - 1}: {advanced}/{scanned} advanced")
+
+        totals = renewals.run(
+            today=today,
+            workers=options["workers"],
+            range_size=options["range_size"],
+            chunk_size=options["chunk_size"],
+            dry_run=options["dry_run"],
+            resume=options["resume"],
+            progress=progress,
+        )
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{totals['advanced']} subscriptions advanced in {totals['ranges']} ranges "
+            f"({totals['skipped']} ranges already done)."
+        ))
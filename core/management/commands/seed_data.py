@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.seed import SEED_PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate users x subscriptions x providers with realistic cycles, prices and currencies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--subscriptions", type=int, default=10, help="Subscriptions per user.")
+        parser.add_argument("--providers", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same data).")
+        parser.add_argument("--prefix", default="seed", help="Prefix of generated usernames/provider names.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Users (and rows) per bulk insert.")
+
+    def handle(self, *args, **options):
+        if min(options["users"], options["providers"], options["batch_size"]) < 1 or options["subscriptions"] < 0:
+            raise CommandError("--users, --providers and --batch-size must be >= 1")
+
+        def progress(users, subscriptions):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{users} users, {subscriptions} subscriptions")
+
+        with transaction.atomic():
+            counts = seed(
+                users=options["users"],
+                subscriptions=options["subscriptions"],
+                providers=options["providers"],
+                seed=options["seed"],
+                prefix=options["prefix"],
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['users']} users, {counts['subscriptions']} subscriptions and "
+            f"{counts['providers']} providers (password: {SEED_PASSWORD})."
+        ))
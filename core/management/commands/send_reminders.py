@@ -0,0 +1,40 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core import reminders
+
+
+class Command(BaseCommand):
+    help = "Email each user one digest of their subscriptions renewing in the next --days days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=3, help="Remind about renewals up to this many days ahead.")
+        parser.add_argument("--today", help="Window start (YYYY-MM-DD, default: today).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Subscriptions read and claimed per batch.")
+        parser.add_argument("--workers", type=int, default=4, help="Threads sending email.")
+        parser.add_argument("--retry-failed", action="store_true", help="Resend reminders whose send raised last time.")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options["today"]) if options["today"] else date.today()
+        except ValueError:
+            raise CommandError("--today must be YYYY-MM-DD")
+        if options["batch_size"] < 1 or options["days"] < 0:
+            raise CommandError("--batch-size must be >= 1 and --days >= 0")
+
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{stats['scanned']} scanned, {stats['sent']} emails sent")
+
+        totals = reminders.run(
+            today=today,
+            days=options["days"],
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            retry_failed=options["retry_failed"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['sent']} emails sent to {totals['users']} users in {totals['seconds']}s "
+            f"({totals['emails_per_s']}/s): {totals['claimed']} reminders claimed, "
+            f"{totals['already']} already handled, {totals['failed']} failed, {totals['skipped']} skipped."
+        ))
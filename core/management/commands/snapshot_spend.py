@@ -0,0 +1,26 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core import snapshots
+
+
+class Command(BaseCommand):
+    help = "Record today's spend change points (SpendSnapshot) for users whose subscriptions changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--today", help="Snapshot this date (YYYY-MM-DD, default: today).")
+        parser.add_argument("--full", action="store_true", help="Compare every user, not only the changed ones.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Users per transaction (default 1000).")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options["today"]) if options["today"] else date.today()
+        except ValueError:
+            raise CommandError("--today must be YYYY-MM-DD")
+
+        result = snapshots.run(today=today, full=options["full"], chunk_size=options["chunk_size"])
+        if result["skipped"]:
+            self.stdout.write(f"{today} is already snapshotted.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{today}: {result['users']} users checked, {result['changed']} with new change points."
+        ))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    # Self-contained copy of the rollup math (see core.rollups.contribution)
+    Subscription = apps.get_model('core', 'Subscription')
+    UserSpendRollup = apps.get_model('core', 'UserSpendRollup')
+    rollups = {}
+    rows = Subscription.objects.order_by().values_list(
+        'user_id', 'provider_id', 'price', 'billing_cycle', 'custom_cycle_days'
+    ).iterator(chunk_size=2000)
+    for user_id, provider_id, price, cycle, days in rows:
+        r = rollups.setdefault((user_id, provider_id), [0, 0, 0, 0])
+        r[0] += 1
+        if cycle == 'monthly':
+            r[1] += price
+        elif cycle == 'yearly':
+            r[2] += price
+        else:
+            r[3] += price * (days or 30)
+    UserSpendRollup.objects.bulk_create(
+        [
+            UserSpendRollup(user_id=u, provider_id=p, count=c, monthly_part=m, yearly_part=y, custom_part=x)
+            for (u, p), (c, m, y, x) in rollups.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_subscription'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSpendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('monthly_part', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('yearly_part', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('custom_part', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spend_rollups', to='core.provider')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spend_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'provider'), name='uniq_rollup_user_provider')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.utils import monthly_equivalent, to_cents, yearly_equivalent
+
+
+def backfill_costs(apps, schema_editor):
+    # uses the live helpers on purpose: the columns must match them exactly
+    Subscription = apps.get_model('core', 'Subscription')
+    rows = Subscription.objects.order_by('pk').only(
+        'pk', 'price', 'billing_cycle', 'custom_cycle_days'
+    ).iterator(chunk_size=2000)
+    batch = []
+    for s in rows:
+        s.monthly_cost_cents = to_cents(monthly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days))
+        s.yearly_cost_cents = to_cents(yearly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days))
+        batch.append(s)
+        if len(batch) == 2000:
+            Subscription.objects.bulk_update(batch, ['monthly_cost_cents', 'yearly_cost_cents'])
+            batch = []
+    Subscription.objects.bulk_update(batch, ['monthly_cost_cents', 'yearly_cost_cents'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_jobcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='monthly_cost_cents',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='yearly_cost_cents',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        # fill before indexing: one index build instead of maintaining it per row
+        migrations.RunPython(backfill_costs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'monthly_cost_cents'], name='core_subscr_user_id_e87a9f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'yearly_cost_cents'], name='core_subscr_user_id_ca67d6_idx'),
+        ),
+    ]
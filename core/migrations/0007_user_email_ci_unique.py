@@ -0,0 +1,43 @@
+# Unique, case-insensitive index on auth_user.email for registration
+# (core.serializers.RegisterSerializer). auth_user isn't ours, so it's raw SQL.
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+from core.models import USER_EMAIL_INDEX, email_key
+
+
+def create_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    dupes = list(
+        User.objects.annotate(key=email_key()).exclude(key=None)
+        .values('key').annotate(n=Count('pk')).filter(n__gt=1).values_list('key', flat=True)[:10]
+    )
+    if dupes:
+        raise RuntimeError(f"Merge or blank the duplicate user emails before migrating: {', '.join(dupes)}")
+    # NULLIF: blank emails become NULL, which unique indexes don't compare
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX {schema_editor.quote_name(USER_EMAIL_INDEX)} "
+        f"ON {schema_editor.quote_name(User._meta.db_table)} ((NULLIF(LOWER(email), '')))"
+    )
+
+
+def drop_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    sql = f"DROP INDEX {schema_editor.quote_name(USER_EMAIL_INDEX)}"
+    if schema_editor.connection.vendor == 'mysql':
+        sql += f" ON {schema_editor.quote_name(User._meta.db_table)}"
+    schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_reminderdelivery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_user_email_ci_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subscription_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='core_subscr_user_id_fa021e_idx'),
+        ),
+        migrations.AddField(
+            model_name='subscriptiontombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscription_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptiontombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'id'], name='core_subscr_user_id_50cea0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptiontombstone',
+            index=models.Index(fields=['deleted_at'], name='core_subscr_deleted_b10303_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_subscription_updated_at_tombstones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider_id', models.BigIntegerField()),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('monthly_part', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('yearly_part', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('custom_part', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spend_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='core_spends_user_id_847c95_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'provider_id', 'day'), name='uniq_snapshot_user_provider_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_spendsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderStats',
+            fields=[
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.provider')),
+                ('subscribers', models.IntegerField(default=0)),
+                ('subscriptions', models.IntegerField(default=0)),
+                ('avg_monthly_cents', models.BigIntegerField(default=0)),
+                ('median_monthly_cents', models.BigIntegerField(default=0)),
+                ('monthly_count', models.IntegerField(default=0)),
+                ('yearly_count', models.IntegerField(default=0)),
+                ('custom_count', models.IntegerField(default=0)),
+                ('dirty', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='subscriptiontombstone',
+            name='provider_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['provider', 'monthly_cost_cents'], name='core_subscr_provide_a00858_idx'),
+        ),
+    ]
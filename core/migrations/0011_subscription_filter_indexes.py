@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.models import SUBSCRIPTION_TEXT_INDEX
+
+
+# FULLTEXT is MySQL-only; elsewhere ?q= falls back to LIKE (core.filters.text_search)
+def create_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    Subscription = apps.get_model('core', 'Subscription')
+    schema_editor.execute(
+        f"CREATE FULLTEXT INDEX {schema_editor.quote_name(SUBSCRIPTION_TEXT_INDEX)} "
+        f"ON {schema_editor.quote_name(Subscription._meta.db_table)} (plan_name, notes)"
+    )
+
+
+def drop_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    Subscription = apps.get_model('core', 'Subscription')
+    schema_editor.execute(
+        f"DROP INDEX {schema_editor.quote_name(SUBSCRIPTION_TEXT_INDEX)} "
+        f"ON {schema_editor.quote_name(Subscription._meta.db_table)}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_provider_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'price'], name='core_subscr_user_id_de6c75_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'billing_cycle', 'next_renewal_date'], name='core_subscr_user_id_d98ac4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'auto_renew', 'next_renewal_date'], name='core_subscr_user_id_10dd72_idx'),
+        ),
+        migrations.RunPython(create_fulltext, drop_fulltext),
+    ]
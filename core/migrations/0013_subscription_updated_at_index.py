@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_calendarfeed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['updated_at', 'user', 'provider'], name='core_subscr_updated_bdfdb5_idx'),
+        ),
+    ]
@@ -1,6 +1,32 @@
 from django.conf import settings
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+from contextvars import ContextVar
 from datetime import date, timedelta
+from decimal import Decimal
+from .signals import subscriptions_bulk_changed
+from .utils import (
+    cycle_length_days, monthly_equivalent, monthly_from_parts, to_cents, yearly_equivalent, yearly_from_parts,
+)
+
+USER_EMAIL_INDEX = "auth_user_email_ci_uniq"
+# MySQL only: FULLTEXT (plan_name, notes) for ?q= (migration 0011, core.filters.text_search)
+SUBSCRIPTION_TEXT_INDEX = "core_subscription_text_ft"
+
+
+class EmailKey(models.Func):
+    # '' must be a literal, not a parameter, or databases can't match the index expression
+    template = "NULLIF(LOWER(%(expressions)s), '')"
+    output_field = models.CharField()
+
+
+def email_key():
+    """
+    A user's email lowercased, NULL when blank: the expression under the
+    unique USER_EMAIL_INDEX (migration 0007). Filter on it to use the index.
+    """
+    return EmailKey("email")
+
 
 class TimeStamped(models.Model):
     """
@@ -27,6 +53,121 @@ class Provider(TimeStamped):
         return self.name
 
 
+# a write to these may move subscriptions to another provider (core.provider_stats)
+PROVIDER_FIELDS = {"provider", "provider_id"}
+# set while bulk_update() runs, so its internal update() calls stay quiet
+_in_bulk_update = ContextVar("in_bulk_update", default=False)
+# set while a queryset delete() runs: it writes the tombstones in bulk itself
+_in_bulk_delete = ContextVar("in_bulk_delete", default=False)
+
+
+def upsert(model, objs, unique_fields, update_fields, **kwargs):
+    """
+    bulk_create() that overwrites `update_fields` of the rows already there.
+    MySQL's ON DUPLICATE KEY UPDATE has no conflict target (any unique key
+    matches), so unique_fields only goes to backends that take one.
+    """
+    if not connections[router.db_for_write(model)].features.supports_update_conflicts_with_target:
+        unique_fields = None
+    return model._default_manager.bulk_create(
+        objs, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields, **kwargs,
+    )
+
+
+class SubscriptionQuerySet(models.QuerySet):
+    """
+    Bulk writes skip post_save, so they announce themselves through
+    subscriptions_bulk_changed to keep derived data (rollups...) in sync.
+    They also stamp updated_at, which auto_now only does in save().
+    Deletes send post_delete per row (the collector does that whenever a
+    receiver is connected); delete() only adds the tombstones in one INSERT.
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_costs()
+        # an upsert can move existing rows (the primary key is their only unique key)
+        old_provider_ids = set()
+        if kwargs.get("update_conflicts") and PROVIDER_FIELDS & set(kwargs.get("update_fields") or ()):
+            old_provider_ids = self._providers_of(self.filter(pk__in=[o.pk for o in objs if o.pk is not None]))
+        objs = super().bulk_create(objs, *args, **kwargs)
+        conflicts = kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts")
+        subscriptions_bulk_changed.send(
+            sender=self.model,
+            user_ids={o.user_id for o in objs},
+            objs=None if conflicts else objs,
+            fields=None,
+            old_provider_ids=old_provider_ids,
+        )
+        return objs
+
+    @staticmethod
+    def _providers_of(qs):
+        return set(qs.order_by().values_list("provider_id", flat=True).distinct())
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        user_ids = {o.user_id for o in objs}
+        if "user" in fields or "user_id" in fields:
+            user_ids |= set(
+                self.filter(pk__in=[o.pk for o in objs]).values_list("user_id", flat=True).distinct()
+            )
+        old_provider_ids = set()
+        if PROVIDER_FIELDS & set(fields):
+            old_provider_ids = self._providers_of(self.filter(pk__in=[o.pk for o in objs]))
+        if set(fields) & set(self.model.COST_INPUTS):
+            for obj in objs:
+                obj.set_costs()
+            fields = [*fields, *(f for f in self.model.COST_FIELDS if f not in fields)]
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        fields = [*fields, "updated_at"] if "updated_at" not in fields else fields
+        token = _in_bulk_update.set(True)
+        try:
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+        finally:
+            _in_bulk_update.reset(token)
+        subscriptions_bulk_changed.send(
+            sender=self.model, user_ids=user_ids, objs=None, fields=set(fields), old_provider_ids=old_provider_ids,
+        )
+        return rows
+
+    def update(self, **kwargs):
+        if _in_bulk_update.get():
+            return super().update(**kwargs)
+        user_ids = set(self.order_by().values_list("user_id", flat=True).distinct())
+        new_user = kwargs.get("user", kwargs.get("user_id"))
+        if new_user is not None:
+            user_ids.add(getattr(new_user, "pk", new_user))
+        # cost columns are recomputed in Python after the update: SQL rounding
+        # can't be trusted to match to_cents() (MySQL rounds half away from zero)
+        costs_changed = set(kwargs) & set(self.model.COST_INPUTS)
+        pks = list(self.values_list("pk", flat=True)) if costs_changed else []
+        old_provider_ids = self._providers_of(self) if PROVIDER_FIELDS & set(kwargs) else set()
+        kwargs.setdefault("updated_at", timezone.now())
+        rows = super().update(**kwargs)
+        self.model.refresh_costs(pks)
+        subscriptions_bulk_changed.send(
+            sender=self.model, user_ids=user_ids, objs=None, fields=set(kwargs), old_provider_ids=old_provider_ids,
+        )
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        rows = list(self.order_by().values_list("pk", "user_id", "provider_id"))
+        token = _in_bulk_delete.set(True)
+        try:
+            with transaction.atomic(using=self.db, savepoint=False):
+                result = super().delete()
+                SubscriptionTombstone.record(rows, using=self.db)
+        finally:
+            _in_bulk_delete.reset(token)
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Subscription(models.Model):
     MONTHLY = "monthly"
     YEARLY = "yearly"
@@ -45,27 +186,258 @@ class Subscription(models.Model):
     auto_renew = models.BooleanField(default=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every write path (see SubscriptionQuerySet): drives delta sync (core.sync)
+    updated_at = models.DateTimeField(auto_now=True)
+    # monthly_equivalent()/yearly_equivalent() in cents, kept in sync on every
+    # write path so lists can sort/filter by cost in SQL
+    monthly_cost_cents = models.BigIntegerField(default=0, editable=False)
+    yearly_cost_cents = models.BigIntegerField(default=0, editable=False)
+
+    objects = SubscriptionQuerySet.as_manager()
+
+    # fields that feed the spend rollups
+    SPEND_FIELDS = ("user_id", "provider_id", "price", "billing_cycle", "custom_cycle_days")
+    # fields the cost columns are derived from, and the columns themselves
+    COST_INPUTS = ("price", "billing_cycle", "custom_cycle_days")
+    COST_FIELDS = ("monthly_cost_cents", "yearly_cost_cents")
 
     class Meta:
         indexes = [
             models.Index(fields=["user", "next_renewal_date"]),
             models.Index(fields=["user", "provider"]),
+            models.Index(fields=["user", "monthly_cost_cents"]),
+            models.Index(fields=["user", "yearly_cost_cents"]),
+            models.Index(fields=["user", "updated_at", "id"]),
+            # who/what was written since the last run (core.snapshots, core.provider_stats), index-only
+            models.Index(fields=["updated_at", "user", "provider"]),
+            # list filters (core.filters): price range, cycle/auto-renew + renewal window
+            models.Index(fields=["user", "price"]),
+            models.Index(fields=["user", "billing_cycle", "next_renewal_date"]),
+            models.Index(fields=["user", "auto_renew", "next_renewal_date"]),
+            # provider stats: medians read by offset along it (core.provider_stats)
+            models.Index(fields=["provider", "monthly_cost_cents"]),
         ]
         ordering = ["next_renewal_date", "provider__name"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what the DB row contributed to the rollups, so a later save()
+        # can apply a delta instead of recomputing (None if fields were deferred)
+        deferred = instance.get_deferred_fields()
+        loaded = not any(f in deferred for f in cls.SPEND_FIELDS)
+        instance._spend_snapshot = instance.spend_key() if loaded else None
+        return instance
+
+    def spend_key(self):
+        return tuple(getattr(self, f) for f in self.SPEND_FIELDS)
+
     def __str__(self):
         return f"{self.user} • {self.provider.name} • {self.plan_name or self.billing_cycle}"
     
+    def set_costs(self):
+        self.monthly_cost_cents = to_cents(monthly_equivalent(self.price, self.billing_cycle, self.custom_cycle_days))
+        self.yearly_cost_cents = to_cents(yearly_equivalent(self.price, self.billing_cycle, self.custom_cycle_days))
+
+    @classmethod
+    def refresh_costs(cls, pks, batch_size=1000):
+        """Recompute the cost columns of rows `pks` (after a queryset update())."""
+        for i in range(0, len(pks), batch_size):
+            objs = list(cls._base_manager.filter(pk__in=pks[i:i + batch_size]).only("pk", *cls.COST_INPUTS))
+            for obj in objs:
+                obj.set_costs()
+            # plain manager: no signals, the caller sends its own
+            cls._base_manager.bulk_update(objs, cls.COST_FIELDS)
+
+    def cycle_days(self):
+        return cycle_length_days(self.billing_cycle, self.custom_cycle_days)
+
     def compute_next_renewal(self):
-        if self.billing_cycle == self.MONTHLY:
-            return self.start_date + timedelta(days=30)
-        if self.billing_cycle == self.YEARLY:
-            return self.start_date + timedelta(days=365)
-        if self.billing_cycle == self.CUSTOM and self.custom_cycle_days > 0:
-            return self.start_date + timedelta(days=self.custom_cycle_days)
-        return self.start_date + timedelta(days=30)
+        return self.start_date + timedelta(days=self.cycle_days())
     
     def save(self, *args, **kwargs):
         if not self.next_renewal_date:
             self.next_renewal_date = self.compute_next_renewal()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        self.set_costs()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = {"updated_at", *(self.COST_FIELDS if set(update_fields) & set(self.COST_INPUTS) else ())}
+            kwargs["update_fields"] = {*update_fields, *extra}
+        super().save(*args, **kwargs)
+
+
+class SubscriptionTombstone(models.Model):
+    """
+    A deleted subscription, kept for delta sync (core.sync) until
+    `manage.py compact_tombstones` removes it. subscription_id is a plain
+    integer: the row it pointed to is gone. provider_id (plain too) tells
+    the provider stats job which providers lost a subscription.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="subscription_tombstones")
+    subscription_id = models.BigIntegerField()
+    provider_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "deleted_at", "id"]),
+            models.Index(fields=["deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} • {self.subscription_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def record(cls, rows, using=None):
+        """Tombstones for (subscription pk, user id, provider id) rows."""
+        now = timezone.now()
+        cls.objects.using(using).bulk_create(
+            [
+                cls(subscription_id=pk, user_id=user_id, provider_id=provider_id, deleted_at=now)
+                for pk, user_id, provider_id in rows
+            ],
+            batch_size=1000,
+        )
+
+    @classmethod
+    def record_deleted(cls, subscription, origin=None, using=None):
+        """post_delete of one subscription (instance delete, Provider cascade)."""
+        if _in_bulk_delete.get():
+            return  # SubscriptionQuerySet.delete() records the whole batch
+        user_model = subscription._meta.get_field("user").related_model
+        if isinstance(origin, user_model) or getattr(origin, "model", None) is user_model:
+            return  # the user goes too, and their tombstones with them
+        cls.record([(subscription.pk, subscription.user_id, subscription.provider_id)], using=using)
+
+
+class UserSpendRollup(models.Model):
+    """
+    Materialized spend per (user, provider), maintained incrementally by
+    core.receivers and rebuilt/verified by `manage.py rebuild_rollups`.
+    Stores the exact spend "parts" (see utils.monthly_from_parts) so that
+    deltas never accumulate rounding error; monthly/yearly are derived.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="spend_rollups")
+    provider = models.ForeignKey("core.Provider", on_delete=models.CASCADE, related_name="spend_rollups")
+    count = models.IntegerField(default=0)
+    monthly_part = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    yearly_part = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    custom_part = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "provider"], name="uniq_rollup_user_provider"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} • {self.provider_id} • {self.count}"
+
+    @property
+    def monthly(self) -> Decimal:
+        return monthly_from_parts(self.monthly_part, self.yearly_part, self.custom_part)
+
+    @property
+    def yearly(self) -> Decimal:
+        return yearly_from_parts(self.monthly_part, self.yearly_part, self.custom_part)
+
+
+class SpendSnapshot(models.Model):
+    """
+    Daily spend history per (user, provider), stored as change points: a row
+    holds the rollup parts from `day` until the next row for the same
+    (user, provider), and a count=0 row closes a provider. Written by
+    `manage.py snapshot_spend` (core.snapshots), read by /api/dashboard/history.
+    provider_id is a plain integer so history survives deleting the provider.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="spend_snapshots")
+    provider_id = models.BigIntegerField()
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    monthly_part = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    yearly_part = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    custom_part = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "provider_id", "day"], name="uniq_snapshot_user_provider_day"),
+        ]
+        indexes = [models.Index(fields=["user", "day"])]
+
+    def __str__(self):
+        return f"{self.user_id} • {self.provider_id} • {self.day} • {self.count}"
+
+class ProviderStats(models.Model):
+    """
+    Global numbers per provider for /api/providers/stats and
+    ?ordering=popularity, refreshed by `manage.py refresh_provider_stats`
+    (core.provider_stats) for the providers whose subscriptions changed.
+    Costs are monthly equivalents in cents. dirty: a subscription moved away
+    from this provider, refresh it on the next run.
+    """
+    provider = models.OneToOneField("core.Provider", on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    subscribers = models.IntegerField(default=0)  # distinct users
+    subscriptions = models.IntegerField(default=0)
+    avg_monthly_cents = models.BigIntegerField(default=0)
+    median_monthly_cents = models.BigIntegerField(default=0)
+    monthly_count = models.IntegerField(default=0)
+    yearly_count = models.IntegerField(default=0)
+    custom_count = models.IntegerField(default=0)
+    dirty = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.provider_id} • {self.subscribers} subscribers"
+
+class JobCheckpoint(models.Model):
+    """
+    Progress marker for resumable batch jobs (e.g. roll_renewals).
+    state: free-form JSON owned by the job.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ReminderDelivery(models.Model):
+    """
+    One renewal reminder (subscription, renewal date), claimed before the
+    digest containing it is sent (see core.reminders). The unique constraint
+    makes the claim the idempotency check: a rerun can't claim it again.
+    """
+    PENDING = "pending"  # claimed; stays pending if the run died before marking it
+    SENT = "sent"
+    FAILED = "failed"  # the send raised; retried with --retry-failed
+    SKIPPED = "skipped"  # user has no email address
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed"), (SKIPPED, "Skipped")]
+
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name="reminders")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reminders")
+    renewal_date = models.DateField()
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    claim = models.CharField(max_length=32, blank=True)  # token of the run that owns it
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["subscription", "renewal_date"], name="uniq_reminder_sub_renewal"),
+        ]
+
+    def __str__(self):
+        return f"{self.subscription_id} @ {self.renewal_date}: {self.status}"
+
+class CalendarFeed(models.Model):
+    """
+    Per-user secret mixed into the iCalendar feed token (core.ical).
+    Rotating the key revokes every URL handed out before.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="calendar_feed")
+    key = models.CharField(max_length=32)
+    rotated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} • {self.rotated_at}"
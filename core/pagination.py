@@ -0,0 +1,204 @@
+"""
+Keyset ("cursor") pagination.
+
+Pages are selected with WHERE (key, id) > (last key, last id) ... LIMIT n
+instead of COUNT(*) + OFFSET, so page 500 costs the same single index range
+scan as page 1. The key is the first term of the view's `ordering`
+(?ordering= is honoured), with the primary key as tie-breaker.
+NULL keys sort as the smallest value, like MySQL/SQLite do natively.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .filters import OrderingFilter
+
+
+def _encode_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()  # full precision: keys must round-trip exactly
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(term, value, pk, reverse=False):
+    payload = {"o": term, "v": _encode_value(value), "pk": pk}
+    if reverse:
+        payload["r"] = 1
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """-> (term, raw value, pk, reverse); raises ValueError on garbage."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return payload["o"], payload["v"], payload["pk"], bool(payload.get("r"))
+    except (TypeError, KeyError, ValueError, AttributeError) as exc:
+        raise ValueError(str(exc)) from exc
+
+
+def keyset_after(field, value, pk, descending=False, nullable=True):
+    """
+    Q for rows strictly after (value, pk) in the scan order
+    ORDER BY field [DESC], pk [DESC], with NULL as the smallest value.
+    Written as `field >= v AND (field > v OR pk > p)` so the key stays sargable.
+    """
+    gt, gte, pk_after = ("lt", "lte", "pk__lt") if descending else ("gt", "gte", "pk__gt")
+    if value is None:
+        # within the NULL block, then (ascending only) every non-NULL row
+        q = Q(**{f"{field}__isnull": True, pk_after: pk})
+        return q if descending else q | Q(**{f"{field}__isnull": False})
+    q = Q(**{f"{field}__{gte}": value}) & (Q(**{f"{field}__{gt}": value}) | Q(**{pk_after: pk}))
+    if descending and nullable:
+        q |= Q(**{f"{field}__isnull": True})
+    return q
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering = "-pk"  # used when the view has no ordering of its own
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        The sliced queryset for the requested page (page_size + 1 rows, the
+        extra one tells us whether there is a next page). Async callers
+        evaluate it themselves and hand the rows to set_page().
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.term = self.get_ordering_term(request, queryset, view)
+        self.field = self.term.lstrip("-")
+        descending = self.term.startswith("-")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        position, reverse = None, False
+        if cursor:
+            position, reverse = self.decode_position(cursor, queryset)
+
+        # a "previous" page is read backwards from the cursor and flipped
+        scan_desc = descending != reverse
+        qs = queryset.order_by(*self.order_by(scan_desc))
+        if position is not None:
+            qs = qs.filter(keyset_after(self.field, *position, scan_desc, self.is_nullable(queryset)))
+
+        self.position, self.reverse = position, reverse
+        return qs[: self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering_term(self, request, queryset, view):
+        terms = OrderingFilter().get_ordering(request, queryset, view) if view else None
+        return (terms or [self.ordering])[0]
+
+    def order_by(self, descending):
+        if descending:
+            return [F(self.field).desc(nulls_last=True), "-pk"]
+        return [F(self.field).asc(nulls_first=True), "pk"]
+
+    def is_nullable(self, queryset):
+        try:
+            return queryset.model._meta.get_field(self.field).null
+        except FieldDoesNotExist:
+            return True  # annotation: be safe
+
+    def decode_position(self, cursor, queryset):
+        try:
+            term, value, pk, reverse = decode_cursor(cursor)
+            if term != self.term:
+                # ordering changed since the cursor was issued
+                raise ValueError(term)
+            if value is not None:
+                try:
+                    value = queryset.model._meta.get_field(self.field).to_python(value)
+                except FieldDoesNotExist:
+                    pass
+            pk = queryset.model._meta.pk.to_python(pk)
+            if pk is None:
+                raise ValueError(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), reverse
+
+    def position_of(self, row):
+        if isinstance(row, dict):
+            return row[self.field], row.get("pk", row.get("id"))
+        return getattr(row, self.field), row.pk
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        value, pk = self.position_of(self.page[-1])
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(self.term, value, pk))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        value, pk = self.position_of(self.page[0])
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(self.term, value, pk, reverse=True))
+
+
+class SubscriptionPagination(KeysetPagination):
+    # (next_renewal_date, id) rides the (user, next_renewal_date) index
+    ordering = "next_renewal_date"
+
+
+class ProviderPagination(KeysetPagination):
+    ordering = "name"
@@ -0,0 +1,139 @@
+"""
+Global provider statistics (ProviderStats), refreshed incrementally.
+
+refresh() recomputes only the providers whose subscriptions changed since
+the previous run: written ones (Subscription.updated_at), deleted ones
+(SubscriptionTombstone.provider_id) and those flagged dirty when a
+subscription moved to another provider. Each provider is recomputed
+exactly from its rows: one grouped query per chunk, plus one
+index-only OFFSET read per provider for the median (the (provider,
+monthly_cost_cents) index). Without a previous run, with full=True, or when
+the tombstones since the last run were compacted, every provider is done.
+
+The public endpoint never touches Subscription: it reads the stats table,
+and its payload is cached under a version stamp that refresh() bumps.
+"""
+from datetime import datetime
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+from .cache import bump_versions, get_version, response_cache_timeout
+from .models import JobCheckpoint, Provider, ProviderStats, Subscription, SubscriptionTombstone, upsert
+from .sync import compaction_horizon, overlap
+from .utils import format_cents
+
+CHECKPOINT = "provider_stats"
+VERSION = "provider-stats"  # core.cache version stamp of the cached payloads
+PAYLOAD_KEY = "st:providerstats:{}:{}"
+FIELDS = (
+    "subscribers", "subscriptions", "avg_monthly_cents", "median_monthly_cents",
+    "monthly_count", "yearly_count", "custom_count", "dirty", "updated_at",
+)
+
+
+def changed_providers(since):
+    # index-only range reads, deduplicated here (same as core.snapshots.changed_users)
+    written = Subscription.objects.filter(updated_at__gte=since).order_by().values_list("provider_id", flat=True)
+    deleted = (
+        SubscriptionTombstone.objects.filter(deleted_at__gte=since, provider_id__isnull=False)
+        .order_by().values_list("provider_id", flat=True)
+    )
+    dirty = ProviderStats.objects.filter(dirty=True).values_list("provider_id", flat=True)
+    return set(written.iterator()) | set(deleted.iterator()) | set(dirty)
+
+
+def median_cents(provider_id, n):
+    if not n:
+        return 0
+    middle = list(
+        Subscription.objects.filter(provider_id=provider_id).order_by("monthly_cost_cents")
+        .values_list("monthly_cost_cents", flat=True)[(n - 1) // 2:n // 2 + 1]
+    )
+    return round(sum(middle) / len(middle))
+
+
+def compute(provider_ids):
+    """Fresh (unsaved) ProviderStats for `provider_ids` (providers that still exist)."""
+    provider_ids = list(Provider.objects.filter(pk__in=provider_ids).values_list("pk", flat=True))
+    grouped = {
+        r.pop("provider_id"): r
+        for r in (
+            Subscription.objects.filter(provider_id__in=provider_ids).order_by().values("provider_id")
+            .annotate(
+                subscriptions=Count("id"),
+                subscribers=Count("user_id", distinct=True),
+                avg=Avg("monthly_cost_cents"),
+                monthly_count=Count("id", filter=Q(billing_cycle=Subscription.MONTHLY)),
+                yearly_count=Count("id", filter=Q(billing_cycle=Subscription.YEARLY)),
+                custom_count=Count("id", filter=Q(billing_cycle=Subscription.CUSTOM)),
+            )
+        )
+    }
+    stats = []
+    for pk in provider_ids:
+        row = grouped.get(pk, {"subscriptions": 0, "avg": None})
+        avg = row.pop("avg")
+        stats.append(ProviderStats(
+            provider_id=pk,
+            avg_monthly_cents=round(avg or 0),
+            median_monthly_cents=median_cents(pk, row["subscriptions"]),
+            **row,
+        ))
+    return stats
+
+
+def mark_dirty(provider_ids, using=None):
+    """Subscriptions left these providers: refresh them on the next run."""
+    ProviderStats.objects.using(using).filter(provider_id__in=provider_ids).update(dirty=True)
+
+
+def refresh(full=False, chunk_size=500):
+    """Returns {"providers": refreshed count, "full": bool}."""
+    started = timezone.now()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    since = datetime.fromisoformat(checkpoint.state["at"]) - overlap() if checkpoint.state.get("at") else None
+    horizon = compaction_horizon()
+    full = full or since is None or (horizon is not None and since < horizon)
+    if full:
+        ids = list(Provider.objects.order_by("pk").values_list("pk", flat=True))
+    else:
+        ids = sorted(changed_providers(since))
+
+    for i in range(0, len(ids), chunk_size):
+        with transaction.atomic():
+            upsert(ProviderStats, compute(ids[i:i + chunk_size]), ["provider"], list(FIELDS))
+
+    checkpoint.state = {"at": started.isoformat()}
+    checkpoint.save(update_fields=["state", "updated_at"])
+    if ids:
+        bump_versions([VERSION])
+    return {"providers": len(ids), "full": full}
+
+
+def payload(limit):
+    """The /api/providers/stats body for the `limit` most popular providers, cached per stats version."""
+    key = PAYLOAD_KEY.format(get_version(VERSION), limit)
+    data = cache.get(key)
+    if data is None:
+        rows = (
+            ProviderStats.objects.filter(subscriptions__gt=0)
+            .order_by("-subscribers", "provider_id")
+            .values("provider_id", "provider__name", *FIELDS[:-2])[:limit]
+        )
+        data = [
+            {
+                "provider_id": r["provider_id"],
+                "provider": r["provider__name"],
+                "subscribers": r["subscribers"],
+                "subscriptions": r["subscriptions"],
+                "avg_monthly_cost": format_cents(r["avg_monthly_cents"]),
+                "median_monthly_cost": format_cents(r["median_monthly_cents"]),
+                "billing_cycles": {
+                    "monthly": r["monthly_count"], "yearly": r["yearly_count"], "custom": r["custom_count"],
+                },
+            }
+            for r in rows
+        ]
+        cache.set(key, data, response_cache_timeout())
+    return data
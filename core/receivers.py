@@ -0,0 +1,96 @@
+"""
+Signal receivers, connected in CoreConfig.ready().
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+from . import authentication, ical, provider_stats, rollups, search
+from .cache import bump_versions, user_data_changed
+from .models import CalendarFeed, Provider, Subscription, SubscriptionTombstone
+from .signals import subscriptions_bulk_changed
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, **kwargs):
+    new = instance.spend_key()
+    old = getattr(instance, "_spend_snapshot", None)
+    if created:
+        rollups.apply_deltas(rollups.add_delta(rollups.new_deltas(), new))
+    elif old is None:
+        # instance wasn't loaded from the DB (or had deferred fields): no delta to apply
+        rollups.sync_users({instance.user_id})
+    elif old != new:
+        deltas = rollups.add_delta(rollups.new_deltas(), old, sign=-1)
+        rollups.apply_deltas(rollups.add_delta(deltas, new))
+        if old[1] != new[1]:
+            provider_stats.mark_dirty([old[1]], using=kwargs.get("using"))
+    user_data_changed({instance.user_id, *(old[:1] if old else ())}, using=kwargs.get("using"))
+    instance._spend_snapshot = new
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    # also runs for cascades (Provider/User deletes): the collector sends
+    # post_delete per row whenever a receiver is connected
+    rollups.apply_deltas(rollups.add_delta(rollups.new_deltas(), instance.spend_key(), sign=-1))
+    user_data_changed({instance.user_id}, using=kwargs.get("using"))
+    SubscriptionTombstone.record_deleted(instance, kwargs.get("origin"), using=kwargs.get("using"))
+
+
+@receiver(subscriptions_bulk_changed, sender=Subscription)
+def subscriptions_bulk_changed_rollups(sender, user_ids, objs=None, fields=None, **kwargs):
+    if objs is not None:
+        deltas = rollups.new_deltas()
+        for obj in objs:
+            rollups.add_delta(deltas, obj.spend_key())
+        rollups.apply_deltas(deltas)
+    elif fields is None or fields & {"user", "provider", *Subscription.SPEND_FIELDS}:
+        rollups.sync_users(user_ids)
+
+
+@receiver(subscriptions_bulk_changed, sender=Subscription)
+def subscriptions_bulk_changed_providers(sender, old_provider_ids=(), **kwargs):
+    # rows that left a provider don't show in its updated_at range: flag it
+    if old_provider_ids:
+        provider_stats.mark_dirty(old_provider_ids)
+
+
+@receiver(subscriptions_bulk_changed, sender=Subscription)
+def subscriptions_bulk_changed_cache(sender, user_ids, **kwargs):
+    user_data_changed(user_ids)
+
+
+@receiver(post_save, sender=Provider)
+def provider_saved(sender, instance, created, **kwargs):
+    pk, name = instance.pk, instance.name
+    transaction.on_commit(lambda: search.provider_changed(pk, name), using=kwargs.get("using"))
+    bump_versions([provider_stats.VERSION])  # the stats payload shows provider names
+    if not created:
+        # so do the lists, dashboards and feeds of everyone subscribed to it
+        subscribers = (
+            Subscription.objects.using(kwargs.get("using")).filter(provider_id=pk)
+            .values_list("user_id", flat=True).distinct()
+        )
+        user_data_changed(subscribers, using=kwargs.get("using"))
+
+
+@receiver(post_delete, sender=Provider)
+def provider_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: search.provider_changed(pk), using=kwargs.get("using"))
+    bump_versions([provider_stats.VERSION])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # deactivation, password change...: drop the cached copy used by CachedJWTAuthentication
+    authentication.forget_user(getattr(instance, api_settings.USER_ID_FIELD), using=kwargs.get("using"))
+
+
+@receiver(post_delete, sender=CalendarFeed)
+def calendar_feed_deleted(sender, instance, **kwargs):
+    # the user is gone: their feed URLs must stop working everywhere, not just after eviction
+    ical.forget_key(instance.user_id)
@@ -0,0 +1,157 @@
+"""
+Renewal reminder pipeline (`manage.py send_reminders`).
+
+Subscriptions renewing in [today, today + days] are read in
+(user, next_renewal_date) index order, batch_size rows at a time, and grouped
+into one digest email per user. Each batch is claimed in ReminderDelivery
+with one bulk INSERT that ignores conflicts before anything is sent, so a
+rerun (or a concurrent run) only ever gets reminders nobody claimed yet.
+Digests go out through a thread pool; the delivery rows are then marked
+with one UPDATE per outcome (sent/failed/skipped).
+
+Delivery is at most once: a run that dies between sending and marking
+leaves its rows "pending", and they are never sent again.
+"""
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import reduce
+from itertools import groupby
+from operator import attrgetter, or_
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.db.models import Q
+from django.utils import timezone
+from .models import ReminderDelivery, Subscription
+
+ROW_FIELDS = ("pk", "user_id", "next_renewal_date", "price", "currency", "plan_name", "provider__name")
+
+
+def due_rows(today, days):
+    return (
+        Subscription.objects
+        .filter(next_renewal_date__gte=today, next_renewal_date__lte=today + timedelta(days=days))
+        .order_by("user_id", "next_renewal_date", "pk")
+        .values_list(*ROW_FIELDS, named=True)
+    )
+
+
+def scan(today, days, batch_size=1000):
+    """
+    Yield batches of due rows, about batch_size each, never splitting a user
+    across batches (a user's digest must be built from all their rows).
+    """
+    rows = due_rows(today, days)
+    last_user = None
+    while True:
+        qs = rows if last_user is None else rows.filter(user_id__gt=last_user)
+        batch = list(qs[:batch_size])
+        if not batch:
+            return
+        if len(batch) == batch_size:
+            # the last user may continue past the slice: leave them for the next batch
+            tail = batch[-1].user_id
+            head = [r for r in batch if r.user_id != tail]
+            batch = head or list(rows.filter(user_id=tail))
+        yield batch
+        last_user = batch[-1].user_id
+
+
+def claim(batch, token, retry_failed=False):
+    """Claim the batch's reminders for `token`; returns {subscription_id: delivery pk} of ours."""
+    ReminderDelivery.objects.bulk_create(
+        [
+            ReminderDelivery(subscription_id=r.pk, user_id=r.user_id, renewal_date=r.next_renewal_date, claim=token)
+            for r in batch
+        ],
+        ignore_conflicts=True,
+    )
+    if retry_failed:
+        pairs = reduce(or_, (Q(subscription_id=r.pk, renewal_date=r.next_renewal_date) for r in batch))
+        ReminderDelivery.objects.filter(pairs, status=ReminderDelivery.FAILED).update(
+            status=ReminderDelivery.PENDING, claim=token
+        )
+    return dict(
+        ReminderDelivery.objects
+        .filter(claim=token, status=ReminderDelivery.PENDING, subscription_id__in=[r.pk for r in batch])
+        .values_list("subscription_id", "pk")
+    )
+
+
+def digest(rows):
+    """(subject, body) of one user's reminder email."""
+    n = len(rows)
+    subject = f"{n} subscription{'s' if n != 1 else ''} renewing soon"
+    lines = [
+        f"- {r.provider__name}{f' ({r.plan_name})' if r.plan_name else ''}: "
+        f"{r.price} {r.currency} on {r.next_renewal_date.isoformat()}"
+        for r in rows
+    ]
+    return subject, "Upcoming renewals:\n\n" + "\n".join(lines) + "\n"
+
+
+def send_digest(email, rows):
+    subject, body = digest(rows)
+    send_mail(subject, body, None, [email])
+
+
+def run(today=None, days=3, batch_size=1000, workers=4, retry_failed=False, progress=None):
+    """
+    Send every due reminder not sent before. Returns counters plus timings:
+    scanned, claimed, already (claimed by an earlier run), users, sent,
+    failed, skipped, seconds, emails_per_s.
+    """
+    today = today or date.today()
+    token = uuid.uuid4().hex
+    stats = Counter()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in scan(today, days, batch_size):
+            stats["scanned"] += len(batch)
+            ours = claim(batch, token, retry_failed)
+            stats["claimed"] += len(ours)
+            stats["already"] += len(batch) - len(ours)
+
+            groups = [
+                (user_id, rows)
+                for user_id, group in groupby(batch, key=attrgetter("user_id"))
+                if (rows := [r for r in group if r.pk in ours])
+            ]
+            emails = dict(
+                get_user_model().objects.filter(pk__in=[u for u, _ in groups]).values_list("pk", "email")
+            )
+            sends = {
+                user_id: pool.submit(send_digest, emails[user_id], rows)
+                for user_id, rows in groups if emails.get(user_id)
+            }
+
+            outcome = {ReminderDelivery.SENT: [], ReminderDelivery.FAILED: [], ReminderDelivery.SKIPPED: []}
+            for user_id, rows in groups:
+                future = sends.get(user_id)
+                if future is None:
+                    status = ReminderDelivery.SKIPPED
+                else:
+                    status = ReminderDelivery.SENT if future.exception() is None else ReminderDelivery.FAILED
+                stats[status] += 1
+                outcome[status] += [ours[r.pk] for r in rows]
+            stats["users"] += len(groups)
+
+            now = timezone.now()
+            for status, pks in outcome.items():
+                if pks:
+                    ReminderDelivery.objects.filter(pk__in=pks).update(
+                        status=status, sent_at=now if status == ReminderDelivery.SENT else None
+                    )
+            if progress:
+                progress(stats)
+
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["emails_per_s"] = round(stats[ReminderDelivery.SENT] / seconds, 1) if seconds else 0.0
+    return {k: stats[k] for k in (
+        "scanned", "claimed", "already", "users", ReminderDelivery.SENT, ReminderDelivery.FAILED,
+        ReminderDelivery.SKIPPED, "seconds", "emails_per_s",
+    )}
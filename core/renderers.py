@@ -0,0 +1,41 @@
+"""
+JSONRenderer on orjson.
+
+Same bytes as DRF's JSONRenderer (compact, UTF-8, U+2028/U+2029 escaped) for
+the payloads this API produces, several times faster on large lists.
+Dates/times, Decimals and anything else orjson doesn't know go through DRF's
+own JSONEncoder.default(), so they come out as before. Falls back to
+JSONRenderer for what orjson refuses (non-string keys, huge ints...), for
+?indent= / browsable API output, and when orjson isn't installed. Floats may
+differ in exponent notation (1e16 vs 1e+16); the serializers here emit
+decimals as strings.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: plain JSONRenderer then
+    orjson = None
+
+_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    options = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=self.options)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
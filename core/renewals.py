@@ -0,0 +1,119 @@
+"""
+Roll-forward of stale renewal dates.
+
+Subscription.save() only sets next_renewal_date once. For auto-renewing
+subscriptions whose date has passed, roll_forward() jumps straight to the
+first renewal on/after `today` (however many cycles that is), and the engine
+applies those updates with chunked bulk_update(), split by user-id range
+across an optional process pool, with a JobCheckpoint for resuming.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from django.db import connections
+from django.db.models import Max, Min
+from . import workers as pool_workers
+from .models import JobCheckpoint, Subscription
+from .utils import cycle_length_days
+
+CHECKPOINT = "roll_renewals"
+
+
+def roll_forward(next_date, cycle_days, today):
+    """First date >= today reachable from next_date in steps of cycle_days."""
+    if next_date >= today:
+        return next_date
+    behind = (today - next_date).days
+    cycles = -(-behind // cycle_days)  # ceil
+    return next_date + timedelta(days=cycles * cycle_days)
+
+
+def due(today):
+    return Subscription.objects.filter(auto_renew=True, next_renewal_date__lt=today)
+
+
+def plan_ranges(today, range_size):
+    """
+    [lo, hi) user-id ranges covering every user with something due. Ranges
+    start at multiples of range_size, so a resumed run plans the same ranges
+    as the interrupted one and finds them in the checkpoint.
+    """
+    bounds = due(today).aggregate(lo=Min("user_id"), hi=Max("user_id"))
+    if bounds["lo"] is None:
+        return []
+    start = bounds["lo"] // range_size * range_size
+    return [(lo, lo + range_size) for lo in range(start, bounds["hi"] + 1, range_size)]
+
+
+def roll_range(lo, hi, today, chunk_size=2000, dry_run=False):
+    """
+    Advance every due subscription of users in [lo, hi). Reads in primary-key
+    chunks (no long-lived cursor over the table we're updating), so memory
+    stays at one chunk. Returns (lo, scanned, advanced).
+    """
+    rows = (
+        due(today)
+        .filter(user_id__gte=lo, user_id__lt=hi)
+        .order_by("pk")
+        .values_list("pk", "user_id", "next_renewal_date", "billing_cycle", "custom_cycle_days")
+    )
+    scanned = advanced = 0
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+        scanned += len(chunk)
+        updates = [
+            Subscription(
+                pk=pk, user_id=user_id,
+                next_renewal_date=roll_forward(next_date, cycle_length_days(cycle, days), today),
+            )
+            for pk, user_id, next_date, cycle, days in chunk
+        ]
+        advanced += len(updates)
+        if not dry_run:
+            Subscription.objects.bulk_update(updates, ["next_renewal_date"], batch_size=chunk_size)
+    return lo, scanned, advanced
+
+
+def run(today=None, workers=1, range_size=10000, chunk_size=2000, dry_run=False, resume=False, progress=None):
+    """
+    Roll every due subscription forward. Completed ranges are recorded in the
+    JobCheckpoint, so with resume=True a crashed run for the same day picks up
+    where it stopped. Returns {"ranges", "skipped", "scanned", "advanced"}.
+    """
+    today = today or date.today()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    state = checkpoint.state
+    if not resume or state.get("today") != today.isoformat() or state.get("range_size") != range_size:
+        state = {"today": today.isoformat(), "range_size": range_size, "done": []}
+    done = set(state["done"])
+
+    ranges = [r for r in plan_ranges(today, range_size) if r[0] not in done]
+    totals = {"ranges": len(ranges), "skipped": len(done), "scanned": 0, "advanced": 0}
+
+    def record(lo, scanned, advanced):
+        totals["scanned"] += scanned
+        totals["advanced"] += advanced
+        if not dry_run:
+            state["done"].append(lo)
+            checkpoint.state = state
+            checkpoint.save(update_fields=["state", "updated_at"])
+        if progress:
+            progress(lo, scanned, advanced)
+
+    if workers <= 1:
+        for lo, hi in ranges:
+            record(*roll_range(lo, hi, today, chunk_size, dry_run))
+        return totals
+
+    # children open their own connections; don't let them inherit ours
+    connections.close_all()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=pool_workers.setup) as pool:
+        futures = [pool.submit(pool_workers.roll_range, lo, hi, today, chunk_size, dry_run) for lo, hi in ranges]
+        for future in as_completed(futures):
+            record(*future.result())
+    return totals
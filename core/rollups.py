@@ -0,0 +1,120 @@
+"""
+Incremental maintenance of UserSpendRollup.
+
+Single-row writes apply deltas (core.receivers); bulk paths and the
+rebuild_rollups command recompute whole users from Subscription rows.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .aggregates import part_annotations
+from .models import Subscription, UserSpendRollup
+
+PARTS = ("count", "monthly_part", "yearly_part", "custom_part")
+
+
+def contribution(user_id, provider_id, price, billing_cycle, custom_cycle_days):
+    """
+    What one subscription adds to its (user, provider) rollup, as
+    [count, monthly_part, yearly_part, custom_part]. Mirrors aggregates.part_annotations.
+    """
+    price = Decimal(price or 0)
+    zero = Decimal("0")
+    if billing_cycle == Subscription.MONTHLY:
+        return [1, price, zero, zero]
+    if billing_cycle == Subscription.YEARLY:
+        return [1, zero, price, zero]
+    return [1, zero, zero, price * (custom_cycle_days or 30)]
+
+
+def add_delta(deltas, spend_key, sign=1):
+    """Accumulate +/- one subscription (a Subscription.spend_key()) into `deltas`."""
+    user_id, provider_id = spend_key[0], spend_key[1]
+    current = deltas[(user_id, provider_id)]
+    for i, v in enumerate(contribution(*spend_key)):
+        current[i] += sign * v
+    return deltas
+
+
+def new_deltas():
+    return defaultdict(lambda: [0, Decimal("0"), Decimal("0"), Decimal("0")])
+
+
+def apply_deltas(deltas):
+    """Apply accumulated deltas with F() updates, creating/dropping rows as needed."""
+    for (user_id, provider_id), values in deltas.items():
+        if not any(values):
+            continue
+        changes = dict(zip(PARTS, values))
+        rows = UserSpendRollup.objects.filter(user_id=user_id, provider_id=provider_id)
+        updated = rows.update(**{k: F(k) + v for k, v in changes.items()})
+        if not updated and changes["count"] > 0:
+            try:
+                with transaction.atomic():
+                    UserSpendRollup.objects.create(user_id=user_id, provider_id=provider_id, **changes)
+            except IntegrityError:
+                # someone else created it in the meantime
+                rows.update(**{k: F(k) + v for k, v in changes.items()})
+        elif changes["count"] < 0:
+            rows.filter(count__lte=0).delete()
+
+
+def user_rows_queryset(user_id):
+    return UserSpendRollup.objects.filter(user_id=user_id, count__gt=0).values("provider_id", "provider__name", *PARTS)
+
+
+def summary_row(row):
+    """values() row -> the shape aggregates.summarize() expects."""
+    row["provider"] = row.pop("provider__name")
+    return row
+
+
+def user_rows(user_id):
+    """A user's rollups in the shape aggregates.summarize() expects."""
+    return [summary_row(r) for r in user_rows_queryset(user_id)]
+
+
+def sync_users(user_ids, repair=True):
+    """
+    Recompute the rollups of `user_ids` from Subscription rows.
+    Returns the number of (user, provider) rows that were missing, stale or
+    wrong. With repair=False nothing is written (verify mode).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    expected = {
+        (r["user_id"], r["provider_id"]): r
+        for r in (
+            Subscription.objects
+            .filter(user_id__in=user_ids)
+            .order_by()
+            .values("user_id", "provider_id")
+            .annotate(**part_annotations())
+        )
+    }
+    existing = {
+        (r.user_id, r.provider_id): r
+        for r in UserSpendRollup.objects.filter(user_id__in=user_ids)
+    }
+
+    to_create, to_update = [], []
+    for key, row in expected.items():
+        current = existing.pop(key, None)
+        if current is None:
+            to_create.append(UserSpendRollup(
+                user_id=key[0], provider_id=key[1], **{p: row[p] for p in PARTS}
+            ))
+        elif any(getattr(current, p) != row[p] for p in PARTS):
+            for p in PARTS:
+                setattr(current, p, row[p])
+            to_update.append(current)
+    stale = [r.pk for r in existing.values()]
+
+    if repair and (to_create or to_update or stale):
+        with transaction.atomic():
+            UserSpendRollup.objects.filter(pk__in=stale).delete()
+            UserSpendRollup.objects.bulk_update(to_update, PARTS)
+            UserSpendRollup.objects.bulk_create(to_create, ignore_conflicts=True)
+    return len(to_create) + len(to_update) + len(stale)
@@ -0,0 +1,238 @@
+"""
+In-process provider typeahead index (GET /api/providers/?q=).
+
+`name__icontains` is a LIKE '%term%' that can't use the index on
+Provider.name, so typeahead is answered from memory instead:
+
+  - a sorted array of normalized names (and of every later word start) for
+    prefix matches: bisect + a short forward scan,
+  - trigram postings for fuzzy matches (pg_trgm-style similarity).
+
+The index is built lazily, once per worker process, and kept current by the
+Provider receivers (core.receivers) after each commit. Other workers notice a
+write through a version stamp in the cache (checked at most every
+PROVIDER_INDEX_CHECK_INTERVAL seconds) and rebuild, so the cache must be
+shared by all workers (core.checks). In-place updates and reads of one index
+take its lock: threaded servers search while a write updates it.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+VERSION_KEY = "st:providers:ver"
+SIMILARITY = 0.3  # minimum trigram similarity for a fuzzy match
+MAX_LIMIT = 50
+
+EXACT, PREFIX, WORD, FUZZY = "exact", "prefix", "word", "fuzzy"
+
+
+def normalize(text):
+    """Case-, accent- and whitespace-insensitive form used for matching."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def trigrams(norm):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_starts(norm):
+    """Offsets of every word after the first ("max" in "hbo max")."""
+    return [m.start() for m in re.finditer(r"\w+", norm) if m.start() > 0]
+
+
+class ProviderIndex:
+    def __init__(self, rows=()):
+        """`rows`: iterable of (pk, name)."""
+        self.names = {}  # pk -> name as stored
+        self.norms = {}  # pk -> normalize(name)
+        self.prefixes = []  # sorted [(norm, pk)]
+        self.words = []  # sorted [(norm[word start:], pk)]
+        self.postings = defaultdict(set)  # trigram -> {pk}
+        self.gram_counts = {}  # pk -> len(trigrams(norm))
+        self.lock = threading.Lock()
+        for pk, name in rows:
+            self._insert(pk, name, sort=False)
+        self.prefixes.sort()
+        self.words.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _insert(self, pk, name, sort=True):
+        norm = normalize(name)
+        self.names[pk], self.norms[pk] = name, norm
+        put = insort if sort else list.append
+        put(self.prefixes, (norm, pk))
+        for start in word_starts(norm):
+            put(self.words, (norm[start:], pk))
+        grams = trigrams(norm)
+        self.gram_counts[pk] = len(grams)
+        for gram in grams:
+            self.postings[gram].add(pk)
+
+    def add(self, pk, name):
+        """Insert or rename provider `pk`."""
+        with self.lock:
+            if self.names.get(pk) == name:
+                return
+            self._remove(pk)
+            self._insert(pk, name)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        norm = self.norms.pop(pk, None)
+        if norm is None:
+            return
+        del self.names[pk], self.gram_counts[pk]
+        _discard(self.prefixes, (norm, pk))
+        for start in word_starts(norm):
+            _discard(self.words, (norm[start:], pk))
+        for gram in trigrams(norm):
+            pks = self.postings[gram]
+            pks.discard(pk)
+            if not pks:
+                del self.postings[gram]
+
+    def search(self, query, limit=10):
+        """
+        Up to `limit` [(pk, name, kind)]: the exact match, then name prefix
+        matches, then word prefix matches (both alphabetical), then fuzzy
+        matches by descending similarity.
+        """
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        with self.lock:
+            return self._search(q, limit)
+
+    def _search(self, q, limit):
+        found = {}
+        # q itself sorts before every longer key it prefixes: exact matches come first
+        for pk in self._scan(self.prefixes, q, limit, found):
+            found[pk] = EXACT if self.norms[pk] == q else PREFIX
+        if len(found) < limit:
+            for pk in self._scan(self.words, q, limit - len(found), found):
+                found[pk] = WORD
+        if len(found) < limit and len(q) >= 3:
+            for pk in self._fuzzy(q, limit - len(found), found):
+                found[pk] = FUZZY
+        return [(pk, self.names[pk], kind) for pk, kind in found.items()]
+
+    def lookup(self, name):
+        """pks whose name equals `name`, ignoring case, accents and spacing."""
+        q = normalize(name)
+        pks = []
+        with self.lock:
+            i = bisect_left(self.prefixes, (q,))
+            while i < len(self.prefixes) and self.prefixes[i][0] == q:
+                pks.append(self.prefixes[i][1])
+                i += 1
+        return pks
+
+    def _scan(self, keys, q, limit, seen):
+        i = bisect_left(keys, (q,))
+        hits = []
+        while i < len(keys) and len(hits) < limit and keys[i][0].startswith(q):
+            pk = keys[i][1]
+            if pk not in seen and pk not in hits:
+                hits.append(pk)
+            i += 1
+        return hits
+
+    def _fuzzy(self, q, limit, seen):
+        grams = trigrams(q)
+        lists = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        # similarity = shared / (|q| + |name| - shared) <= shared / |q|, so a match
+        # shares at least `need` trigrams and must appear in one of the
+        # len - need + 1 shortest posting lists (prefix filtering)
+        need = max(1, math.ceil(SIMILARITY * len(grams)))
+        candidates = set().union(*lists[: len(lists) - need + 1])
+        scored = []
+        for pk in candidates:
+            if pk in seen:
+                continue
+            n = sum(pk in pks for pks in lists)
+            score = n / (len(grams) + self.gram_counts[pk] - n)
+            if score >= SIMILARITY:
+                scored.append((-score, self.norms[pk], pk))
+        return [pk for _, _, pk in heapq.nsmallest(limit, scored)]
+
+
+def _discard(keys, item):
+    i = bisect_left(keys, item)
+    if i < len(keys) and keys[i] == item:
+        del keys[i]
+
+
+# -- the per-process shared index ------------------------------------------
+
+_lock = threading.Lock()
+_index = None
+_version = None
+_checked_at = 0.0
+
+
+def check_interval():
+    return getattr(settings, "PROVIDER_INDEX_CHECK_INTERVAL", 1.0)
+
+
+def get_index():
+    """This worker's index, (re)built from the DB if missing or stale."""
+    global _index, _version, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < check_interval():
+        return _index
+    # read the version before loading: a write that lands mid-load leaves us
+    # with an older stamp, and the next check rebuilds
+    version = cache.get(VERSION_KEY)
+    with _lock:
+        if _index is None or version != _version:
+            from .models import Provider
+            # from the primary: the stamp says it's current, a lagging replica may not be
+            providers = Provider.objects.db_manager(DEFAULT_DB_ALIAS).order_by().values_list("pk", "name")
+            _index = ProviderIndex(providers.iterator())
+            _version = version
+        _checked_at = now
+    return _index
+
+
+def provider_changed(pk, name=None):
+    """
+    Called after a Provider write commits (name=None for deletes): updates
+    this worker's index in place and tells the others to rebuild.
+    """
+    global _version
+    previous = cache.get(VERSION_KEY)
+    stamp = time.time_ns()
+    cache.set(VERSION_KEY, stamp, None)
+    with _lock:
+        if _index is None:
+            return
+        if name is None:
+            _index.remove(pk)
+        else:
+            _index.add(pk, name)
+        if _version == previous:
+            # we were current before this write, so we still are
+            _version = stamp
+
+
+def reset():
+    """Drop this worker's index (tests, benchmarks)."""
+    global _index, _version, _checked_at
+    with _lock:
+        _index, _version, _checked_at = None, None, 0.0
@@ -0,0 +1,95 @@
+"""
+Synthetic data for benchmarks and local load testing (`manage.py seed_data`).
+
+Generates N users x M subscriptions over P providers with bulk inserts only.
+Distributions are loosely modelled on real subscription trackers: provider
+popularity is Zipf-like, most plans bill monthly, prices cluster around
+common price points, and a minority of users pay in other currencies.
+Deterministic for a given `seed`.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from .models import Provider, Subscription
+from .rollups import sync_users
+
+SEED_PASSWORD = "seed-pass-123"  # every seeded user can log in with this
+
+CYCLES = [(Subscription.MONTHLY, 70), (Subscription.YEARLY, 20), (Subscription.CUSTOM, 10)]
+CUSTOM_DAYS = [7, 14, 28, 90, 180]
+CURRENCIES = [("USD", 60), ("EUR", 20), ("GBP", 10), ("CAD", 6), ("JPY", 4)]
+PRICE_POINTS = ["0.99", "2.99", "4.99", "5.99", "7.99", "9.99", "11.99", "14.99", "15.49", "19.99", "22.99"]
+PLANS = ["", "", "Basic", "Standard", "Premium", "Family", "Student", "Duo"]
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def price_for(rng, cycle, currency):
+    price = Decimal(rng.choice(PRICE_POINTS))
+    if cycle == Subscription.YEARLY:
+        price = price * 10  # annual plans: ~2 months free
+    if currency == "JPY":
+        price = (price * 100).quantize(Decimal("1"))
+    return price
+
+
+def seed(users=100, subscriptions=10, providers=50, seed=0, prefix="seed", batch_size=5000, progress=None):
+    """
+    Create `users` users with `subscriptions` subscriptions each over
+    `providers` providers, plus their spend rollups. Returns the counts.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    password = make_password(SEED_PASSWORD)  # hash once, not per user
+
+    provs = Provider.objects.bulk_create(
+        [Provider(name=f"{prefix}-provider-{i:05d}", url=f"https://{prefix}-{i}.example.com") for i in range(providers)],
+        batch_size=batch_size,
+    )
+    popularity = [1 / (rank + 1) for rank in range(providers)]
+
+    created = 0
+    for start in range(0, users, batch_size):
+        batch = User.objects.bulk_create(
+            [
+                User(username=f"{prefix}-user-{i:07d}", email=f"{prefix}-user-{i}@example.com", password=password)
+                for i in range(start, min(start + batch_size, users))
+            ],
+            batch_size=batch_size,
+        )
+        if batch[0].pk is None:  # backends that don't return ids from bulk inserts
+            batch = list(User.objects.filter(username__in=[u.username for u in batch]).order_by("pk"))
+        subs = []
+        for user in batch:
+            currency = weighted(rng, CURRENCIES)
+            for provider in rng.choices(provs, popularity, k=subscriptions):
+                cycle = weighted(rng, CYCLES)
+                started = today - timedelta(days=rng.randint(0, 720))
+                sub = Subscription(
+                    user=user,
+                    provider=provider,
+                    plan_name=rng.choice(PLANS),
+                    price=price_for(rng, cycle, currency),
+                    currency=currency,
+                    billing_cycle=cycle,
+                    custom_cycle_days=rng.choice(CUSTOM_DAYS) if cycle == Subscription.CUSTOM else 0,
+                    start_date=started,
+                    next_renewal_date=today + timedelta(days=rng.randint(-10, 365)),
+                    auto_renew=rng.random() < 0.85,
+                )
+                sub.set_costs()
+                subs.append(sub)
+        # plain manager: skip the per-(user, provider) rollup deltas the bulk
+        # signal would apply, and rebuild the batch's rollups in one go instead
+        Subscription._base_manager.bulk_create(subs, batch_size=batch_size)
+        sync_users([u.pk for u in batch])
+        created += len(subs)
+        if progress:
+            progress(start + len(batch), created)
+
+    return {"users": users, "subscriptions": created, "providers": len(provs)}
@@ -1,32 +1,62 @@
 from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import serializers
-from .models import Provider, Subscription
+from . import hashing
+from .models import Provider, Subscription, email_key
+from .utils import format_cents
 
 class RegisterSerializer(serializers.ModelSerializer):
+    """
+    Uniqueness of username and (case-insensitive) email is checked with one
+    query, on the indexes from migration 0007; the unique constraints settle
+    races between concurrent signups. The password is hashed on the bounded
+    pool in core.hashing (or passed in already hashed as `password_hash`).
+    """
     password = serializers.CharField(write_only=True, min_length=8)
     class Meta:
         model = User
         fields = ["id", "username", "email", "password"]
+        # the model's UniqueValidator would cost its own query: see validate()
+        extra_kwargs = {"username": {"validators": [UnicodeUsernameValidator()]}}
+
+    def validate_email(self, value):
+        return (value or "").lower()
+
+    def validate(self, attrs):
+        errors = self.conflicts(attrs["username"], attrs.get("email", ""))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def conflicts(self, username, email):
+        """Field errors for a username / email that is already taken (one query)."""
+        taken = Q(username=username)
+        if email:
+            taken |= Q(email_key=email)
+        rows = User.objects.annotate(email_key=email_key()).filter(taken).values_list("username", "email_key")[:2]
+        errors = {}
+        for row_username, row_email in rows:
+            if row_username == username:
+                errors["username"] = ["Username already taken"]
+            if email and row_email == email:
+                errors["email"] = ["Email already in use"]
+        return errors
 
     def create(self, validated_data):
-        user = User(
-            userName = validated_data["username"],
-            email = validated_data.get("email", "").lower(),
-        )
-        user.set_password(validated_data["password"])
-        user.save()
+        user = User(username=validated_data["username"], email=validated_data.get("email", ""))
+        user.password = validated_data.get("password_hash") or hashing.make_password(validated_data["password"])
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            # lost a race with a concurrent signup for the same username/email
+            errors = self.conflicts(user.username, user.email)
+            raise serializers.ValidationError(errors or {"non_field_errors": ["Account already exists"]})
         return user
-    
-    def validate_email(self, value):
-        if value and User.objects.filter(email=value.lower()).exists():
-            raise serializers.ValidationError("Email already in use")
-        return value
-    
-    def validate_userName(self, value):
-        if User.objects.filter(userName=value).exists():
-            raise serializers.ValidationError("Username already taken")
-        return value
-    
+
+
 class MeSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -39,7 +69,7 @@ class ProviderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Provider
-        field = ["id", "name", "url", "logo_url", "created_at", "updated_at"]
+        fields = ["id", "name", "url", "logo_url", "created_at", "updated_at"]
         read_only_fields = ["id", "created_at", "updated_at"]
 
     def validate_name(self, value: str):
@@ -49,15 +79,24 @@ class ProviderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Name cannot be empty.")
         return v
 
+class CentsField(serializers.ReadOnlyField):
+    """Integer cents -> "x.xx"."""
+    def to_representation(self, value):
+        return format_cents(value)
+
+
 class SubscriptionSerializer(serializers.ModelSerializer):
     provider_name = serializers.CharField(source="provider.name", read_only=True)
+    # from the precomputed cent columns, same values as monthly_equivalent()/yearly_equivalent()
+    monthly_cost = CentsField(source="monthly_cost_cents")
+    yearly_cost = CentsField(source="yearly_cost_cents")
 
     class Meta:
         model = Subscription
         fields = [
             "id","user","provider","provider_name","plan_name","price","currency",
             "billing_cycle","custom_cycle_days","start_date","next_renewal_date",
-            "auto_renew","notes","created_at"
+            "auto_renew","notes","created_at","monthly_cost","yearly_cost"
         ]
         read_only_fields = ["id", "user", "created_at"]
 
@@ -65,3 +104,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         if attrs.get("billing_cycle") == Subscription.CUSTOM and (attrs.get("custom_cycle_days") or 0) == 0:
             raise serializers.ValidationError({"custom_cycle_days": "Required when billing_cycle is custom."})
         return attrs
+
+
+class SubscriptionImportSerializer(SubscriptionSerializer):
+    # Providers are resolved by name once per batch (core.bulk_io), so we only
+    # validate the name here instead of running a PK lookup per row.
+    provider = serializers.CharField(max_length=100)
+
+    class Meta(SubscriptionSerializer.Meta):
+        fields = [
+            "provider","plan_name","price","currency","billing_cycle","custom_cycle_days",
+            "start_date","next_renewal_date","auto_renew","notes"
+        ]
+
+    def validate_provider(self, value):
+        return value.strip()
@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent by SubscriptionQuerySet for writes that bypass Model.save()/delete():
+# bulk_create, bulk_update and queryset.update().
+#   user_ids: set of user ids whose subscriptions were touched
+#   objs:     the created instances (bulk_create only, otherwise None)
+#   fields:   names of the fields that changed (None = unknown / all)
+#   old_provider_ids: providers the rows were on before a write that may move
+#             them (the provider is among the fields); empty otherwise
+subscriptions_bulk_changed = Signal()
@@ -0,0 +1,152 @@
+"""
+Spend history: SpendSnapshot change points, taken from UserSpendRollup.
+
+run() snapshots one day. It only looks at users whose subscriptions changed
+since the previous run (Subscription.updated_at, SubscriptionTombstone), and
+writes a row only where a (user, provider) differs from its latest snapshot.
+Unchanged users cost nothing, and storage grows with changes, not with days.
+A JobCheckpoint remembers the last day and when it ran; a day that was
+already snapshotted is skipped. If the tombstones since the last run were
+compacted away, or with full=True, every user is compared instead.
+
+history() answers a date range from the snapshots: the state at the start
+(latest row per provider, via the unique index), then the changes in the
+range (the (user, day) index).
+"""
+import calendar
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .cache import user_data_changed
+from .models import JobCheckpoint, SpendSnapshot, Subscription, SubscriptionTombstone, UserSpendRollup, upsert
+from .rollups import PARTS
+from .sync import compaction_horizon, overlap
+from .utils import monthly_from_parts, yearly_from_parts
+
+CHECKPOINT = "snapshot_spend"
+DAY, MONTH = "day", "month"
+
+
+def changed_users(since):
+    """Users with a subscription written or deleted since `since`."""
+    # A range read of the updated_at index, deduplicated here: with DISTINCT
+    # (or the default ordering) planners walk the whole user-leading index.
+    written = Subscription.objects.filter(updated_at__gte=since).order_by().values_list("user_id", flat=True)
+    deleted = SubscriptionTombstone.objects.filter(deleted_at__gte=since).order_by().values_list("user_id", flat=True)
+    return set(written.iterator()) | set(deleted.iterator())
+
+
+def latest(user_ids, day, provider_id=None):
+    """{(user_id, provider_id): parts} of the newest snapshot on/before `day`."""
+    newest = (
+        SpendSnapshot.objects
+        .filter(user_id=OuterRef("user_id"), provider_id=OuterRef("provider_id"), day__lte=day)
+        .order_by("-day").values("day")[:1]
+    )
+    rows = SpendSnapshot.objects.filter(user_id__in=user_ids, day=Subquery(newest))
+    if provider_id is not None:
+        rows = rows.filter(provider_id=provider_id)
+    rows = rows.values_list("user_id", "provider_id", *PARTS)
+    return {(u, p): list(parts) for u, p, *parts in rows}
+
+
+def snapshot_users(user_ids, day):
+    """Write the change points of `user_ids` for `day`; returns the users that changed."""
+    current = {
+        (u, p): list(parts)
+        for u, p, *parts in (
+            UserSpendRollup.objects.filter(user_id__in=user_ids, count__gt=0)
+            .values_list("user_id", "provider_id", *PARTS)
+        )
+    }
+    previous = latest(user_ids, day)
+    closed = [0, Decimal("0"), Decimal("0"), Decimal("0")]
+    rows = [
+        SpendSnapshot(user_id=u, provider_id=p, day=day, **dict(zip(PARTS, parts)))
+        for (u, p), parts in current.items() if previous.get((u, p)) != parts
+    ] + [
+        SpendSnapshot(user_id=u, provider_id=p, day=day, **dict(zip(PARTS, closed)))
+        for (u, p), parts in previous.items() if (u, p) not in current and parts[0] != 0
+    ]
+    # a rerun of the same day overwrites its own rows
+    upsert(SpendSnapshot, rows, ["user", "provider_id", "day"], list(PARTS), batch_size=1000)
+    return {row.user_id for row in rows}
+
+
+def run(today=None, full=False, chunk_size=1000):
+    """
+    Snapshot `today` (default: today) unless it was already done.
+    Returns {"day", "skipped", "users", "changed"}.
+    """
+    today = today or date.today()
+    started = timezone.now()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    state = checkpoint.state
+    if state.get("day") and date.fromisoformat(state["day"]) >= today:
+        return {"day": today, "skipped": True, "users": 0, "changed": 0}
+
+    since = datetime.fromisoformat(state["at"]) - overlap() if state.get("at") else None
+    horizon = compaction_horizon()
+    if full or since is None or (horizon is not None and since < horizon):
+        users = get_user_model().objects.order_by("pk").values_list("pk", flat=True)
+    else:
+        users = sorted(changed_users(since))
+
+    users, changed = list(users), 0
+    for i in range(0, len(users), chunk_size):
+        chunk = users[i:i + chunk_size]
+        with transaction.atomic():
+            touched = snapshot_users(chunk, today)
+        changed += len(touched)
+        user_data_changed(touched)  # cached /api/dashboard/history responses
+
+    checkpoint.state = {"day": today.isoformat(), "at": started.isoformat()}
+    checkpoint.save(update_fields=["state", "updated_at"])
+    return {"day": today, "skipped": False, "users": len(users), "changed": changed}
+
+
+def points(start, end, interval):
+    """The dates a history series reports on: every day, or each month's last day (clipped to `end`)."""
+    if interval == DAY:
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    out, year, month = [], start.year, start.month
+    while True:
+        last = date(year, month, calendar.monthrange(year, month)[1])
+        out.append(min(last, end))
+        if last >= end:
+            return out
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def history(user_id, start, end, interval=DAY, provider_id=None):
+    """
+    Spend on each point of [start, end]:
+      [{"date", "monthly", "yearly", "count"}]  (formatted like the dashboard totals)
+    """
+    snapshots = SpendSnapshot.objects.filter(user_id=user_id)
+    if provider_id is not None:
+        snapshots = snapshots.filter(provider_id=provider_id)
+    state = {p: parts for (_, p), parts in latest([user_id], start, provider_id).items()}
+    changes = (
+        snapshots.filter(day__gt=start, day__lte=end).order_by("day")
+        .values_list("day", "provider_id", *PARTS)
+    ).iterator()
+    pending = next(changes, None)
+
+    series = []
+    for point in points(start, end, interval):
+        while pending is not None and pending[0] <= point:
+            state[pending[1]] = list(pending[2:])
+            pending = next(changes, None)
+        count = sum(parts[0] for parts in state.values())
+        monthly, yearly, custom = (sum((parts[i] for parts in state.values()), Decimal("0")) for i in (1, 2, 3))
+        series.append({
+            "date": point,
+            "monthly": f"{monthly_from_parts(monthly, yearly, custom):.2f}",
+            "yearly": f"{yearly_from_parts(monthly, yearly, custom):.2f}",
+            "count": count,
+        })
+    return series
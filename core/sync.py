@@ -0,0 +1,129 @@
+"""
+Delta sync for subscriptions (GET /api/subscriptions/changes/?since=<token>).
+
+Two streams per user, both read as keyset ranges on their indexes:
+  - changed rows: Subscription (user, updated_at, id)
+  - deleted rows: SubscriptionTombstone (user, deleted_at, id)
+The token is an opaque cursor holding the position reached in each stream.
+
+updated_at is taken when a row is written, not when its transaction
+commits, so a row can become visible with a timestamp older than a position
+already handed out. Once a client has caught up, its next sync therefore
+restarts SYNC_OVERLAP_SECONDS before its position: rows in that window may
+be sent twice (clients upsert by id, so that's harmless), but none are missed.
+
+Tombstones are deleted by `manage.py compact_tombstones`, which records the
+horizon in JobCheckpoint first. A token from before the horizon may have
+missed deletes: the answer is then a full-resync signal plus a fresh token
+(refetch the list, then sync from that token).
+"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from .models import JobCheckpoint, Subscription, SubscriptionTombstone
+from .pagination import keyset_after
+
+COMPACTION_JOB = "compact_tombstones"
+
+
+def overlap():
+    return timedelta(seconds=getattr(settings, "SYNC_OVERLAP_SECONDS", 60))
+
+
+def page_size():
+    return getattr(settings, "SYNC_PAGE_SIZE", 500)
+
+
+def _micros(moment):
+    return int(moment.timestamp()) * 1_000_000 + moment.microsecond
+
+
+def _moment(micros):
+    return datetime.fromtimestamp(micros // 1_000_000, dt_timezone.utc).replace(microsecond=micros % 1_000_000)
+
+
+def encode_token(changed, deleted, caught_up):
+    payload = {
+        "c": [_micros(changed[0]), changed[1]],
+        "d": [_micros(deleted[0]), deleted[1]],
+        "w": int(caught_up),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    """-> (changed position, deleted position, caught_up); raises ValueError on garbage."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        (ct, cpk), (dt, dpk) = payload["c"], payload["d"]
+        return (_moment(int(ct)), int(cpk)), (_moment(int(dt)), int(dpk)), bool(payload["w"])
+    except (TypeError, KeyError, ValueError, AttributeError, OverflowError, OSError) as exc:
+        raise ValueError(str(exc)) from exc
+
+
+def compaction_horizon():
+    """Tombstones deleted before this moment are gone (None if never compacted)."""
+    state = JobCheckpoint.objects.filter(name=COMPACTION_JOB).values_list("state", flat=True).first()
+    return datetime.fromisoformat(state["before"]) if state and state.get("before") else None
+
+
+def fresh_token():
+    now = timezone.now()
+    return encode_token((now, 0), (now, 0), caught_up=True)
+
+
+def _read(rows, field, position, limit):
+    """`rows` (a values() queryset) strictly after `position`: (page, next position, more?)."""
+    rows = list(rows.filter(keyset_after(field, *position, nullable=False)).order_by(field, "id")[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, ((rows[-1][field], rows[-1]["id"]) if rows else position), more
+
+
+def changes(user_id, token, rows, fields, limit=None):
+    """
+    Changes for `user_id` since `token` (None: start with a full sync).
+    `rows`/`fields`: the ValuesSerializer and output fields for changed rows.
+    Raises ValueError for a token that doesn't decode.
+    """
+    limit = limit or page_size()
+    if token is None:
+        return {"full_resync": True, "changed": [], "deleted": [], "has_more": False, "next": fresh_token()}
+    changed_pos, deleted_pos, caught_up = decode_token(token)
+    changed_from, deleted_from = changed_pos, deleted_pos
+    if caught_up:
+        changed_from = (changed_pos[0] - overlap(), 0)
+        deleted_from = (deleted_pos[0] - overlap(), 0)
+
+    horizon = compaction_horizon()
+    if horizon is not None and deleted_pos[0] < horizon:
+        return {"full_resync": True, "changed": [], "deleted": [], "has_more": False, "next": fresh_token()}
+
+    # an empty stream is caught up to the read, less the commit window
+    read_floor = (timezone.now() - overlap(), 0)
+    changed, changed_next, more_changed = _read(
+        rows.values(Subscription.objects.filter(user_id=user_id), fields, extra=("updated_at", "id")),
+        "updated_at", changed_from, limit,
+    )
+    deleted, deleted_next, more_deleted = _read(
+        SubscriptionTombstone.objects.filter(user_id=user_id).values("deleted_at", "id", "subscription_id"),
+        "deleted_at", deleted_from, limit,
+    )
+    has_more = more_changed or more_deleted
+    # nothing new in a stream: move its position up to the read instead of the
+    # windowed one, or a user who never deletes anything would keep a deleted
+    # position older than the compaction horizon and resync after every run
+    return {
+        "full_resync": False,
+        "changed": rows.to_representation(changed, fields),
+        "deleted": [t["subscription_id"] for t in deleted],
+        "has_more": has_more,
+        "next": encode_token(
+            changed_next if changed else max(changed_pos, read_floor),
+            deleted_next if deleted else max(deleted_pos, read_floor),
+            caught_up=not has_more,
+        ),
+    }
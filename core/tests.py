@@ -1,3 +1,1591 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import importlib
+import json
+import random
+import threading
+import uuid
+from io import StringIO
+from unittest import mock, skipUnless
+from types import ModuleType
+from urllib.parse import parse_qs, urlsplit
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import JsonResponse
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from . import search
+from . import urls as core_urls
+from .async_urls import urlpatterns as async_urlpatterns
+from .models import (
+    USER_EMAIL_INDEX, JobCheckpoint, Provider, ProviderStats, ReminderDelivery, SpendSnapshot, Subscription,
+    SubscriptionTombstone, UserSpendRollup, email_key,
+)
+from . import checks, db_routing, hashing, ical, instrumentation, provider_stats, reminders, snapshots, sync
+from .bench import cold_start, compare, filter_combinations, table_scans
+from .renderers import FastJSONRenderer
+from .seed import seed
+from .serializers import ProviderSerializer, SubscriptionSerializer
+from .filters import FullTextMatch, filter_subscriptions
+from .pagination import decode_cursor, encode_cursor
+from .forecast import forecast
+from .renewals import plan_ranges, roll_forward
+from .rollups import sync_users
+from .utils import monthly_equivalent, yearly_equivalent
 
-# Create your tests here.
+
+def python_summary(user):
+    """The original per-row Decimal implementation of the dashboard totals."""
+    monthly_total = Decimal("0")
+    yearly_total = Decimal("0")
+    tallies = {}
+    subs = Subscription.objects.filter(user=user).select_related("provider")
+    for s in subs:
+        m = monthly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days)
+        monthly_total += m
+        yearly_total += yearly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days)
+        t = tallies.setdefault(s.provider.name, {"provider": s.provider.name, "count": 0, "monthly": Decimal("0")})
+        t["count"] += 1
+        t["monthly"] += m
+    return {
+        "monthly": f"{monthly_total:.2f}",
+        "yearly": f"{yearly_total:.2f}",
+        "count": subs.count(),
+    }, [
+        {"provider": k, "count": v["count"], "monthly": f"{v['monthly']:.2f}"}
+        for k, v in sorted(tallies.items(), key=lambda kv: kv[0].lower())
+    ]
+
+
+class APITestBase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@example.com", "s3cret-pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.netflix = Provider.objects.create(name="Netflix")
+        self.spotify = Provider.objects.create(name="spotify")
+        self.icloud = Provider.objects.create(name="iCloud")
+
+    def add_sub(self, provider, price, cycle=Subscription.MONTHLY, days=0, user=None, **extra):
+        extra.setdefault("start_date", date.today() - timedelta(days=20))
+        return Subscription.objects.create(
+            user=user or self.user, provider=provider, price=Decimal(price),
+            billing_cycle=cycle, custom_cycle_days=days, **extra,
+        )
+
+
+class DashboardSummaryTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.add_sub(self.netflix, "15.49")
+        self.add_sub(self.netflix, "99.99", Subscription.YEARLY)
+        self.add_sub(self.spotify, "10.99", Subscription.CUSTOM, days=45)
+        self.add_sub(self.spotify, "0.07", Subscription.YEARLY)
+        self.add_sub(self.icloud, "2.99", Subscription.CUSTOM, days=0)
+        self.add_sub(self.icloud, "0.00")
+        other = User.objects.create_user("bob", "bob@example.com", "s3cret-pass")
+        self.add_sub(self.netflix, "500.00", user=other)
+
+    def test_matches_python_path(self):
+        res = self.client.get("/api/dashboard/summary")
+        self.assertEqual(res.status_code, 200)
+        totals, by_provider = python_summary(self.user)
+        self.assertEqual(res.data["totals"], totals)
+        self.assertEqual(res.data["by_provider"], by_provider)
+
+    def test_query_count(self):
+        with self.assertNumQueries(2):
+            res = self.client.get("/api/dashboard/summary?days=30")
+        self.assertEqual(res.data["totals"]["count"], 6)
+
+    def test_upcoming_window(self):
+        soon = self.add_sub(self.netflix, "1.00", next_renewal_date=date.today() + timedelta(days=3))
+        self.add_sub(self.netflix, "1.00", next_renewal_date=date.today() + timedelta(days=40))
+        res = self.client.get("/api/dashboard/summary?days=5")
+        self.assertEqual([u["id"] for u in res.data["upcoming"]], [soon.id])
+        self.assertEqual(res.data["upcoming"][0]["provider_name"], "Netflix")
+
+    def test_empty(self):
+        Subscription.objects.filter(user=self.user).delete()
+        res = self.client.get("/api/dashboard/summary")
+        self.assertEqual(res.data["totals"], {"monthly": "0.00", "yearly": "0.00", "count": 0})
+        self.assertEqual(res.data["by_provider"], [])
+
+
+class SpendRollupTests(APITestBase):
+    def assertRollupsInSync(self):
+        self.assertEqual(sync_users(User.objects.values_list("pk", flat=True), repair=False), 0)
+
+    def rollup(self, provider):
+        return UserSpendRollup.objects.get(user=self.user, provider=provider)
+
+    def test_save_and_delete(self):
+        s = self.add_sub(self.netflix, "12.00", Subscription.YEARLY)
+        self.assertEqual(self.rollup(self.netflix).monthly, Decimal("1"))
+        s = Subscription.objects.get(pk=s.pk)
+        s.billing_cycle = Subscription.MONTHLY
+        s.provider = self.spotify
+        s.save()
+        self.assertFalse(UserSpendRollup.objects.filter(provider=self.netflix).exists())
+        self.assertEqual(self.rollup(self.spotify).yearly, Decimal("144"))
+        s.delete()
+        self.assertFalse(UserSpendRollup.objects.exists())
+
+    def test_bulk_paths(self):
+        Subscription.objects.bulk_create([
+            Subscription(user=self.user, provider=self.netflix, price=Decimal("9.99"), start_date=date.today()),
+            Subscription(user=self.user, provider=self.spotify, price=Decimal("3.00"),
+                         billing_cycle=Subscription.CUSTOM, custom_cycle_days=7, start_date=date.today()),
+        ])
+        self.assertEqual(self.rollup(self.spotify).custom_part, Decimal("21.00"))
+        self.assertRollupsInSync()
+
+        Subscription.objects.filter(provider=self.netflix).update(price=Decimal("20.00"))
+        self.assertEqual(self.rollup(self.netflix).monthly_part, Decimal("20.00"))
+
+        subs = list(Subscription.objects.all())
+        for s in subs:
+            s.billing_cycle = Subscription.YEARLY
+        Subscription.objects.bulk_update(subs, ["billing_cycle"])
+        self.assertRollupsInSync()
+        self.assertEqual(self.rollup(self.spotify).yearly_part, Decimal("3.00"))
+
+    def test_provider_cascade(self):
+        self.add_sub(self.netflix, "5.00")
+        self.add_sub(self.spotify, "5.00")
+        self.netflix.delete()
+        self.assertRollupsInSync()
+        res = self.client.get("/api/dashboard/summary")
+        self.assertEqual(res.data["totals"]["count"], 1)
+
+    def test_rebuild_command(self):
+        self.add_sub(self.netflix, "5.00")
+        self.add_sub(self.spotify, "7.50", Subscription.YEARLY)
+        UserSpendRollup.objects.filter(provider=self.netflix).update(count=9)
+        UserSpendRollup.objects.filter(provider=self.spotify).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rollups", "--verify", stdout=StringIO())
+        out = StringIO()
+        call_command("rebuild_rollups", "--chunk-size", "1", stdout=out)
+        self.assertIn("repaired 2 drifted", out.getvalue())
+        self.assertRollupsInSync()
+
+
+class ResponseCacheTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.sub = self.add_sub(self.netflix, "9.99", next_renewal_date=date.today() + timedelta(days=2))
+
+    def test_repeat_request_served_from_cache(self):
+        first = self.client.get("/api/dashboard/summary?days=7")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/dashboard/summary?days=7")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        # other `days` variants and pages are cached separately
+        self.assertNotEqual(self.client.get("/api/dashboard/summary?days=1")["ETag"], first["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/api/subscriptions/")["ETag"]
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/subscriptions/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_write_invalidates(self):
+        etag = self.client.get("/api/subscriptions/")["ETag"]
+        Subscription.objects.filter(pk=self.sub.pk).update(plan_name="Premium")
+        res = self.client.get("/api/subscriptions/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["plan_name"], "Premium")
+
+    def test_provider_rename_invalidates(self):
+        etag = self.client.get("/api/subscriptions/")["ETag"]
+        self.netflix.name = "Netflix Premium"
+        self.netflix.save()
+        res = self.client.get("/api/subscriptions/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["provider_name"], "Netflix Premium")
+
+    def test_shared_cache_check(self):
+        with override_settings(LOCAL_CACHE_OK=False):
+            self.assertEqual([e.id for e in checks.check_shared_cache(None)], ["core.E002", "core.E001", "core.E003"])
+            with override_settings(RESPONSE_CACHE_TIMEOUT=0, AUTH_USER_CACHE_TIMEOUT=0):
+                self.assertEqual([e.id for e in checks.check_shared_cache(None)], ["core.E002"])
+                self.assertFalse(self.client.get("/api/subscriptions/").has_header("ETag"))
+            with override_settings(DATABASE_REPLICAS=["replica1"]):
+                self.assertEqual([e.id for e in checks.check_shared_cache(None)][-1], "core.E004")
+
+    def test_users_do_not_share_entries(self):
+        self.client.get("/api/subscriptions/")
+        other = User.objects.create_user("bob", "bob@example.com", "s3cret-pass")
+        self.client.force_authenticate(other)
+        res = self.client.get("/api/subscriptions/")
+        self.assertEqual(res.data["results"], [])
+
+
+class ImportExportTests(APITestBase):
+    def test_csv_upload(self):
+        body = (
+            "provider,plan_name,price,billing_cycle,custom_cycle_days,start_date\n"
+            "Netflix,Standard,15.49,monthly,,2026-01-05\n"
+            "spotify,Duo,,custom,14,2026-02-01\n"
+            "Nope,Basic,1.00,monthly,,2026-01-01\n"
+            "Netflix,Broken,abc,monthly,,2026-01-01\n"
+            "iCloud,Bad cycle,1.00,custom,,2026-01-01\n"
+        ).encode()
+        upload = SimpleUploadedFile("subs.csv", body, content_type="text/csv")
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post("/api/subscriptions/import/", {"file": upload}, format="multipart")
+        sql = [q["sql"] for q in ctx.captured_queries]
+        # one provider lookup and one multi-row insert for the whole batch
+        self.assertEqual(sum('FROM "core_provider"' in q for q in sql), 1)
+        self.assertEqual(sum(q.startswith('INSERT INTO "core_subscription"') for q in sql), 1)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data["created"], res.data["failed"]), (2, 3))
+        self.assertEqual([e["row"] for e in res.data["errors"]], [4, 5, 6])
+        self.assertIn("provider", res.data["errors"][0]["errors"])
+        custom = Subscription.objects.get(plan_name="Duo")
+        self.assertEqual(custom.next_renewal_date, date(2026, 2, 15))
+        self.assertEqual(custom.price, Decimal("0"))
+
+    def test_ndjson_body(self):
+        lines = [
+            {"provider": "Netflix", "price": "9.99", "start_date": "2026-03-01", "auto_renew": False},
+            "not json",
+            {"provider": "spotify", "price": "99.00", "billing_cycle": "yearly", "start_date": "2026-03-01"},
+        ]
+        body = "\n".join(x if isinstance(x, str) else json.dumps(x) for x in lines)
+        res = self.client.post(
+            "/api/subscriptions/import/?fmt=ndjson", data=body, content_type="application/x-ndjson"
+        )
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["errors"], [{"row": 2, "errors": {"non_field_errors": ["Invalid JSON."]}}])
+        self.assertEqual(UserSpendRollup.objects.get(user=self.user, provider=self.spotify).yearly_part, Decimal("99.00"))
+
+    def test_provider_names_ignore_case(self):
+        body = "\n".join(
+            json.dumps({"provider": name, "price": "1.00", "start_date": "2026-03-01"}) for name in ["NETFLIX", "Spotify", "icloud"]
+        )
+        res = self.client.post("/api/subscriptions/import/?fmt=ndjson", data=body, content_type="application/x-ndjson")
+        self.assertEqual((res.data["created"], res.data["failed"]), (3, 0), res.data)
+        self.assertEqual(
+            set(Subscription.objects.values_list("provider_id", flat=True)), {self.netflix.pk, self.spotify.pk, self.icloud.pk}
+        )
+
+    def test_unreadable_files(self):
+        latin1 = "provider,plan_name,price,start_date\nNetflix,Basic,1.00,2026-01-01\nNetflix,Caf\u00e9,2.00,2026-01-01\n"
+        quoting = b'provider,plan_name,price,start_date\nNetflix,Basic,1.00,2026-01-01\nNetflix,"Duo"x,2.00,2026-01-01\n'
+        for body in (latin1.encode("latin-1"), quoting):
+            upload = SimpleUploadedFile("subs.csv", body, content_type="text/csv")
+            res = self.client.post("/api/subscriptions/import/", {"file": upload}, format="multipart")
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(res.data["row"], 3)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_export_round_trip(self):
+        self.add_sub(self.netflix, "15.49", plan_name="Standard")
+        self.add_sub(self.spotify, "5.00", Subscription.CUSTOM, days=10, notes='multi\nline, "quoted"')
+        res = self.client.get("/api/subscriptions/export/?fmt=csv")
+        self.assertTrue(res.streaming)
+        body = b"".join(res.streaming_content)
+
+        Subscription.objects.all().delete()
+        upload = SimpleUploadedFile("subs.csv", body, content_type="text/csv")
+        res = self.client.post("/api/subscriptions/import/", {"file": upload}, format="multipart")
+        self.assertEqual((res.data["created"], res.data["failed"]), (2, 0))
+        self.assertEqual(Subscription.objects.get(provider=self.spotify).notes, 'multi\nline, "quoted"')
+
+        res = self.client.get("/api/subscriptions/export/?fmt=ndjson")
+        rows = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+        self.assertEqual({r["provider"] for r in rows}, {"Netflix", "spotify"})
+        self.assertEqual(rows[0]["price"], "15.49")
+
+
+class KeysetPaginationTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        # ties on next_renewal_date so the id tie-breaker matters
+        self.subs = [
+            self.add_sub(self.netflix, f"{i}.00", next_renewal_date=today + timedelta(days=i // 3))
+            for i in range(11)
+        ]
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            ids += [r["id"] for r in res.data["results"]]
+            url, pages = res.data["next"], pages + 1
+        return ids, pages
+
+    def test_walks_every_row_once_in_order(self):
+        ids, pages = self.walk("/api/subscriptions/?page_size=4")
+        self.assertEqual(ids, [s.id for s in self.subs])
+        self.assertEqual(pages, 3)
+
+        ids, _ = self.walk("/api/subscriptions/?page_size=3&ordering=-price")
+        self.assertEqual(ids, [s.id for s in reversed(self.subs)])
+
+    def test_previous_link(self):
+        first = self.client.get("/api/subscriptions/?page_size=4")
+        self.assertIsNone(first.data["previous"])
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_deep_page_is_one_query_without_count(self):
+        url = "/api/subscriptions/?page_size=2"
+        for _ in range(4):
+            url = self.client.get(url).data["next"]
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("COUNT", ctx.captured_queries[0]["sql"].upper())
+        self.assertNotIn("OFFSET", ctx.captured_queries[0]["sql"].upper())
+
+    def test_bad_or_mismatched_cursor(self):
+        self.assertEqual(self.client.get("/api/subscriptions/?cursor=garbage").status_code, 404)
+        next_url = self.client.get("/api/subscriptions/?page_size=2").data["next"]
+        self.assertEqual(self.client.get(next_url + "&ordering=price").status_code, 404)
+        term = decode_cursor(parse_qs(urlsplit(next_url).query)["cursor"][0])[0]
+        for value, pk in [("2026-01-01", "x"), ("2026-01-01", None), ("2026-01-01", [1]), ({"a": 1}, 1)]:
+            cursor = encode_cursor(term, value, pk)
+            self.assertEqual(self.client.get("/api/subscriptions/", {"cursor": cursor}).status_code, 404, (value, pk))
+
+    def test_providers_by_name(self):
+        self.client.force_authenticate(None)
+        ids, _ = self.walk("/api/providers/?page_size=1")
+        self.assertEqual(ids, list(Provider.objects.order_by("name").values_list("pk", flat=True)))
+
+
+class RenewalRollForwardTests(APITestBase):
+    today = date(2026, 6, 15)
+
+    def test_roll_forward_math(self):
+        self.assertEqual(roll_forward(date(2026, 6, 1), 30, self.today), date(2026, 7, 1))
+        self.assertEqual(roll_forward(date(2026, 5, 16), 30, self.today), date(2026, 6, 15))
+        self.assertEqual(roll_forward(date(2020, 1, 1), 365, self.today), date(2026, 12, 30))
+        self.assertEqual(roll_forward(date(2026, 7, 1), 7, self.today), date(2026, 7, 1))
+
+    def test_command(self):
+        stale = self.add_sub(self.netflix, "1.00", next_renewal_date=date(2026, 1, 1))
+        custom = self.add_sub(self.spotify, "1.00", Subscription.CUSTOM, days=10, next_renewal_date=date(2026, 6, 1))
+        manual = self.add_sub(self.icloud, "1.00", next_renewal_date=date(2026, 1, 1), auto_renew=False)
+        other = User.objects.create_user("bob", "bob@example.com", "s3cret-pass")
+        theirs = self.add_sub(self.netflix, "1.00", user=other, next_renewal_date=date(2025, 12, 1))
+
+        out = StringIO()
+        call_command("roll_renewals", "--today", "2026-06-15", "--dry-run", stdout=out)
+        self.assertIn("[dry run] 3 subscriptions advanced", out.getvalue())
+        stale.refresh_from_db()
+        self.assertEqual(stale.next_renewal_date, date(2026, 1, 1))
+
+        call_command("roll_renewals", "--today", "2026-06-15", "--range-size", "1", "--chunk-size", "1", stdout=StringIO())
+        for sub, expected in [(stale, date(2026, 6, 30)), (custom, date(2026, 6, 21)),
+                              (manual, date(2026, 1, 1)), (theirs, date(2026, 6, 29))]:
+            sub.refresh_from_db()
+            self.assertEqual(sub.next_renewal_date, expected)
+        self.assertEqual(len(JobCheckpoint.objects.get(name="roll_renewals").state["done"]), 2)
+
+    def test_resume_skips_finished_ranges(self):
+        sub = self.add_sub(self.netflix, "1.00", next_renewal_date=date(2026, 1, 1))
+        JobCheckpoint.objects.create(
+            name="roll_renewals", state={"today": "2026-06-15", "range_size": 10000, "done": [0]}
+        )
+        # aligned to range_size, whatever the lowest due user is now
+        self.assertEqual(plan_ranges(self.today, 10000), [(0, 10000)])
+        self.assertEqual(plan_ranges(self.today, 1), [(self.user.pk, self.user.pk + 1)])
+        out = StringIO()
+        call_command("roll_renewals", "--today", "2026-06-15", "--resume", stdout=out)
+        self.assertIn("(1 ranges already done)", out.getvalue())
+        sub.refresh_from_db()
+        self.assertEqual(sub.next_renewal_date, date(2026, 1, 1))
+
+
+def python_forecast(subs, start, end):
+    """Reference implementation: step timedelta per subscription."""
+    totals = {}
+    for s in subs:
+        step = timedelta(days=s.cycle_days())
+        d = s.next_renewal_date
+        if s.auto_renew:
+            while d < start:
+                d += step
+        while start <= d < end:
+            key = (d.strftime("%Y-%m"), s.provider.name)
+            events, cents = totals.get(key, (0, 0))
+            totals[key] = (events + 1, cents + int(s.price * 100))
+            if not s.auto_renew:
+                break
+            d += step
+    return totals
+
+
+class ForecastTests(APITestBase):
+    start = date(2026, 10, 18)
+
+    def setUp(self):
+        super().setUp()
+        self.add_sub(self.netflix, "15.49", next_renewal_date=date(2026, 10, 20))
+        self.add_sub(self.netflix, "99.99", Subscription.YEARLY, next_renewal_date=date(2027, 3, 1))
+        self.add_sub(self.spotify, "2.50", Subscription.CUSTOM, days=7, next_renewal_date=date(2026, 9, 30))
+        self.add_sub(self.icloud, "0.99", next_renewal_date=date(2026, 11, 2), auto_renew=False)
+        self.add_sub(self.icloud, "5.00", next_renewal_date=date(2026, 9, 1), auto_renew=False)
+
+    def test_matches_reference(self):
+        result = forecast(Subscription.objects.filter(user=self.user), months=24, start=self.start)
+        got = {
+            (b["month"], p["provider"]): (p["events"], int(p["total"].replace(".", "")))
+            for b in result["buckets"] for p in b["by_provider"]
+        }
+        subs = Subscription.objects.filter(user=self.user).select_related("provider")
+        self.assertEqual(got, python_forecast(subs, self.start, date(2028, 10, 1)))
+        self.assertEqual(len(result["buckets"]), 24)
+        self.assertEqual((result["from"], result["to"]), ("2026-10-18", "2028-09"))
+
+    def test_endpoint(self):
+        res = self.client.get("/api/dashboard/forecast?months=3")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["months"], 3)
+        self.assertEqual(self.client.get("/api/dashboard/forecast?scope=all").status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        other = User.objects.create_user("bob", "bob@example.com", "s3cret-pass")
+        self.add_sub(self.netflix, "1.00", Subscription.YEARLY, user=other, next_renewal_date=date.today())
+        everyone = self.client.get("/api/dashboard/forecast?scope=all&months=3")
+        self.assertEqual(everyone.data["events"], res.data["events"] + 1)
+
+
+# core.urls with the async read views switched on (settings.ASYNC_READ_VIEWS)
+async_urlconf = ModuleType("async_urlconf")
+async_urlconf.urlpatterns = [path("api/", include(async_urlpatterns + core_urls.urlpatterns))]
+
+
+@override_settings(ROOT_URLCONF=async_urlconf)
+class AsyncReadViewTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.add_sub(self.netflix, "15.49", next_renewal_date=date.today() + timedelta(days=3))
+        self.add_sub(self.spotify, "99.99", Subscription.YEARLY)
+        self.add_sub(self.icloud, "2.99", Subscription.CUSTOM, days=45)
+        self.async_client = AsyncClient(AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    async def test_same_payloads_as_sync_views(self):
+        sub = await Subscription.objects.filter(provider=self.netflix).afirst()
+        for url in ["/api/me", "/api/dashboard/summary?days=7", "/api/subscriptions/?page_size=2", f"/api/subscriptions/{sub.pk}/"]:
+            res = await self.async_client.get(url)
+            self.assertEqual(res.status_code, 200, url)
+            with self.settings(ROOT_URLCONF="streamtrace_backend.urls"):
+                expected = await sync_to_async(self.client.get)(url)
+            self.assertEqual(json.loads(res.content), json.loads(expected.content), url)
+
+    async def test_pagination_cursor_round_trip(self):
+        first = json.loads((await self.async_client.get("/api/subscriptions/?page_size=2")).content)
+        self.assertEqual(len(first["results"]), 2)
+        second = json.loads((await self.async_client.get(first["next"])).content)
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNone(second["next"])
+
+    async def test_authentication(self):
+        anonymous = AsyncClient()
+        res = await anonymous.get("/api/subscriptions/")
+        self.assertEqual(res.status_code, 401)
+        self.assertIn("Bearer", res["WWW-Authenticate"])
+        res = await AsyncClient(AUTHORIZATION="Bearer nope").get("/api/me")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual((await anonymous.get("/api/health")).status_code, 200)
+
+    async def test_other_users_subscription_is_404(self):
+        bob = await sync_to_async(User.objects.create_user)("bob", "bob@example.com", "s3cret-pass")
+        sub = await sync_to_async(self.add_sub)(self.netflix, "1.00", user=bob)
+        res = await self.async_client.get(f"/api/subscriptions/{sub.pk}/")
+        self.assertEqual(res.status_code, 404)
+        res = await self.async_client.get("/api/subscriptions/abc/")
+        self.assertEqual(res.status_code, 404)
+
+    async def test_writes_fall_back_to_drf(self):
+        res = await self.async_client.post(
+            "/api/subscriptions/",
+            {"provider": self.netflix.pk, "price": "3.00", "start_date": date.today().isoformat()},
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(await Subscription.objects.filter(user=self.user).acount(), 4)
+
+    async def test_cached_and_invalidated(self):
+        res = await self.async_client.get("/api/dashboard/summary")
+        again = await self.async_client.get("/api/dashboard/summary", headers={"If-None-Match": res["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        await sync_to_async(self.add_sub)(self.netflix, "1.00")
+        after = await self.async_client.get("/api/dashboard/summary", headers={"If-None-Match": res["ETag"]})
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(json.loads(after.content)["totals"]["count"], 4)
+
+
+class ProviderTypeaheadTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        search.reset()
+        self.addCleanup(search.reset)
+        for name in ["Netflix Basic", "HBO Max", "Disney Plus", "Nebula", "Crunchyroll", "Amazon Prime Video"]:
+            Provider.objects.create(name=name)
+
+    def names(self, q, **params):
+        res = self.client.get("/api/providers/", {"q": q, **params})
+        self.assertEqual(res.status_code, 200)
+        return [(r["name"], r["match"]) for r in res.data["results"]]
+
+    def test_ranking(self):
+        self.assertEqual(self.names("netflix"), [("Netflix", "exact"), ("Netflix Basic", "prefix")])
+        self.assertEqual(self.names("ne"), [("Nebula", "prefix"), ("Netflix", "prefix"), ("Netflix Basic", "prefix")])
+        self.assertEqual(self.names("max"), [("HBO Max", "word")])
+        self.assertEqual(self.names("crunchyrol"), [("Crunchyroll", "prefix")])
+        self.assertEqual(self.names("crunchyrole"), [("Crunchyroll", "fuzzy")])
+        self.assertEqual(self.names("  ÍCLOUD "), [("iCloud", "exact")])
+        self.assertEqual(self.names("ne", limit=1), [("Nebula", "prefix")])
+        self.assertEqual(self.names(""), [])
+
+    def test_no_queries_once_loaded(self):
+        self.names("net")
+        with CaptureQueriesContext(connection) as ctx:
+            self.names("prime")
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_updated_on_commit(self):
+        self.names("net")  # load
+        with self.captureOnCommitCallbacks(execute=True):
+            paramount = Provider.objects.create(name="Paramount+")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.netflix.name = "Netflix Standard"
+            self.netflix.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spotify.delete()
+        self.assertEqual(self.names("para"), [("Paramount+", "prefix")])
+        self.assertEqual(self.names("netflix"), [("Netflix Basic", "prefix"), ("Netflix Standard", "prefix")])
+        self.assertEqual(self.names("spotify"), [])
+        self.assertEqual(search.get_index().names[paramount.pk], "Paramount+")
+
+    def test_rolled_back_write_not_indexed(self):
+        self.names("net")
+        Provider.objects.create(name="Ghost")  # TestCase never commits: callback is dropped
+        self.assertEqual(self.names("ghost"), [])
+
+    def test_rebuilds_when_another_worker_writes(self):
+        index = search.get_index()
+        Provider.objects.create(name="Mubi")
+        cache.set(search.VERSION_KEY, 1, None)  # as bumped by another process
+        with self.settings(PROVIDER_INDEX_CHECK_INTERVAL=0):
+            self.assertIsNot(search.get_index(), index)
+            self.assertEqual(self.names("mubi"), [("Mubi", "exact")])
+
+    def test_index_matches_brute_force(self):
+        index = search.ProviderIndex((i, f"Provider {i:05d}") for i in range(2000))
+        for i in range(0, 2000, 3):
+            index.remove(i)
+        index.add(1, "provider 00001 renamed")
+        expected = sorted(
+            (n, pk) for pk, n in ((pk, search.normalize(index.names[pk])) for pk in index.names)
+            if n.startswith("provider 0001")
+        )[:20]
+        got = index.search("provider 0001", 20)
+        self.assertEqual([pk for pk, _, kind in got if kind == search.PREFIX], [pk for _, pk in expected])
+
+    def test_search_while_another_thread_writes(self):
+        index = search.ProviderIndex((i, f"Provider {i:05d}") for i in range(500))
+        errors, stop = [], threading.Event()
+
+        def write():
+            n = 0
+            while not stop.is_set():
+                index.add(n % 500, f"Renamed {n}")
+                index.remove((n + 250) % 500)
+                n += 1
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for i in range(300):
+                try:
+                    index.search("provider 001", 20)
+                    index.search("renamde", 5)
+                except Exception as exc:  # noqa: BLE001
+                    errors.append(exc)
+        finally:
+            stop.set()
+            writer.join()
+        self.assertEqual(errors, [])
+
+
+class CostColumnTests(APITestBase):
+    def assert_costs_match(self):
+        for s in Subscription.objects.all():
+            self.assertEqual(s.monthly_cost_cents, int(f"{monthly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days):.2f}".replace(".", "")))
+            self.assertEqual(s.yearly_cost_cents, int(f"{yearly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days):.2f}".replace(".", "")))
+
+    def test_rounding_matches_helpers(self):
+        rng = random.Random(4)
+        # x.x6 / 12 and x * 45 / 30 land on half cents: half-even must win
+        for price in ["0.06", "0.30", "0.18", "10.99", "0.01", "99999999.99"]:
+            self.add_sub(self.netflix, price, Subscription.YEARLY)
+            self.add_sub(self.netflix, price, Subscription.CUSTOM, days=45)
+        for _ in range(300):
+            cycle = rng.choice([Subscription.MONTHLY, Subscription.YEARLY, Subscription.CUSTOM])
+            self.add_sub(self.spotify, f"{rng.randint(0, 50000) / 100:.2f}", cycle, days=rng.choice([0, 1, 7, 45, 91]))
+        self.assert_costs_match()
+
+    def test_maintained_on_every_write_path(self):
+        sub = self.add_sub(self.netflix, "12.00")
+        sub.price = Decimal("24.00")
+        sub.save(update_fields=["price"])
+        self.assertEqual(Subscription.objects.get(pk=sub.pk).monthly_cost_cents, 2400)
+
+        Subscription.objects.filter(pk=sub.pk).update(billing_cycle=Subscription.YEARLY)
+        self.assertEqual(Subscription.objects.get(pk=sub.pk).monthly_cost_cents, 200)
+
+        objs = Subscription.objects.bulk_create([
+            Subscription(user=self.user, provider=self.icloud, price=Decimal("0.99"), start_date=date.today()),
+            Subscription(user=self.user, provider=self.icloud, price=Decimal("7.00"), billing_cycle=Subscription.CUSTOM,
+                         custom_cycle_days=15, start_date=date.today()),
+        ])
+        objs[0].price = Decimal("1.99")
+        Subscription.objects.bulk_update(objs, ["price"])
+        self.assertEqual(Subscription.objects.get(pk=objs[0].pk).yearly_cost_cents, 2388)
+        self.assertEqual(Subscription.objects.get(pk=objs[1].pk).monthly_cost_cents, 350)
+
+        res = self.client.patch(f"/api/subscriptions/{sub.pk}/", {"price": "120.00"}, format="json")
+        self.assertEqual(res.data["monthly_cost"], "10.00")
+        self.assertEqual(res.data["yearly_cost"], "120.00")
+        self.assert_costs_match()
+
+    def test_backfill_migration(self):
+        for price in ["9.99", "0.06", "100.00"]:
+            self.add_sub(self.netflix, price, Subscription.YEARLY)
+        Subscription._base_manager.update(monthly_cost_cents=0, yearly_cost_cents=0)
+        migration = importlib.import_module("core.migrations.0005_subscription_cost_cents")
+        migration.backfill_costs(django_apps, None)
+        self.assert_costs_match()
+
+    def test_ordering_and_filters(self):
+        cheap = self.add_sub(self.netflix, "60.00", Subscription.YEARLY)  # 5.00 / month
+        mid = self.add_sub(self.spotify, "9.99")
+        pricey = self.add_sub(self.icloud, "20.00", Subscription.CUSTOM, days=45)  # 30.00 / month
+        res = self.client.get("/api/subscriptions/", {"ordering": "-monthly_cost", "page_size": 2})
+        self.assertEqual([r["id"] for r in res.data["results"]], [pricey.pk, mid.pk])
+        res = self.client.get(res.data["next"])
+        self.assertEqual([r["id"] for r in res.data["results"]], [cheap.pk])
+
+        res = self.client.get("/api/subscriptions/", {"min_monthly_cost": "5", "max_monthly_cost": "9.99", "ordering": "monthly_cost"})
+        self.assertEqual([r["id"] for r in res.data["results"]], [cheap.pk, mid.pk])
+        res = self.client.get("/api/subscriptions/", {"min_monthly_cost": "junk"})
+        self.assertEqual(len(res.data["results"]), 3)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/subscriptions/", {"ordering": "monthly_cost", "min_monthly_cost": "1", "page_size": 1, "cursor": ""})
+        sql = ctx.captured_queries[-1]["sql"]
+        self.assertIn('"monthly_cost_cents" >= 100', sql)
+        order = sql.split("ORDER BY ")[1].split(" ASC")[0]
+        if order.isdigit():  # values() queries order by select-list position
+            order = sql.split(" FROM ")[0].split(", ")[int(order) - 1]
+        self.assertIn('"core_subscription"."monthly_cost_cents"', order)
+
+
+class ReminderPipelineTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.today = date(2026, 3, 1)
+        self.bob = User.objects.create_user("bob", "bob@example.com", "s3cret-pass")
+        self.nomail = User.objects.create_user("carol", "", "s3cret-pass")
+        for offset in (0, 1, 3):
+            self.add_sub(self.netflix, "15.49", next_renewal_date=self.today + timedelta(days=offset), plan_name="Premium")
+        self.add_sub(self.spotify, "9.99", next_renewal_date=self.today + timedelta(days=4))  # outside --days 3
+        self.add_sub(self.spotify, "9.99", user=self.bob, next_renewal_date=self.today + timedelta(days=2))
+        self.add_sub(self.icloud, "0.99", user=self.nomail, next_renewal_date=self.today)
+
+    def test_one_digest_per_user(self):
+        totals = reminders.run(today=self.today, days=3, batch_size=2, workers=2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["alice@example.com", "bob@example.com"])
+        alice = next(m for m in mail.outbox if m.to == ["alice@example.com"])
+        self.assertEqual(alice.subject, "3 subscriptions renewing soon")
+        self.assertIn("- Netflix (Premium): 15.49 USD on 2026-03-04", alice.body)
+        self.assertNotIn("Spotify", alice.body)
+        self.assertEqual(
+            (totals["scanned"], totals["claimed"], totals["users"], totals["sent"], totals["skipped"]), (5, 5, 3, 2, 1)
+        )
+        self.assertEqual(ReminderDelivery.objects.filter(status=ReminderDelivery.SENT).count(), 4)
+
+    def test_reruns_never_resend(self):
+        reminders.run(today=self.today, days=3)
+        totals = reminders.run(today=self.today, days=3)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual((totals["claimed"], totals["already"], totals["sent"]), (0, 5, 0))
+        # a new renewal date is a new reminder
+        Subscription.objects.filter(user=self.bob).update(next_renewal_date=self.today + timedelta(days=3))
+        reminders.run(today=self.today, days=3)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_claimed_but_unsent_rows_stay_unsent(self):
+        # a run that crashed after claiming: at most once, so nothing is resent
+        sub = Subscription.objects.get(user=self.bob)
+        ReminderDelivery.objects.create(subscription=sub, user=self.bob, renewal_date=sub.next_renewal_date, claim="dead")
+        reminders.run(today=self.today, days=3)
+        self.assertEqual([m.to for m in mail.outbox], [["alice@example.com"]])
+
+    def test_failed_sends_are_marked_and_retried_on_request(self):
+        real_send = reminders.send_digest
+
+        def flaky(email, rows):
+            if email == "bob@example.com":
+                raise OSError("smtp down")
+            return real_send(email, rows)
+
+        with mock.patch.object(reminders, "send_digest", flaky):
+            totals = reminders.run(today=self.today, days=3)
+        self.assertEqual((totals["sent"], totals["failed"]), (1, 1))
+        self.assertEqual(reminders.run(today=self.today, days=3)["sent"], 0)
+        totals = reminders.run(today=self.today, days=3, retry_failed=True)
+        self.assertEqual(totals["sent"], 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["alice@example.com", "bob@example.com"])
+
+    def test_queries_per_batch_not_per_user(self):
+        for i in range(20):
+            u = User.objects.create_user(f"user{i}", f"user{i}@example.com", "s3cret-pass")
+            self.add_sub(self.netflix, "1.00", user=u, next_renewal_date=self.today)
+        with CaptureQueriesContext(connection) as ctx:
+            totals = reminders.run(today=self.today, days=3, batch_size=1000)
+        self.assertEqual(totals["sent"], 22)
+        # scan, end-of-scan, claim insert, claimed select, emails, 3 outcome updates
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("send_reminders", "--today", "2026-03-01", "--days", "3", "--batch-size", "2", stdout=out)
+        self.assertIn("2 emails sent to 3 users", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("send_reminders", "--batch-size", "0", stdout=out)
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_data(self):
+        out = StringIO()
+        call_command("seed_data", "--users", "30", "--subscriptions", "8", "--providers", "12", "--batch-size", "7", stdout=out)
+        self.assertIn("Created 30 users, 240 subscriptions and 12 providers", out.getvalue())
+        subs = Subscription.objects.filter(user__username__startswith="seed-user-")
+        self.assertEqual(subs.count(), 240)
+        self.assertGreater(subs.filter(billing_cycle=Subscription.MONTHLY).count(), subs.filter(billing_cycle=Subscription.YEARLY).count())
+        self.assertFalse(subs.filter(billing_cycle=Subscription.CUSTOM, custom_cycle_days=0).exists())
+        self.assertGreater(subs.values("currency").distinct().count(), 1)
+        # derived data is consistent: rollups and cost columns
+        self.assertEqual(sync_users(User.objects.values_list("pk", flat=True), repair=False), 0)
+        sub = subs.first()
+        self.assertEqual(sub.monthly_cost_cents, int(f"{monthly_equivalent(sub.price, sub.billing_cycle, sub.custom_cycle_days):.2f}".replace(".", "")))
+        self.assertTrue(self.client.login(username="seed-user-0000000", password="seed-pass-123"))
+
+    def test_seed_is_deterministic(self):
+        seed(users=5, subscriptions=3, providers=4, seed=7, prefix="a")
+        seed(users=5, subscriptions=3, providers=4, seed=7, prefix="b")
+        rows = lambda p: list(
+            Subscription.objects.filter(user__username__startswith=p).order_by("pk")
+            .values_list("price", "currency", "billing_cycle", "plan_name")
+        )
+        self.assertEqual(rows("a-"), rows("b-"))
+
+    def test_compare(self):
+        def result(p50, queries):
+            return {"endpoints": {"data": {"users": 1}, "list": {"p50_ms": p50, "queries": queries}}}
+        [row] = compare(result(10.0, 2), result(11.0, 2))
+        self.assertEqual((row["metric"], row["change_pct"], row["regression"]), ("endpoints.list", 10.0, False))
+        self.assertTrue(compare(result(10.0, 2), result(14.0, 2))[0]["regression"])
+        self.assertTrue(compare(result(10.0, 2), result(9.0, 3))[0]["regression"])
+        # sub-millisecond noise on tiny timings isn't a regression
+        self.assertFalse(compare(result(0.1, 2), result(0.3, 2))[0]["regression"])
+
+
+def n_plus_one_view(request):
+    return JsonResponse({"names": [p.name for p in Provider.objects.all() for _ in Provider.objects.filter(pk=p.pk)]})
+
+
+instrumented_urlconf = ModuleType("instrumented_urlconf")
+instrumented_urlconf.urlpatterns = [
+    path("api/", include(core_urls.urlpatterns)),
+    path("n-plus-one", n_plus_one_view),
+]
+
+
+@override_settings(ROOT_URLCONF=instrumented_urlconf, REQUEST_METRICS_REPEAT_THRESHOLD=3)
+class InstrumentationTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.registry.clear()
+        self.add_sub(self.netflix, "9.99")
+
+    def timing(self, response):
+        return dict(
+            (part.split(";")[0], part) for part in response["Server-Timing"].split(", ")
+        )
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get("/api/subscriptions/")
+        timing = self.timing(res)
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing["db"])
+        self.assertEqual(set(timing), {"db", "view", "render", "total"})
+
+    def test_repeated_queries_flagged(self):
+        with self.assertLogs("core.instrumentation", "WARNING") as logs:
+            res = self.client.get("/n-plus-one")
+        self.assertIn('desc="1 statement(s) repeated up to 3x"', self.timing(res)["repeated"])
+        self.assertIn("Repeated query (3x) in GET n-plus-one", logs.output[0])
+        self.assertNotIn("repeated", self.timing(self.client.get("/api/subscriptions/")))
+
+    def test_metrics_endpoint(self):
+        for _ in range(3):
+            self.client.get("/api/subscriptions/")
+        self.client.get("/n-plus-one")
+        self.assertEqual(self.client.get("/api/metrics").status_code, 404)
+        with self.settings(METRICS_TOKEN="s3cret"):
+            body = self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+        route = 'method="GET",route="api/subscriptions/"'
+        self.assertIn(f'streamtrace_request_duration_seconds_bucket{{{route},le="+Inf"}} 3', body)
+        self.assertIn(f"streamtrace_request_duration_seconds_count{{{route}}} 3", body)
+        self.assertIn(f'streamtrace_requests_total{{{route},status="200"}} 3', body)
+        self.assertIn('streamtrace_repeated_queries_total{method="GET",route="n-plus-one"} 1', body)
+        with self.settings(METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get("/api/metrics").status_code, 401)
+
+    @override_settings(ROOT_URLCONF=async_urlconf)
+    async def test_async_views_record_queries(self):
+        client = AsyncClient(AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        res = await client.get("/api/me")
+        self.assertIn('desc="1 queries"', self.timing(res)["db"])
+
+    def test_disabled(self):
+        with self.settings(REQUEST_METRICS=False):
+            res = APIClient().get("/api/health")
+        self.assertNotIn("Server-Timing", res)
+
+
+class CachedJWTAuthenticationTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.sub = self.add_sub(self.netflix, "9.99")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_user_lookup_is_cached(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get("/api/me").json()["username"], "alice")
+        self.assertEqual(len(ctx.captured_queries), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/me").json()["email"], "alice@example.com")
+        with self.assertNumQueries(1):  # just the subscription
+            self.assertEqual(self.client.get(f"/api/subscriptions/{self.sub.pk}/").status_code, 200)
+
+    def test_deactivation_invalidates(self):
+        self.client.get("/api/me")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/me").status_code, 401)
+
+    @mock.patch("core.authentication.api_settings.CHECK_REVOKE_TOKEN", True)
+    def test_password_change_revokes_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.client.get("/api/me").status_code, 200)
+        self.user.set_password("n3w-pass")
+        self.user.save()
+        self.assertIsNone(cache.get(f"st:authuser:{self.user.pk}"))
+        res = self.client.get("/api/me")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.json()["code"], "password_changed")
+
+    def test_cached_user_never_holds_the_password_hash(self):
+        self.client.get("/api/me")
+        values = cache.get(f"st:authuser:{self.user.pk}")
+        self.assertNotIn(self.user.password, values)
+
+    def test_disabled_cache_queries_every_time(self):
+        with self.settings(AUTH_USER_CACHE_TIMEOUT=0):
+            self.client.get("/api/me")
+            with self.assertNumQueries(1):
+                self.client.get("/api/me")
+
+    @override_settings(JWT_STATELESS=True)
+    def test_stateless(self):
+        with self.assertNumQueries(1):  # no user lookup at all
+            res = self.client.get(f"/api/subscriptions/{self.sub.pk}/")
+        self.assertEqual(res.json()["user"], self.user.pk)
+        self.assertEqual(res.wsgi_request.user.pk, self.user.pk)  # an int, like the model's
+        res = self.client.post(
+            "/api/subscriptions/", {"provider": self.spotify.pk, "price": "1.00", "start_date": "2024-01-01"}, format="json"
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(self.client.get("/api/dashboard/summary").json()["totals"]["count"], 2)
+        self.assertEqual(self.client.get("/api/me").json()["username"], "alice")
+        # the trade-off: a deactivated user keeps access until the token expires
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(f"/api/subscriptions/{self.sub.pk}/").status_code, 200)
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        hashing.reset()
+        self.client = APIClient()
+        User.objects.create_user("alice", "Alice@Example.com", "s3cret-pass")
+
+    def register(self, username, email, password="s3cret-pass"):
+        return self.client.post(
+            "/api/auth/register", {"username": username, "email": email, "password": password}, format="json"
+        )
+
+    def test_register_and_login(self):
+        res = self.register("bob", "Bob@Example.com")
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(res.json()["email"], "bob@example.com")
+        login = self.client.post("/api/auth/login", {"username": "bob", "password": "s3cret-pass"}, format="json")
+        self.assertEqual(login.status_code, 200)
+
+    def test_conflicts_in_one_query(self):
+        with self.assertNumQueries(1):
+            res = self.register("alice", "ALICE@example.com")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.json(), {"username": ["Username already taken"], "email": ["Email already in use"]})
+        self.assertEqual(self.register("alice2", "alice@example.COM").json(), {"email": ["Email already in use"]})
+        # blank emails don't collide
+        self.assertEqual(self.register("carol", "").status_code, 201)
+        self.assertEqual(self.register("dave", "").status_code, 201)
+
+    def test_races_are_settled_by_the_constraints(self):
+        with mock.patch("core.serializers.RegisterSerializer.conflicts", side_effect=[{}, {"email": ["Email already in use"]}]):
+            res = self.register("alice2", "ALICE@example.com")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.json(), {"email": ["Email already in use"]})
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_email_lookup_uses_the_index(self):
+        plan = User.objects.annotate(email_key=email_key()).filter(email_key="alice@example.com").explain()
+        self.assertIn(USER_EMAIL_INDEX, plan)
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    def test_busy_pool_answers_503(self):
+        pool, slots = hashing._get_pool()
+        slots.acquire()
+        try:
+            res = self.register("bob", "bob@example.com")
+        finally:
+            slots.release()
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertEqual(self.register("bob", "bob@example.com").status_code, 201)
+
+    @override_settings(ROOT_URLCONF=async_urlconf)
+    async def test_async_register(self):
+        client = AsyncClient()
+        body = json.dumps({"username": "bob", "email": "bob@example.com", "password": "s3cret-pass"})
+        res = await client.post("/api/auth/register", body, content_type="application/json")
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertTrue(await sync_to_async((await User.objects.aget(username="bob")).check_password)("s3cret-pass"))
+        res = await client.post("/api/auth/register", body, content_type="application/json")
+        self.assertEqual(json.loads(res.content)["username"], ["Username already taken"])
+        self.assertEqual((await client.post("/api/auth/register", "{", content_type="application/json")).status_code, 400)
+
+    async def test_register_takes_form_and_multipart_bodies(self):
+        client = AsyncClient()
+        form = "username=carol&email=carol%40example.com&password=s3cret-pass"
+        res = await client.post("/api/auth/register", form, content_type="application/x-www-form-urlencoded")
+        self.assertEqual(res.status_code, 201, res.content)
+        res = await client.post("/api/auth/register", {"username": "dave", "email": "", "password": "s3cret-pass"})
+        self.assertEqual(res.status_code, 201, res.content)
+        res = await client.post("/api/auth/register", "x", content_type="text/plain")
+        self.assertEqual(res.status_code, 415)
+
+
+class FastReadPathTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.add_sub(self.netflix, "15.49", plan_name="Premium", notes="Famille 👪 shared")
+        self.add_sub(self.spotify, "99.90", Subscription.YEARLY, auto_renew=False)
+        self.add_sub(self.icloud, "2.99", Subscription.CUSTOM, days=45)
+
+    def expected(self, res, serializer_class, model):
+        """What the DRF serializer + JSONRenderer produce for the same page."""
+        data = json.loads(res.content)
+        objs = model.objects.in_bulk([r["id"] for r in data["results"]])
+        rows = serializer_class([objs[r["id"]] for r in data["results"]], many=True).data
+        return JSONRenderer().render({"next": data["next"], "previous": data["previous"], "results": rows})
+
+    def test_same_bytes_as_the_serializers(self):
+        for url in ["/api/subscriptions/?page_size=2", "/api/subscriptions/?ordering=-monthly_cost"]:
+            res = self.client.get(url)
+            self.assertEqual(res.content, self.expected(res, SubscriptionSerializer, Subscription), url)
+        res = APIClient().get("/api/providers/?page_size=2")
+        self.assertEqual(res.content, self.expected(res, ProviderSerializer, Provider))
+        cache.clear()
+        with timezone.override("America/New_York"):
+            res = self.client.get("/api/subscriptions/")
+            self.assertEqual(res.content, self.expected(res, SubscriptionSerializer, Subscription))
+
+    def test_sparse_fieldsets(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get("/api/subscriptions/", {"fields": "monthly_cost, provider_name", "page_size": 2})
+        self.assertNotIn('"notes"', ctx.captured_queries[-1]["sql"])
+        full = self.client.get("/api/subscriptions/", {"page_size": 2}).json()["results"]
+        self.assertEqual(
+            res.json()["results"], [{"provider_name": r["provider_name"], "monthly_cost": r["monthly_cost"]} for r in full]
+        )
+        self.assertIsNotNone(res.json()["next"])
+        res = self.client.get("/api/subscriptions/", {"fields": "id,secret"})
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.json(), {"fields": ["Unknown field(s): secret."]})
+        res = APIClient().get("/api/providers/", {"fields": "name"})
+        self.assertEqual(res.json()["results"], list(Provider.objects.order_by("name", "pk").values("name")))
+
+    def test_writes_keep_validation(self):
+        res = self.client.post(
+            "/api/subscriptions/",
+            {"provider": self.netflix.pk, "price": "1.00", "start_date": "2024-01-01", "billing_cycle": "custom"},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("custom_cycle_days", res.json())
+
+    def test_renderer_matches_drf(self):
+        payload = {
+            "decimal": Decimal("12.30"),
+            "date": date(2024, 2, 29),
+            "datetime": timezone.now(),
+            "naive": datetime(2024, 1, 1, 12, 30, 0, 123456),
+            "time": time(8, 15),
+            "uuid": uuid.uuid4(),
+            "lazy": gettext_lazy("Invalid cursor"),
+            "text": "é     \x00 \" \\ / 😀",
+            "nested": ({"a": [1, None, True, -2 ** 40]},),
+            "int_keys": {1: "a", 2: "b"},
+        }
+        fast, drf = FastJSONRenderer(), JSONRenderer()
+        self.assertEqual(fast.render(payload), drf.render(payload))
+        for media_type in ["application/json", "application/json; indent=2"]:
+            self.assertEqual(fast.render(payload, media_type), drf.render(payload, media_type))
+        self.assertEqual(fast.render(None), b"")
+
+
+class DeltaSyncTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.subs = [self.add_sub(self.netflix, "15.49"), self.add_sub(self.spotify, "9.99"), self.add_sub(self.icloud, "2.99")]
+        Subscription.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        res = self.client.get("/api/subscriptions/changes/")
+        self.assertTrue(res.json()["full_resync"])
+        self.token = res.json()["next"]
+
+    def sync(self, token=None, **params):
+        res = self.client.get("/api/subscriptions/changes/", {"since": token or self.token, **params})
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    def test_changes_and_deletes(self):
+        netflix, spotify, icloud = self.subs
+        self.client.patch(f"/api/subscriptions/{netflix.pk}/", {"notes": "family"}, format="json")
+        created = self.client.post(
+            "/api/subscriptions/",
+            {"provider": self.icloud.pk, "price": "0.99", "start_date": "2024-01-01", "billing_cycle": "monthly"},
+            format="json",
+        ).json()
+        self.client.delete(f"/api/subscriptions/{spotify.pk}/")
+        data = self.sync()
+        self.assertFalse(data["full_resync"])
+        self.assertFalse(data["has_more"])
+        self.assertEqual({r["id"] for r in data["changed"]}, {netflix.pk, created["id"]})
+        self.assertEqual(data["deleted"], [spotify.pk])
+        row = next(r for r in data["changed"] if r["id"] == netflix.pk)
+        self.assertEqual(row, self.client.get(f"/api/subscriptions/{netflix.pk}/").json())
+        sparse = self.sync(fields="id,notes")
+        self.assertIn({"id": netflix.pk, "notes": "family"}, sparse["changed"])
+        # caught up: the next sync re-reads the overlap window (duplicates, nothing missed)
+        again = self.sync(data["next"])
+        self.assertEqual({r["id"] for r in again["changed"]}, {netflix.pk, created["id"]})
+
+    def test_every_write_path_is_seen(self):
+        netflix, spotify, icloud = self.subs
+        Subscription.objects.filter(pk=netflix.pk).update(auto_renew=False)
+        spotify.price = Decimal("10.99")
+        Subscription.objects.bulk_update([spotify], ["price"])
+        self.assertEqual({r["id"] for r in self.sync()["changed"]}, {netflix.pk, spotify.pk})
+
+        other = self.add_sub(self.netflix, "3.00")
+        Subscription.objects.filter(pk__in=[netflix.pk, other.pk]).delete()
+        self.icloud.delete()  # cascades to the icloud subscription
+        self.assertEqual(sorted(self.sync()["deleted"]), sorted([netflix.pk, other.pk, icloud.pk]))
+        self.assertEqual(SubscriptionTombstone.objects.count(), 3)
+
+        # deleting the user takes their subscriptions and tombstones with it
+        self.user.delete()
+        self.assertFalse(SubscriptionTombstone.objects.exists())
+
+    @override_settings(SYNC_PAGE_SIZE=2, SYNC_OVERLAP_SECONDS=0)
+    def test_paging(self):
+        Subscription.objects.update(auto_renew=False)
+        gone = [s.pk for s in self.subs[:2]]
+        for sub in self.subs[:2]:
+            sub.delete()
+        extra = [self.add_sub(self.netflix, "1.00").pk for _ in range(2)]
+        seen, deleted, token, pages = set(), [], self.token, 0
+        while True:
+            data = self.sync(token)
+            seen |= {r["id"] for r in data["changed"]}
+            deleted += data["deleted"]
+            token, pages = data["next"], pages + 1
+            if not data["has_more"]:
+                break
+        self.assertEqual(pages, 2)
+        self.assertEqual(seen, {self.subs[2].pk, *extra})
+        self.assertEqual(sorted(deleted), gone)
+        res = self.client.get("/api/subscriptions/changes/", {"since": "not-a-token"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_caught_up_client_without_deletes_survives_compaction(self):
+        first_sync = timezone.now() - timedelta(days=40)
+        token = sync.encode_token((first_sync, 0), (first_sync, 0), caught_up=True)
+        data = self.sync(token)
+        self.assertFalse(data["full_resync"])
+        self.assertEqual(data["deleted"], [])
+        call_command("compact_tombstones", stdout=StringIO())  # horizon: 30 days ago
+        self.assertFalse(self.sync(data["next"])["full_resync"])
+
+    def test_full_resync_after_compaction(self):
+        kept = self.subs[1].pk
+        self.subs[0].delete()
+        SubscriptionTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=40))
+        self.subs[1].delete()
+        out = StringIO()
+        call_command("compact_tombstones", stdout=out)
+        self.assertIn("Deleted 1 tombstones", out.getvalue())
+        self.assertEqual(list(SubscriptionTombstone.objects.values_list("subscription_id", flat=True)), [kept])
+        self.assertFalse(self.sync()["full_resync"])  # 30 days retention: the token is newer
+
+        call_command("compact_tombstones", "--days", "0", stdout=StringIO())
+        self.assertFalse(SubscriptionTombstone.objects.exists())
+        data = self.sync()
+        self.assertTrue(data["full_resync"])
+        self.assertFalse(self.sync(data["next"])["full_resync"])
+
+
+class CalendarFeedTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.add_sub(self.netflix, "15.49", plan_name="Premium, 4K; family")
+        self.add_sub(self.icloud, "2.99", Subscription.CUSTOM, days=45)
+        self.add_sub(self.spotify, "99.90", Subscription.YEARLY, auto_renew=False)
+        self.url = self.client.get("/api/calendar").json()["url"]
+
+    def fetch(self, **headers):
+        res = APIClient().get(self.url, headers=headers)
+        body = b"".join(res.streaming_content) if res.streaming else res.content
+        return res, body
+
+    def test_feed(self):
+        self.assertTrue(self.url.startswith("http://testserver/api/calendar/"))
+        res, body = self.fetch()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "text/calendar; charset=utf-8")
+        text = body.decode()
+        self.assertTrue(text.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(text.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(text.count("BEGIN:VEVENT"), 3)
+        self.assertIn("RRULE:FREQ=DAILY;INTERVAL=30\r\n", text)
+        self.assertIn("RRULE:FREQ=DAILY;INTERVAL=45\r\n", text)
+        self.assertEqual(text.count("RRULE:"), 2)  # spotify doesn't auto-renew
+        self.assertIn("SUMMARY:Netflix renews (Premium\\, 4K\\; family)\r\n", text)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in text.split("\r\n")))
+
+        bad = APIClient().get(self.url.replace(".ics", "x.ics"))
+        self.assertEqual(bad.status_code, 404)
+        self.assertIsNone(ical.feed_user(f"{self.user.pk + 1}:{ical.feed_token(self.user.pk).split(':')[1]}"))
+
+    def test_repeat_polls_skip_the_database(self):
+        res, body = self.fetch()
+        with self.assertNumQueries(0):
+            again, cached = self.fetch()
+            not_modified, _ = self.fetch(if_none_match=res["ETag"])
+            since, _ = self.fetch(if_modified_since=res["Last-Modified"])
+        self.assertEqual(cached, body)
+        self.assertEqual(again["ETag"], res["ETag"])
+        self.assertEqual((not_modified.status_code, since.status_code), (304, 304))
+
+        self.client.patch(f"/api/subscriptions/{Subscription.objects.first().pk}/", {"notes": "x"}, format="json")
+        changed, _ = self.fetch(if_none_match=res["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], res["ETag"])
+
+    def test_rotate_revokes_old_urls(self):
+        old = self.url
+        self.assertEqual(self.client.get("/api/calendar").json()["url"], old)
+        self.url = self.client.post("/api/calendar").json()["url"]
+        self.assertNotEqual(self.url, old)
+        self.assertEqual(APIClient().get(old).status_code, 404)
+        self.assertEqual(self.fetch()[0].status_code, 200)
+
+        cache.clear()  # the key is read back from the database
+        self.assertEqual(self.fetch()[0].status_code, 200)
+        self.assertEqual(APIClient().get(old).status_code, 404)
+
+        self.user.delete()
+        self.assertEqual(self.fetch()[0].status_code, 404)
+
+    def test_provider_rename_refreshes_feed(self):
+        res, body = self.fetch()
+        self.netflix.name = "Netflix Plus"
+        self.netflix.save()
+        changed, body = self.fetch(if_none_match=res["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn(b"SUMMARY:Netflix Plus renews", body)
+
+    def test_fold(self):
+        line = "SUMMARY:" + "é" * 80
+        folded = ical.fold(line)
+        self.assertTrue(all(len(part) <= 75 for part in folded.split(b"\r\n")))
+        self.assertEqual(folded.replace(b"\r\n ", b"").decode(), line + "\r\n")
+
+
+class SpendSnapshotTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.netflix_sub = self.add_sub(self.netflix, "15.00")
+        self.other = User.objects.create_user("bob", "bob@example.com", "pw-pw-pw-pw")
+        self.add_sub(self.spotify, "120.00", Subscription.YEARLY, user=self.other)
+        self.day = date(2026, 3, 1)
+
+    def snapshot(self, day, **kwargs):
+        return snapshots.run(today=day, **kwargs)
+
+    def history(self, **params):
+        res = self.client.get("/api/dashboard/history", params)
+        self.assertEqual(res.status_code, 200, res.content)
+        return [(p["date"], p["monthly"], p["count"]) for p in res.json()["points"]]
+
+    @override_settings(SYNC_OVERLAP_SECONDS=0)
+    def test_change_points_only(self):
+        first = self.snapshot(self.day)
+        self.assertEqual((first["users"], first["changed"]), (2, 2))
+        self.assertEqual(SpendSnapshot.objects.count(), 2)
+        self.assertTrue(self.snapshot(self.day)["skipped"])
+
+        # nothing changed: the next day checks no users and writes nothing
+        self.assertEqual(self.snapshot(self.day + timedelta(days=1))["users"], 0)
+        self.assertEqual(SpendSnapshot.objects.count(), 2)
+
+        icloud = self.add_sub(self.icloud, "3.00")
+        self.netflix_sub.delete()
+        result = self.snapshot(self.day + timedelta(days=2))
+        self.assertEqual((result["users"], result["changed"]), (1, 1))
+        rows = SpendSnapshot.objects.filter(user=self.user, day=self.day + timedelta(days=2))
+        self.assertEqual(
+            sorted(rows.values_list("provider_id", "count")), sorted([(self.netflix.pk, 0), (self.icloud.pk, 1)])
+        )
+
+        Subscription.objects.filter(pk=icloud.pk).update(price=Decimal("4.00"))
+        self.snapshot(self.day + timedelta(days=5), full=True)
+        self.assertEqual(SpendSnapshot.objects.count(), 5)
+
+    def test_history(self):
+        self.snapshot(self.day)
+        self.add_sub(self.icloud, "3.00")
+        self.snapshot(self.day + timedelta(days=2))
+        self.netflix.delete()  # history keeps what the provider cost back then
+        self.snapshot(self.day + timedelta(days=3))
+
+        points = self.history(**{"from": "2026-02-28", "to": "2026-03-04"})
+        self.assertEqual(points, [
+            ("2026-02-28", "0.00", 0),
+            ("2026-03-01", "15.00", 1),
+            ("2026-03-02", "15.00", 1),
+            ("2026-03-03", "18.00", 2),
+            ("2026-03-04", "3.00", 1),
+        ])
+        monthly = self.history(**{"from": "2026-01-15", "to": "2026-03-02", "interval": "month"})
+        self.assertEqual(monthly, [("2026-01-31", "0.00", 0), ("2026-02-28", "0.00", 0), ("2026-03-02", "15.00", 1)])
+        by_provider = self.history(**{"from": "2026-03-02", "to": "2026-03-03", "provider": self.icloud.pk})
+        self.assertEqual(by_provider, [("2026-03-02", "0.00", 0), ("2026-03-03", "3.00", 1)])
+
+        for params in [{"from": "2026-13-01"}, {"interval": "week"}, {"from": "2020-01-01", "to": "2026-01-01"}]:
+            self.assertEqual(self.client.get("/api/dashboard/history", params).status_code, 400, params)
+
+    def test_history_uses_the_snapshot_indexes(self):
+        self.snapshot(self.day)
+        with CaptureQueriesContext(connection) as ctx:
+            snapshots.history(self.user.pk, self.day, self.day + timedelta(days=10))
+        self.assertEqual(len(ctx.captured_queries), 2)
+        for query in ctx.captured_queries:
+            self.assertNotIn("core_subscription", query["sql"])
+
+
+    def test_upsert_without_a_conflict_target(self):
+        self.snapshot(self.day)
+        SpendSnapshot.objects.update(count=9)
+        # MySQL: ON DUPLICATE KEY UPDATE takes no unique_fields
+        with mock.patch.object(connections["default"].features, "supports_update_conflicts_with_target", False), \
+                mock.patch.object(SpendSnapshot.objects, "bulk_create") as bulk:
+            snapshots.snapshot_users([self.user.pk], self.day)
+        self.assertIsNone(bulk.call_args.kwargs["unique_fields"])
+        self.assertTrue(bulk.call_args.kwargs["update_conflicts"])
+        snapshots.snapshot_users([self.user.pk], self.day)  # a rerun overwrites its own rows
+        self.assertEqual(SpendSnapshot.objects.get(user=self.user).count, 1)
+
+    def test_changed_users_uses_the_updated_at_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            snapshots.changed_users(timezone.now() - timedelta(hours=1))
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[0]['sql']}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any(step.startswith("SEARCH core_subscription USING") for step in plan), plan)
+
+
+@skipUnless("replica" in settings.DATABASES, "needs --settings=streamtrace_backend.test_settings")
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(APITestBase):
+    databases = {"default", "replica"} & settings.DATABASES.keys()  # the runner sets up even skipped classes
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        Provider.objects.using("replica").create(name="Only on the replica")
+
+    def names(self):
+        return [p["name"] for p in self.client.get("/api/providers/").json()["results"]]
+
+    def test_reads_go_to_the_replica_until_the_user_writes(self):
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            self.assertEqual(self.names(), ["Only on the replica"])
+        self.assertTrue(replica.captured_queries)
+
+        res = self.client.post("/api/providers/", {"name": "Hulu"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertFalse(Provider.objects.using("replica").filter(name="Hulu").exists())
+        # sticky: this user now reads their own write from the primary
+        self.assertIn("Hulu", self.names())
+
+        cache.delete(db_routing.STICKY_KEY.format(self.user.pk))  # the window expired
+        self.assertEqual(self.names(), ["Only on the replica"])
+
+        other = APIClient()
+        self.assertEqual([p["name"] for p in other.get("/api/providers/").json()["results"]], ["Only on the replica"])
+
+    def test_provider_index_loads_from_the_primary(self):
+        search.reset()
+        self.addCleanup(search.reset)
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            res = self.client.get("/api/providers/", {"q": "net"})
+        self.assertEqual([r["name"] for r in res.json()["results"]], ["Netflix"])
+        self.assertFalse(replica.captured_queries)
+
+    def test_versions_bumped_for_others_pin_to_the_primary(self):
+        self.add_sub(self.netflix, "15.49")
+        cache.delete(db_routing.STICKY_KEY.format(self.user.pk))  # the window after that write expired
+        self.assertEqual(self.client.get("/api/subscriptions/").json()["results"], [])  # the replica lags
+
+        self.netflix.name = "Netflix Plus"
+        self.netflix.save()  # by an admin: bumps and pins the subscribers
+        rows = self.client.get("/api/subscriptions/").json()["results"]
+        self.assertEqual([r["provider_name"] for r in rows], ["Netflix Plus"])
+
+        # feed polls carry no JWT: the view applies the pin once it knows the user
+        state = db_routing.RoutingState("replica")
+        token = db_routing._routing.set(state)
+        self.addCleanup(db_routing._routing.reset, token)
+        db_routing.read_as(self.user.pk + 1)
+        self.assertEqual(state.read_db, "replica")
+        db_routing.read_as(self.user.pk)
+        self.assertIsNone(state.read_db)
+
+    def test_routing_rules(self):
+        router = db_routing.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Provider))  # outside a request: the primary
+        self.assertEqual(router.db_for_write(Provider), "default")
+        self.assertIsNone(db_routing.request_user_id(APIClient().get("/api/health").wsgi_request))
+        bad = APIClient()
+        bad.credentials(HTTP_AUTHORIZATION="Bearer nope")
+        self.assertIsNone(db_routing.request_user_id(bad.get("/api/health").wsgi_request))
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.client.post("/api/providers/", {"name": "Hulu"}).status_code, 201)
+            self.assertIsNone(cache.get(db_routing.STICKY_KEY.format(self.user.pk)))
+            self.assertNotIn("Only on the replica", self.names())
+
+
+class ProviderStatsTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pw-pw-pw-pw")
+        self.add_sub(self.netflix, "10.00")
+        self.add_sub(self.netflix, "20.00")
+        self.add_sub(self.netflix, "120.00", Subscription.YEARLY, user=self.bob)
+        self.add_sub(self.spotify, "9.99", user=self.bob)
+
+    def stats(self, **params):
+        res = APIClient().get("/api/providers/stats/", params)
+        self.assertEqual(res.status_code, 200)
+        return res.json()["results"]
+
+    def test_stats(self):
+        self.assertEqual(provider_stats.refresh(), {"providers": 3, "full": True})
+        first = provider_stats.payload(50)
+        with self.assertNumQueries(0):
+            self.assertEqual(provider_stats.payload(50), first)
+        netflix, spotify = first
+        self.assertEqual(netflix, {
+            "provider_id": self.netflix.pk, "provider": "Netflix", "subscribers": 2, "subscriptions": 3,
+            "avg_monthly_cost": "13.33", "median_monthly_cost": "10.00",
+            "billing_cycles": {"monthly": 2, "yearly": 1, "custom": 0},
+        })
+        self.assertEqual((spotify["provider"], spotify["median_monthly_cost"]), ("spotify", "9.99"))
+        self.assertEqual(self.stats(limit=1), [netflix])
+        with CaptureQueriesContext(connection) as ctx:
+            self.stats()
+        self.assertFalse(any("core_subscription" in q["sql"] for q in ctx.captured_queries))
+
+        names = [p["name"] for p in APIClient().get("/api/providers/", {"ordering": "-popularity"}).json()["results"]]
+        self.assertEqual(names, ["Netflix", "spotify", "iCloud"])
+
+    @override_settings(SYNC_OVERLAP_SECONDS=0)
+    def test_incremental(self):
+        provider_stats.refresh()
+        self.assertEqual(provider_stats.refresh()["providers"], 0)
+
+        # a move to another provider refreshes both ends, a delete its provider
+        sub = Subscription.objects.get(user=self.bob, provider=self.spotify)
+        sub.provider = self.icloud
+        sub.save()
+        Subscription.objects.filter(user=self.user, price=Decimal("20.00")).delete()
+        self.assertEqual(provider_stats.refresh(), {"providers": 3, "full": False})
+        stats = {s.provider_id: s for s in ProviderStats.objects.all()}
+        self.assertEqual(stats[self.spotify.pk].subscriptions, 0)
+        self.assertEqual(stats[self.icloud.pk].subscribers, 1)
+        self.assertEqual((stats[self.netflix.pk].subscriptions, stats[self.netflix.pk].median_monthly_cents), (2, 1000))
+        self.assertFalse(any(s.dirty for s in stats.values()))
+        self.assertEqual([r["provider"] for r in self.stats()], ["Netflix", "iCloud"])
+
+
+    def test_bulk_moves_mark_the_old_provider_dirty(self):
+        provider_stats.refresh()
+        Subscription.objects.filter(user=self.bob, provider=self.spotify).update(provider=self.icloud)
+        self.assertTrue(ProviderStats.objects.get(provider=self.spotify).dirty)
+        provider_stats.refresh()
+        self.assertEqual(ProviderStats.objects.get(provider=self.spotify).subscriptions, 0)
+
+        moved = list(Subscription.objects.filter(user=self.user))
+        for sub in moved:
+            sub.provider = self.spotify
+        Subscription.objects.bulk_update(moved, ["provider"])
+        self.assertTrue(ProviderStats.objects.get(provider=self.netflix).dirty)
+        provider_stats.refresh()
+        stats = {s.provider_id: s.subscriptions for s in ProviderStats.objects.all()}
+        self.assertEqual(stats, {self.netflix.pk: 1, self.spotify.pk: 2, self.icloud.pk: 1})
+
+        Subscription.objects.filter(user=self.user).update(notes="x")  # no move: nothing flagged
+        self.assertFalse(ProviderStats.objects.filter(dirty=True).exists())
+
+    def test_mysql_upsert_and_changed_providers_plan(self):
+        provider_stats.refresh()
+        with mock.patch.object(connections["default"].features, "supports_update_conflicts_with_target", False), \
+                mock.patch.object(ProviderStats.objects, "bulk_create") as bulk:
+            provider_stats.refresh(full=True)
+        self.assertIsNone(bulk.call_args.kwargs["unique_fields"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            provider_stats.changed_providers(timezone.now() - timedelta(hours=1))
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[0]['sql']}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(any(step.startswith("SEARCH core_subscription USING COVERING INDEX") for step in plan), plan)
+
+class SubscriptionFilterTests(APITestBase):
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        self.family = self.add_sub(self.netflix, "22.99", plan_name="Family", next_renewal_date=today + timedelta(days=3))
+        self.basic = self.add_sub(
+            self.netflix, "99.00", Subscription.YEARLY, currency="EUR", auto_renew=False,
+            next_renewal_date=today + timedelta(days=200),
+        )
+        self.duo = self.add_sub(self.spotify, "12.99", notes="shared with the family", next_renewal_date=today + timedelta(days=40))
+        self.cloud = self.add_sub(self.icloud, "2.99", Subscription.CUSTOM, days=90, currency="GBP")
+        other = User.objects.create_user("bob", "bob@example.com", "s3cret-pass")
+        self.add_sub(self.netflix, "22.99", plan_name="Family", user=other)
+
+    def ids(self, **params):
+        res = self.client.get("/api/subscriptions/", params)
+        self.assertEqual(res.status_code, 200)
+        return {row["id"] for row in res.data["results"]}
+
+    def test_filters(self):
+        today = date.today()
+        self.assertEqual(self.ids(provider=f"{self.netflix.pk},{self.icloud.pk}"), {self.family.pk, self.basic.pk, self.cloud.pk})
+        self.assertEqual(self.ids(provider_name=" NETFLIX ,Spotify"), {self.family.pk, self.basic.pk, self.duo.pk})
+        self.assertEqual(self.ids(provider_name="Hulu"), set())
+        self.assertEqual(self.ids(provider=self.icloud.pk, provider_name="netflix"), set())
+        self.assertEqual(self.ids(min_price="10", max_price="23"), {self.family.pk, self.duo.pk})
+        self.assertEqual(self.ids(currency="eur,gbp"), {self.basic.pk, self.cloud.pk})
+        self.assertEqual(self.ids(billing_cycle="yearly,custom,weekly"), {self.basic.pk, self.cloud.pk})
+        self.assertEqual(self.ids(auto_renew="false"), {self.basic.pk})
+        self.assertEqual(self.ids(auto_renew="1", max_monthly_cost="10"), {self.cloud.pk})
+        window = {"renews_after": (today + timedelta(days=3)).isoformat(), "renews_before": (today + timedelta(days=40)).isoformat()}
+        self.assertEqual(self.ids(**window), {self.family.pk, self.duo.pk})
+        self.assertEqual(self.ids(q="famil"), {self.family.pk, self.duo.pk})
+        self.assertEqual(self.ids(q="family shared"), {self.duo.pk})
+        # garbage is ignored, like before
+        self.assertEqual(
+            self.ids(provider="x", min_price="cheap", renews_after="soon", auto_renew="maybe", billing_cycle="weekly"),
+            {self.family.pk, self.basic.pk, self.duo.pk, self.cloud.pk},
+        )
+
+    def test_provider_name_the_index_misses(self):
+        hulu = Provider.objects.bulk_create([Provider(name="Hulu")])[0]  # no post_save: this index never saw it
+        sub = self.add_sub(hulu, "7.99")
+        self.assertEqual(search.get_index().lookup("hulu"), [])
+        self.assertEqual(self.ids(provider_name="HULU,netflix"), {sub.pk, self.family.pk, self.basic.pk})
+        with self.assertNumQueries(1):  # known names don't query providers
+            filter_subscriptions(Subscription.objects.filter(user=self.user), {"provider_name": "Spotify"}).count()
+
+    def test_fulltext_match(self):
+        qs = Subscription.objects.filter(FullTextMatch("+famil*", "plan_name", "notes"))
+        self.assertIn('MATCH ("core_subscription"."plan_name", "core_subscription"."notes") AGAINST (', str(qs.query))
+        self.assertIn("IN BOOLEAN MODE)", str(qs.query))
+
+    def test_every_combination_uses_an_index(self):
+        self.assertTrue(table_scans(Subscription.objects.filter(notes="x")))
+        base = Subscription.objects.filter(user_id=self.user.pk).select_related("provider")
+        for params in filter_combinations([self.netflix.pk], "netflix"):
+            qs = filter_subscriptions(base, params).order_by("next_renewal_date", "pk")
+            self.assertEqual(table_scans(qs), [], params)
+
+
+class StartupTests(TestCase):
+    def test_api_only_worker(self):
+        full, lean = cold_start({"API_ONLY": "0"}), cold_start({"API_ONLY": "1"})
+        self.assertEqual((full["status"], lean["status"]), (200, 200))
+        # core.admin is loaded by admin autodiscovery, the middleware by the handler
+        for module in ("core.admin", "django.contrib.sessions.middleware"):
+            self.assertTrue(module in full["modules"] and module not in lean["modules"], module)
+        # numpy waits for the first forecast
+        self.assertFalse("numpy" in full["modules"])
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RegisterView, MeView, ProviderViewSet, SubscriptionViewSet, DashboardSummaryView
+from . import async_views
+from .views import MeView, ProviderViewSet, SubscriptionViewSet, DashboardSummaryView, ForecastView, health, metrics
+from .views import CalendarLinkView, DashboardHistoryView, calendar_feed
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
@@ -8,11 +11,21 @@ router.register("providers", ProviderViewSet, basename="provider")
 router.register("subscriptions", SubscriptionViewSet, basename="subscription")
 
 urlpatterns = [
-    path("auth/register", RegisterView.as_view()),
+    # async on every deployment: under ASGI the hash doesn't hold the thread sync views share
+    path("auth/register", async_views.register),
     path("auth/login", TokenObtainPairView.as_view()),
     path("auth/refresh", TokenRefreshView.as_view()),
     path("me", MeView.as_view()),
-    path("health", lambda r: __import__("django").http.HttpResponse('{"status": "ok"}', content_type="application/json")),
+    path("health", health),
+    path("metrics", metrics),
     path("dashboard/summary", DashboardSummaryView.as_view()),
+    path("dashboard/forecast", ForecastView.as_view()),
+    path("dashboard/history", DashboardHistoryView.as_view()),
+    path("calendar", CalendarLinkView.as_view()),
+    path("calendar/<str:token>.ics", calendar_feed, name="calendar-feed"),
     path("", include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from .async_urls import urlpatterns as async_urlpatterns
+    urlpatterns = async_urlpatterns + urlpatterns
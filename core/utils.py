@@ -1,4 +1,16 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_EVEN, Decimal
+
+CENT = Decimal("0.01")
+
+def cycle_length_days(cycle: str, custom_days: int = 0) -> int:
+    # length of one billing cycle, as used for next_renewal_date
+    if cycle == "monthly":
+        return 30
+    if cycle == "yearly":
+        return 365
+    if cycle == "custom" and custom_days and custom_days > 0:
+        return custom_days
+    return 30
 
 def monthly_equivalent(price: Decimal, cycle: str, custom_days: int = 0) -> Decimal:
     if not price:
@@ -23,3 +35,28 @@ def yearly_equivalent(price: Decimal, cycle: str, custom_days: int = 0) -> Decim
     days = custom_days or 30
     # 12 “30-day months”
     return (Decimal(price) * Decimal(days) * Decimal("12")) / Decimal("30")
+
+# The helpers below take pre-summed "parts" of a set of subscriptions:
+#   monthly_part = sum of prices billed monthly
+#   yearly_part  = sum of prices billed yearly
+#   custom_part  = sum of price * (custom_days or 30) for everything else
+# Division is linear, so combining the sums gives the same result as adding up
+# monthly_equivalent()/yearly_equivalent() row by row.
+def monthly_from_parts(monthly_part: Decimal, yearly_part: Decimal, custom_part: Decimal) -> Decimal:
+    return Decimal(monthly_part) + Decimal(yearly_part) / Decimal("12") + Decimal(custom_part) / Decimal("30")
+
+def yearly_from_parts(monthly_part: Decimal, yearly_part: Decimal, custom_part: Decimal) -> Decimal:
+    return (
+        Decimal(monthly_part) * Decimal("12")
+        + Decimal(yearly_part)
+        + (Decimal(custom_part) * Decimal("12")) / Decimal("30")
+    )
+
+def to_cents(amount: Decimal) -> int:
+    # minor units, rounded the way f"{amount:.2f}" rounds in the API payloads (half-even)
+    return int(Decimal(amount).quantize(CENT, rounding=ROUND_HALF_EVEN).scaleb(2))
+
+def format_cents(cents: int) -> str:
+    cents = int(cents)
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
@@ -1,14 +1,31 @@
-from rest_framework import generics, permissions, viewsets, filters
+from rest_framework import generics, permissions, viewsets, filters, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from datetime import date, timedelta
-from decimal import Decimal
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
 from .serializers import RegisterSerializer, MeSerializer, ProviderSerializer, SubscriptionSerializer
 from .models import Provider, Subscription
-from .utils import monthly_equivalent, yearly_equivalent
+from . import bulk_io, db_routing, ical, instrumentation, provider_stats, search, snapshots, sync
+from .aggregates import summarize
+from .authentication import resolve_user
+from .cache import cached_per_user
+from .filters import OrderingFilter, filter_subscriptions
+from .pagination import ProviderPagination, SubscriptionPagination
+from .rollups import user_rows
+from .rows import ValuesSerializer, paginated_list
 
 class RegisterView(generics.CreateAPIView):
+    """
+    The plain DRF signup view. /api/auth/register is served by
+    async_views.register instead; this one stays as the baseline of the
+    "registration" benchmark.
+    """
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
@@ -16,7 +33,7 @@ class RegisterView(generics.CreateAPIView):
 class MeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
-        return Response(MeSerializer(request.user).data)
+        return Response(MeSerializer(resolve_user(request.user)).data)
 
 class IsAuthenticatedOrReadOnly(permissions.BasePermission):
     """
@@ -30,7 +47,10 @@ class IsAuthenticatedOrReadOnly(permissions.BasePermission):
 class ProviderViewSet(viewsets.ModelViewSet):
     """
     RESTful endpoints at /api/providers/ via router:
-      - GET    /api/providers/          -> list (supports ?search= & ?ordering=)
+      - GET    /api/providers/          -> list (supports ?search= & ?ordering=, keyset ?cursor=, ?fields=id,name)
+      - GET    /api/providers/?q=net    -> typeahead from the in-memory index (core.search), ?limit= up to 50
+      - GET    /api/providers/?ordering=-popularity -> most subscribers first (ProviderStats)
+      - GET    /api/providers/stats/    -> precomputed popularity/cost stats (core.provider_stats), ?limit= up to 500
       - POST   /api/providers/          -> create   (auth required)
       - GET    /api/providers/{id}/     -> retrieve
       - PATCH  /api/providers/{id}/     -> partial update (auth required)
@@ -40,36 +60,146 @@ class ProviderViewSet(viewsets.ModelViewSet):
     queryset = Provider.objects.all()
     serializer_class = ProviderSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ProviderPagination
 
     # This enables the Search and Ordering Filters
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.SearchFilter, OrderingFilter]
     search_fields = ["name"]
-    ordering_fields = ["name", "created_at"]
+    ordering_fields = ["name", "created_at", "popularity"]
+    ordering_aliases = {"popularity": "stats__subscribers"}
+    rows = ValuesSerializer(ProviderSerializer)  # list fast path, ?fields=
+
+    def list(self, request, *args, **kwargs):
+        if "q" not in request.query_params:
+            return paginated_list(self, request, self.rows)
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), search.MAX_LIMIT))
+        except ValueError:
+            limit = 10
+        matches = search.get_index().search(request.query_params["q"], limit)
+        return Response({
+            "results": [{"id": pk, "name": name, "match": kind} for pk, name, kind in matches],
+        })
+
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        """
+        GET /api/providers/stats/?limit=50
+        {"results": [{provider_id, provider, subscribers, subscriptions, avg_monthly_cost,
+                      median_monthly_cost, billing_cycles: {monthly, yearly, custom}}]}, most subscribers first.
+        Read from ProviderStats (`manage.py refresh_provider_stats`) and cached, never live.
+        """
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 50)), 500))
+        except ValueError:
+            limit = 50
+        return Response({"results": provider_stats.payload(limit)})
 
 class SubscriptionViewSet(viewsets.ModelViewSet):
     serializer_class = SubscriptionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.OrderingFilter]
-    ordering_fields = ["next_renewal_date","price","created_at"]
+    pagination_class = SubscriptionPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["next_renewal_date","price","created_at","monthly_cost","yearly_cost"]
+    ordering_aliases = {"monthly_cost": "monthly_cost_cents", "yearly_cost": "yearly_cost_cents"}
     ordering = ["next_renewal_date"]
+    rows = ValuesSerializer(SubscriptionSerializer)  # list fast path, ?fields=
 
     def get_queryset(self):
-        qs = Subscription.objects.filter(user=self.request.user).select_related("provider")
-        provider = self.request.query_params.get("provider")
-        if property:
-            qs = qs.filter(property_id=provider)
-        due_in = self.request.query_params.get("due_in_days")
-        if due_in:
-            try:
-                n = int(due_in)
-                qs = qs.filter(next_renewal_date__lte=date.today() + timedelta(days=n))
-            except ValueError:
-                pass
-        return qs
-    
+        qs = Subscription.objects.filter(user_id=self.request.user.pk).select_related("provider")
+        return filter_subscriptions(qs, self.request.query_params)
+
+    @cached_per_user
+    def list(self, request, *args, **kwargs):
+        return paginated_list(self, request, self.rows)
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.pk)
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_rows(self, request):
+        """
+        POST /api/subscriptions/import/?fmt=csv|ndjson
+        Body: multipart "file" upload, or the raw CSV/NDJSON as the request body.
+        Providers are referenced by name. Returns {created, failed, errors: [{row, errors}]}.
+        A file that isn't UTF-8 or isn't valid CSV is a 400 {detail, row}, and nothing is imported.
+        """
+        upload = request.FILES.get("file") if request.content_type.startswith("multipart/") else None
+        if upload is not None:
+            source, name, content_type = upload, upload.name, upload.content_type
+        else:
+            source, name, content_type = request.stream, "", request.content_type
+        if source is None:
+            return Response({"detail": "No data."}, status=status.HTTP_400_BAD_REQUEST)
 
+        fmt = request.query_params.get("fmt") or bulk_io.guess_format(name, content_type)
+        if fmt not in bulk_io.FORMATS:
+            return Response({"detail": f"Unsupported fmt '{fmt}'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = bulk_io.import_subscriptions(request.user.pk, bulk_io.iter_rows(source, fmt))
+        except bulk_io.InvalidFile as exc:
+            return Response({"detail": str(exc), "row": exc.line_no}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED if result["created"] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        GET /api/subscriptions/export/?fmt=csv|ndjson
+        Streams every matching subscription (same filters as the list) with flat memory use.
+        """
+        fmt = request.query_params.get("fmt") or bulk_io.CSV
+        if fmt not in bulk_io.FORMATS:
+            return Response({"detail": f"Unsupported fmt '{fmt}'."}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(
+            bulk_io.export_lines(self.get_queryset(), fmt),
+            content_type=bulk_io.CONTENT_TYPES[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="subscriptions.{fmt}"'
+        return response
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        GET /api/subscriptions/changes/?since=<token>[&fields=id,price]
+        Delta sync (core.sync): {changed: [rows], deleted: [ids], next, has_more, full_resync}.
+        Without a token, or when the token predates tombstone compaction, full_resync is
+        true: refetch the list, then sync from `next`. Keep calling while has_more.
+        """
+        fields = self.rows.get_fields(request)
+        try:
+            data = sync.changes(request.user.pk, request.query_params.get("since") or None, self.rows, fields)
+        except ValueError:
+            return Response({"since": ["Invalid sync token."]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
+
+def parse_window(days, default=14):
+    try:
+        return int(days or default)
+    except ValueError:
+        return default
+
+
+def upcoming_queryset(user_id, window):
+    return (
+        Subscription.objects
+        .filter(user_id=user_id, next_renewal_date__lte=date.today() + timedelta(days=window))
+        .select_related("provider")
+        .order_by("next_renewal_date")[:20]
+    )
+
+
+def upcoming_item(s):
+    return {
+        "id": s.id,
+        "provider_name": s.provider.name if s.provider_id else None,
+        "plan_name": s.plan_name,
+        "next_renewal_date": s.next_renewal_date,
+        "price": str(s.price),
+        "currency": s.currency,
+        "auto_renew": s.auto_renew,
+    }
 
 
 class DashboardSummaryView(APIView):
@@ -84,65 +214,156 @@ class DashboardSummaryView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @cached_per_user
     def get(self, request):
-        days = request.query_params.get("days") or "14"
-        try:
-            window = int(days)
-        except ValueError:
-            window = 14
+        window = parse_window(request.query_params.get("days"))
 
-        subs = (
-            Subscription.objects
-            .filter(user=request.user)
-            .select_related("provider")
-        )
+        # Totals + by-provider rollup: read from the materialized UserSpendRollup rows
+        totals, by_provider = summarize(user_rows(request.user.pk))
 
-        # Totals
-        monthly_total = Decimal("0")
-        yearly_total = Decimal("0")
-        for s in subs:
-            monthly_total += monthly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days)
-            yearly_total  += yearly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days)
-
-        # Upcoming renewals
-        soon = (
-            subs.filter(next_renewal_date__lte=date.today() + timedelta(days=window))
-                .order_by("next_renewal_date")[:20]
-        )
-        upcoming = [
-            {
-                "id": s.id,
-                "provider_name": s.provider.name if s.provider_id else None,
-                "plan_name": s.plan_name,
-                "next_renewal_date": s.next_renewal_date,
-                "price": str(s.price),
-                "currency": s.currency,
-                "auto_renew": s.auto_renew,
-            }
-            for s in soon
-        ]
-
-        # By provider (small rollup)
-        tallies = {}
-        for s in subs:
-            key = s.provider.name if s.provider_id else "Unknown"
-            m = monthly_equivalent(s.price, s.billing_cycle, s.custom_cycle_days)
-            if key not in tallies:
-                tallies[key] = {"provider": key, "count": 0, "monthly": Decimal("0")}
-            tallies[key]["count"] += 1
-            tallies[key]["monthly"] += m
-
-        by_provider = [
-            {"provider": k, "count": v["count"], "monthly": f"{v['monthly']:.2f}"}
-            for k, v in sorted(tallies.items(), key=lambda kv: kv[0].lower())
-        ]
+        # Upcoming renewals: served by the (user, next_renewal_date) index
+        upcoming = [upcoming_item(s) for s in upcoming_queryset(request.user.pk, window)]
 
         return Response({
-            "totals": {
-                "monthly": f"{monthly_total:.2f}",
-                "yearly": f"{yearly_total:.2f}",
-                "count": subs.count(),
-            },
+            "totals": totals,
             "upcoming": upcoming,
             "by_provider": by_provider,
-        })
\ No newline at end of file
+        })
+
+
+def run_forecast(qs, months):
+    # numpy is by far the slowest import: load it with the first forecast, not with the worker
+    from .forecast import forecast
+    return forecast(qs, months)
+
+
+class ForecastView(APIView):
+    """
+    GET /api/dashboard/forecast?months=24[&scope=all]
+    Projects every renewal over the next N calendar months (this month first):
+      {
+        "months": 24, "from": "YYYY-MM-DD", "to": "YYYY-MM", "total": "X.XX", "events": N,
+        "buckets": [ {"month": "YYYY-MM", "total": "X.XX", "events": n,
+                      "by_provider": [{"provider_id", "provider", "total", "events"}]} ]
+      }
+    scope=all aggregates every user's subscriptions (staff only, for internal reporting).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_months = 120
+
+    def get(self, request):
+        if request.query_params.get("scope") == "all":
+            if not resolve_user(request.user).is_staff:
+                return Response({"detail": "Staff only."}, status=status.HTTP_403_FORBIDDEN)
+            return Response(run_forecast(Subscription.objects.all(), self.get_months(request)))
+        return self.user_forecast(request)
+
+    @cached_per_user
+    def user_forecast(self, request):
+        qs = Subscription.objects.filter(user_id=request.user.pk)
+        return Response(run_forecast(qs, self.get_months(request)))
+
+    def get_months(self, request):
+        try:
+            months = int(request.query_params.get("months") or 12)
+        except ValueError:
+            months = 12
+        return max(1, min(months, self.max_months))
+
+
+class DashboardHistoryView(APIView):
+    """
+    GET /api/dashboard/history?from=YYYY-MM-DD&to=YYYY-MM-DD[&interval=day|month][&provider=<id>]
+    Spend over time from the SpendSnapshot change points (core.snapshots), one point per
+    day, or per month-end with interval=month:
+      {"from", "to", "interval", "points": [{"date", "monthly", "yearly", "count"}]}
+    Defaults: the last 30 days. At most 366 daily or 120 monthly points.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_points = {snapshots.DAY: 366, snapshots.MONTH: 120}
+
+    @cached_per_user
+    def get(self, request):
+        params = request.query_params
+        errors = {}
+        interval = params.get("interval") or snapshots.DAY
+        if interval not in self.max_points:
+            errors["interval"] = ["Use day or month."]
+        dates = {}
+        for name, default in [("to", date.today()), ("from", None)]:
+            try:
+                dates[name] = date.fromisoformat(params[name]) if params.get(name) else default
+            except ValueError:
+                errors[name] = ["Use YYYY-MM-DD."]
+        try:
+            provider_id = int(params["provider"]) if params.get("provider") else None
+        except ValueError:
+            errors["provider"] = ["A provider id."]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        end = dates["to"]
+        start = dates["from"] or end - timedelta(days=30)
+        if start > end:
+            return Response({"from": ["Must not be after 'to'."]}, status=status.HTTP_400_BAD_REQUEST)
+        points = snapshots.points(start, end, interval)
+        if len(points) > self.max_points[interval]:
+            return Response(
+                {"detail": f"At most {self.max_points[interval]} points per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({
+            "from": start, "to": end, "interval": interval,
+            "points": snapshots.history(request.user.pk, start, end, interval, provider_id),
+        })
+
+def health(request):
+    """GET /api/health -> {"status": "ok"}: no auth, no database, for load balancer probes."""
+    return HttpResponse(b'{"status": "ok"}', content_type="application/json")
+
+
+def metrics(request):
+    """
+    GET /api/metrics -> per-route request histograms in Prometheus text format.
+    Wants "Authorization: Bearer <settings.METRICS_TOKEN>"; without a token
+    configured the endpoint doesn't exist (404): timings aren't public.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        return HttpResponse(status=404)
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(instrumentation.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class CalendarLinkView(APIView):
+    """
+    GET  /api/calendar -> {"url": ".../api/calendar/<token>.ics"}
+    POST /api/calendar -> a new URL; the old ones stop working.
+    The URL to subscribe to in a calendar app; the token in it is the credential.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({"url": self.feed_url(request)})
+
+    def post(self, request):
+        ical.rotate_key(request.user.pk)
+        return Response({"url": self.feed_url(request)})
+
+    def feed_url(self, request):
+        url = reverse("calendar-feed", kwargs={"token": ical.feed_token(request.user.pk)})
+        return request.build_absolute_uri(url)
+
+
+@require_safe
+def calendar_feed(request, token):
+    """
+    GET /api/calendar/<token>.ics -> iCalendar feed of renewals (core.ical).
+    ETag/Last-Modified come from the user's version stamp; unchanged polls cost no queries.
+    """
+    user_id = ical.feed_user(token)
+    if user_id is None:
+        return HttpResponse(status=404)
+    db_routing.read_as(user_id)  # no JWT: the middleware couldn't tell whose feed this is
+    return ical.feed_response(request, user_id)
@@ -0,0 +1,16 @@
+"""
+Entry points for process-pool workers.
+
+Spawned workers unpickle these by reference before Django is set up, so this
+module must not import models at import time.
+"""
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def roll_range(*args, **kwargs):
+    from .renewals import roll_range
+    return roll_range(*args, **kwargs)
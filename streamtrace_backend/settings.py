@@ -1,16 +1,22 @@
 from datetime import timedelta
 from pathlib import Path
 import os
-from dotenv import load_dotenv
 from django.core.management.utils import get_random_secret_key
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-load_dotenv(BASE_DIR / ".env")
+if (BASE_DIR / ".env").exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / ".env")
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY") or get_random_secret_key()
 DEBUG = True
 ALLOWED_HOSTS = ["*"]
 
+# API-only workers (API_ONLY=1): JWT clients only, so no admin, sessions,
+# messages, templates or browsable API, and none of their middleware. Faster
+# cold starts (manage.py benchmark startup); serve /admin/ from a normal worker.
+API_ONLY = os.getenv("API_ONLY", "0") == "1"
+
 INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
@@ -24,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.RequestMetricsMiddleware',  # first: its "total" covers everything below
+    'core.db_routing.ReplicaRoutingMiddleware',  # before anything that queries
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -33,6 +41,17 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if API_ONLY:
+    BROWSER_ONLY = {
+        'django.contrib.admin', 'django.contrib.sessions', 'django.contrib.messages', 'django.contrib.staticfiles',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',  # DRF views are csrf_exempt
+        'django.contrib.auth.middleware.AuthenticationMiddleware',  # DRF authenticates
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    }
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in BROWSER_ONLY]
+    MIDDLEWARE = [m for m in MIDDLEWARE if m not in BROWSER_ONLY]
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -41,15 +60,80 @@ CORS_ALLOWED_ORIGINS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.FastJSONRenderer",
+        *(() if API_ONLY else ("rest_framework.renderers.BrowsableAPIRenderer",)),
+    ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
 }
 
+# Per-user response cache (core.cache). Locmem is per process and bounded by
+# MAX_ENTRIES; set REDIS_URL to share versions and responses across workers.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "5000"))},
+    }
+}
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+# Workers only see each other's invalidations through a shared cache: with
+# locmem, core.checks refuses to start while the response cache is on
+# (RESPONSE_CACHE_TIMEOUT=0 turns it off, ETags included) or replicas are
+# configured (sticky reads after a write). LOCAL_CACHE_OK=1
+# accepts locmem for a single process (runserver, tests).
+LOCAL_CACHE_OK = os.getenv("LOCAL_CACHE_OK", "1" if DEBUG else "0") == "1"
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "300"))
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024
+# How often (seconds) a worker checks whether another one changed Providers (core.search).
+PROVIDER_INDEX_CHECK_INTERVAL = float(os.getenv("PROVIDER_INDEX_CHECK_INTERVAL", "1.0"))
+
+# Serve the hot read endpoints from core.async_views (run under ASGI).
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "0") == "1"
+
+# Per-request SQL/latency metrics: Server-Timing header + /api/metrics (core.instrumentation).
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "1") == "1"
+REQUEST_METRICS_REPEAT_THRESHOLD = int(os.getenv("REQUEST_METRICS_REPEAT_THRESHOLD", "5"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # /api/metrics wants "Authorization: Bearer <token>"; unset: 404
+
+# JWT auth (core.authentication): users are cached this many seconds (0 = query
+# every request); needs the shared cache, or a deactivated user stays logged in
+# on other workers until their entry expires. JWT_STATELESS skips the lookup entirely; tokens then can't be
+# revoked by deactivating the user before they expire.
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "60"))
+JWT_STATELESS = os.getenv("JWT_STATELESS", "0") == "1"
+
+# Registration hashes passwords on a bounded pool (core.hashing): this many at
+# once (default: half the CPUs), this many more waiting, then 503 Retry-After.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+
+# Delta sync (GET /api/subscriptions/changes/, core.sync). Tombstones of deleted
+# subscriptions are kept this long (manage.py compact_tombstones); older tokens
+# get a full resync. Caught-up syncs re-read the last SYNC_OVERLAP_SECONDS so
+# rows from transactions that committed late aren't missed.
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "60"))
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+
+# Renewal reminders (manage.py send_reminders); console backend unless configured.
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "25"))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "0") == "1"
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "StreamTrace <reminders@streamtrace.local>")
+
 from datetime import timedelta
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
@@ -59,7 +143,7 @@ SIMPLE_JWT = {
 
 ROOT_URLCONF = 'streamtrace_backend.urls'
 
-TEMPLATES = [
+TEMPLATES = [] if API_ONLY else [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
@@ -76,6 +160,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'streamtrace_backend.wsgi.application'
 
+# DB_ENGINE=sqlite runs on a local file (DB_NAME, default db.sqlite3) instead of
+# MySQL: tests and `manage.py benchmark` work without a server or mysqlclient.
+DB_ENGINE = os.getenv("DB_ENGINE", "mysql")
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -84,8 +171,43 @@ DATABASES = {
         'PASSWORD': os.getenv("DB_PASSWORD", "streampass123"),
         "HOST": os.getenv("DB_HOST", "127.0.0.1"),
         "PORT": os.getenv("DB_PORT", "3306"),
+        # persistent connections (0 = close after each request), checked before reuse
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "1") == "1",
     }
 }
+if DB_ENGINE == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("DB_NAME", str(BASE_DIR / "db.sqlite3")),
+    }
+
+# Read replicas (core.db_routing): DB_REPLICA_HOSTS="10.0.0.2,10.0.0.3:3307" adds
+# aliases replica1, replica2... with the primary's settings. Safe-method requests
+# read from a random replica; a user's reads stick to the primary for
+# REPLICA_STICKY_SECONDS after they write (keep it above the replication lag).
+for i, host in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), start=1):
+    host, _, port = host.strip().partition(":")
+    DATABASES[f"replica{i}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "USER": os.getenv("DB_REPLICA_USER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.getenv("DB_REPLICA_PASSWORD", DATABASES["default"]["PASSWORD"]),
+        "TEST": {"MIRROR": "default"},
+    }
+# With DB_ENGINE=sqlite, DB_REPLICA_NAME=db.replica.sqlite3 adds replica1 on that
+# file to try the routing on one machine. Nothing replicates to it: copy
+# db.sqlite3 over it to catch up, it lags until the next copy.
+if DB_ENGINE == "sqlite" and os.getenv("DB_REPLICA_NAME"):
+    DATABASES["replica1"] = {
+        **DATABASES["default"],
+        "NAME": os.getenv("DB_REPLICA_NAME"),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["core.db_routing.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
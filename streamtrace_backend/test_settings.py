@@ -0,0 +1,20 @@
+"""
+Settings for the test suite:
+    python manage.py test --settings=streamtrace_backend.test_settings
+
+Adds "replica", a second SQLite database playing a read replica for the
+routing tests (core.tests.ReplicaRoutingTests). Nothing replicates to it, so
+what it serves is easy to tell apart. It isn't in DATABASE_REPLICAS: only
+tests that override_settings(DATABASE_REPLICAS=["replica"]) read from it.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DATABASES = {
+    **DATABASES,
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+        "TEST": {"NAME": None},
+    },
+}